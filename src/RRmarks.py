@@ -168,8 +168,6 @@ class signalRRmarksWidget(QtWidgets.QWidget):
     # add new RRmark to data
     def addRR(self):
 
-        self.data.removeBeat2beat()
-
         peakIdX = self.plotArea.convXtoSample(self.sender().mousePos[0], roundMethod='nearest')
         # print('pos: ',self.sender().mousePos[0])
         # print('idx: ',peakIdX)
@@ -181,8 +179,6 @@ class signalRRmarksWidget(QtWidgets.QWidget):
     #  remove RRmark from data
     def removeRR(self):
 
-        self.data.removeBeat2beat()
-
         peakIdX = self.plotArea.convXtoSample(self.sender().mousePos[0], roundMethod='nearest')
         self.data.removePeak(peakIdX, isPeak=True)
         self.plotArea.markPeaks(channel=0, peakIdx=self.data.peakIdx, valleyIdx=None)
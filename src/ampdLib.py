@@ -18,6 +18,11 @@ def ampd(sigInput, LSMlimit=1):
         "An Efficient Algorithm for Automatic Peak Detection in 
         Noisy Periodic and Quasi-Periodic Signals", Algorithms 2012,
          5, 588-603
+
+        The local scale-maxima matrix (LSM) is not built. The row sums of the LSM are computed one scale at a time and the peaks are found
+        by refining the local maxima of the first scale, so memory grows linearly with the length of the signal. The output is the same of
+        the matrix implementation.
+
         Parameters
         ----------
         sigInput: ndarray
@@ -44,18 +49,30 @@ def ampd(sigInput, LSMlimit=1):
     N = len(dtrSignal)
     L = int(np.ceil(N * LSMlimit / 2.0)) - 1
 
-    # Generate random matrix
-    LSM = np.ones([L, N], dtype='uint8')
-
-    # Local minima extraction
-    for k in np.arange(1, L):
-        LSM[k - 1, np.where((dtrSignal[k:N - k - 1] > dtrSignal[0: N - 2 * k - 1]) & (dtrSignal[k:N - k - 1] > dtrSignal[2 * k: N - 1]))[0] + k] = 0
-
-    # Find minima                
-    G = np.sum(LSM, 1)
-    l = np.where(G == G.min())[0][0]
-
-    pks = np.where(np.sum(LSM[0:l, :], 0) == 0)[0]
+    # number of local maxima of each scale k=1..L-1 (N minus the row sums of the LSM). The last row of the LSM has no maxima
+    nMaxima = np.zeros(L, dtype=int)
+    nMaximaBest = 0
+    for k in range(1, L):
+        # sample i can be a maximum of scale k only if i-k and i+k are not, so the scale has at most (nValid + k) / 2 maxima.
+        # Scales that cannot exceed the best count are skipped. The bound decreases with k
+        nValid = N - 2 * k - 1
+        if (nValid + min(k, nValid)) // 2 <= nMaximaBest:
+            break
+        center = dtrSignal[k:N - k - 1]
+        nMaxima[k - 1] = np.count_nonzero((center > dtrSignal[0: N - 2 * k - 1]) & (center > dtrSignal[2 * k: N - 1]))
+        nMaximaBest = max(nMaximaBest, nMaxima[k - 1])
+
+    # Find minima of the row sums
+    l = np.argmax(nMaxima)
+
+    if l == 0:
+        return np.arange(N)
+
+    # peaks are maxima of all scales 1..l
+    pks = np.arange(1, N - 2)
+    for k in range(1, l + 1):
+        pks = pks[(pks >= k) & (pks <= N - k - 2)]
+        pks = pks[(dtrSignal[pks] > dtrSignal[pks - k]) & (dtrSignal[pks] > dtrSignal[pks + k])]
     return pks
 
 
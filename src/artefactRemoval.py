@@ -21,6 +21,7 @@ class artefactRemovalWidget(QtWidgets.QWidget):
     def __init__(self, patientData):
         QtWidgets.QWidget.__init__(self)
         self.data = patientData
+        self.peaksIdx = None  # peaks of the ABP channel, used by 'joinPeaks'. Updated after each removal
         self.initUI()
 
     def initUI(self):
@@ -86,6 +87,7 @@ class artefactRemovalWidget(QtWidgets.QWidget):
 
     def updateTab(self):
         self.plotArea.replotAllsignals()
+        self.peaksIdx = None  # signals may have been changed in other tabs
 
         # find if ABP signal was assigned to a channel
         hasABPchannel = False
@@ -156,7 +158,9 @@ class artefactRemovalWidget(QtWidgets.QWidget):
     # remove artefact
     def removeArtefact(self):
 
-        self.data.removeRRmarks()
+        # RR marks not detected by findRRmarks (e.g. PAR files) cannot be updated after the removal
+        if self.data.RRmarksSettings is None:
+            self.data.removeRRmarks()
         self.data.removeBeat2beat()
 
         limits = self.plotArea.getSelectionPos(channel=0)
@@ -165,24 +169,26 @@ class artefactRemovalWidget(QtWidgets.QWidget):
             print('none')
             return
 
-        # find segment indexes. use Pchannel
-        if self.cutMethod in ['joinPeaks', 'spike']:
-            ABPsignal = [s for s in self.data.signals if s.sigType == 'ABP']
-            [peaksIdx, _, _, _] = ABPsignal[0].findPeaks(method='ampd', findPeaks=True, findValleys=False, register=False)
+        # find segment indexes. use Pchannel. Peaks are detected in the whole signal only once and then updated around each removed region
+        ABPchannel = [i for i, s in enumerate(self.data.signals) if s.sigType == 'ABP'][0]
+        if self.cutMethod in ['joinPeaks', 'spike'] and self.peaksIdx is None:
+            [self.peaksIdx, _, _, _] = self.data.signals[ABPchannel].findPeaks(method='ampd', findPeaks=True, findValleys=False, register=False)
+        peaksIdx = self.peaksIdx
 
         if self.regionType == 'interval':
 
             xMin, xMax, posMin, posMax = limits
 
             if self.cutMethod in ['crop', 'joinPeaks']:
-                for s in self.data.signals:
-                    if self.cutMethod == 'crop':
-                        s.cropInterval(posMin, posMax, RemoveSegment=False)
-                    else:
-                        s.cropInterval(posMin, posMax, RemoveSegment=True, segmentIndexes=peaksIdx)
-                        # finds the start point to adjust the plot
-                        start = peaksIdx[np.searchsorted(peaksIdx, posMin) - 1]
-                        xMin = self.plotArea.xData[start]
+                if self.cutMethod == 'crop':
+                    interval = self.data.cropInterval(posMin, posMax, RemoveSegment=False)
+                else:
+                    interval = self.data.cropInterval(posMin, posMax, RemoveSegment=True, segmentIndexes=peaksIdx)
+                    # finds the start point to adjust the plot
+                    start = peaksIdx[np.searchsorted(peaksIdx, posMin) - 1]
+                    xMin = self.plotArea.xData[start]
+
+                self._updatePeaks(interval, isCrop=True, ABPchannel=ABPchannel)
 
                 # recreate plots
                 self.plotArea.replotAllsignals()
@@ -190,8 +196,8 @@ class artefactRemovalWidget(QtWidgets.QWidget):
                 self.plotArea.adjusPosSelection(xMin, None)
 
             if self.cutMethod == 'interpolate':
-                for s in self.data.signals:
-                    s.interpolate(posMin, posMax, method='linear')
+                interval = self.data.interpolate(posMin, posMax, method='linear')
+                self._updatePeaks(interval, isCrop=False, ABPchannel=ABPchannel)
 
                 # recreate plots
                 self.plotArea.replotAllsignals()
@@ -202,11 +208,12 @@ class artefactRemovalWidget(QtWidgets.QWidget):
             xMin, posMin = limits
 
             if self.cutMethod in ['joinPeaks']:
-                for s in self.data.signals:
-                    s.cropInterval(posMin, posMin + 1, RemoveSegment=True, segmentIndexes=peaksIdx)
-                    # finds the start point
-                    start = peaksIdx[np.searchsorted(peaksIdx, posMin) - 1]
-                    xMin = self.plotArea.xData[start]
+                interval = self.data.cropInterval(posMin, posMin + 1, RemoveSegment=True, segmentIndexes=peaksIdx)
+                # finds the start point
+                start = peaksIdx[np.searchsorted(peaksIdx, posMin) - 1]
+                xMin = self.plotArea.xData[start]
+
+                self._updatePeaks(interval, isCrop=True, ABPchannel=ABPchannel)
 
                 # recreate plots
                 self.plotArea.replotAllsignals()
@@ -220,6 +227,12 @@ class artefactRemovalWidget(QtWidgets.QWidget):
         self.applyButton.clearFocus()
         self.applyButton.setEnabled(False)
 
+    # update the peaks of the ABP channel after a region was removed. Only peaks close to the region are detected again
+    def _updatePeaks(self, interval, isCrop, ABPchannel):
+        if self.peaksIdx is None or interval is None:
+            return
+        self.peaksIdx = self.data.remapMarks(self.peaksIdx, ABPchannel, interval[0], interval[1], isCrop, method='ampd', isPeak=True)
+
 
 class plotArrayArtefact(plotArray):
 
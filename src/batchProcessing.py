@@ -0,0 +1,238 @@
+#!/usr/bin/python
+
+# -*- coding: utf-8 -*-
+"""
+Headless batch processing of jobs.
+
+Each input is processed in a worker process: **.job** files are replayed with :meth:`patientData.patientData.loadJob`. Raw data files (.EXP, .DAT,
+.CSV, .PAR) are loaded and the operations of the **.PPO** / **.ARO** files are applied, in the order they are given.
+
+A manifest with the status and processing time of each input is written in the end.
+
+**Example**
+
+.. code-block:: bash
+
+    python batchProcessing.py '../data/*.job' --workers 8 --manifest ../data/manifest.csv
+    python batchProcessing.py ../data/ --operations basic.ppo basic.aro --saveJob
+
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import glob
+import os
+import sys
+import time
+
+import matplotlib as mpl
+mpl.use('Agg')
+
+import dataReader
+import operationsCompiler
+import stateCache
+import tools
+from patientData import patientData
+
+
+def listInputFiles(inputs, operationsFiles=None):
+    """
+    Expand the list of inputs into a sorted list of files.
+
+    Parameters
+    ----------
+    inputs: list of str
+        files, directories or glob patterns. All files of the directories with valid extensions are selected. Use glob patterns if the directory
+        also contains output files with these extensions (e.g. .csv).
+    operationsFiles: list of str or None
+        If None, only **.job** files are selected. Otherwise only raw data files (.EXP, .DAT, .CSV, .PAR) are selected.
+
+    Returns
+    -------
+    fileList: list of str
+    """
+    fileList = []
+    for item in inputs:
+        if os.path.isdir(item):
+            fileList += glob.glob(os.path.join(item, '*'))
+        else:
+            fileList += glob.glob(item)
+
+    if operationsFiles is None:
+        fileList = [f for f in fileList if os.path.splitext(f)[1].lower() == '.job']
+    else:
+        fileList = [f for f in fileList if dataReader.getFileType(f) is not None]
+
+    # patientData expects full paths
+    return sorted(set([os.path.abspath(f) for f in fileList]))
+
+
+def processFile(inputFile, operationsFiles=None, activeModule='ARanalysis', reader='fast', useCache=False, saveJob=False, quiet=False, plans=None,
+                stateCacheDir=None, nWorkers=1, cacheDir=None):
+    """
+    Process one input file. This function is executed by the worker processes.
+
+    Parameters
+    ----------
+    inputFile: str
+        **.job** file or raw data file.
+    operationsFiles: list of str or None
+        **.PPO** / **.ARO** files applied to raw data files. The operations are run in the order of the list. The names of the output files of
+        save operations are prefixed with the name of the raw data file, so that inputs in the same directory do not overwrite each other.
+    activeModule: str {'preprocessing', 'ARanalysis'}
+        module passed to :class:`~patientData.patientData`. If 'preprocessing', AR analysis operations are not run.
+    reader, useCache, cacheDir:
+        see :class:`~patientData.patientData`.
+    saveJob: bool
+        save the resulting job (raw data files only). The job is saved next to the raw data file, with extension **.job**. Imported operations
+        are merged into the job.
+    quiet: bool
+        discard the messages printed during processing.
+    plans: list or None
+        execution plans of `operationsFiles`, created by :func:`operationsCompiler.compileOperationsFile`. If None, the operations files are
+        compiled here.
+    stateCacheDir: str or None
+        directory of the cache of intermediate preprocessing states. See :class:`stateCache.stateCache`. If None, states are not cached.
+    nWorkers: int or None
+        number of worker processes of the RR mark detection, see :class:`~patientData.patientData`. Default: 1, since the files are already
+        processed in parallel.
+
+    Returns
+    -------
+    [inputFile, status, time_s, message]: list
+        status is 'ok' or 'error'.
+    """
+    tStart = time.time()
+    try:
+        with open(os.devnull, 'w') if quiet else contextlib.nullcontext(sys.stdout) as out, contextlib.redirect_stdout(out):
+            cache = None
+            if stateCacheDir is not None:
+                cache = stateCache.stateCache(cacheDir=stateCacheDir)
+
+            job = patientData(inputFile, activeModule=activeModule, reader=reader, useCache=useCache, stateCache=cache, nWorkers=nWorkers,
+                              cacheDir=cacheDir)
+
+            if operationsFiles is not None:
+                if plans is None:
+                    plans = [operationsCompiler.compileOperationsFile(f) for f in operationsFiles]
+
+                [dirName, filePrefix, _] = tools.splitPath(inputFile)
+                stateKey = job.getStateKey()
+                for operationsFile, plan in zip(operationsFiles, plans):
+                    # the imported operations are kept in the job tree only as a record of the operations
+                    job.importOperations(operationsFile, elemPosition=None, runOperations=False)
+                    importedNode = job.jobRootNode.xpath('operations[@imported="True"]')[-1]
+                    for elem in importedNode.xpath('.//fileName'):
+                        elem.text = filePrefix + '_' + elem.text
+
+                    plan = [op.copy(fileName=filePrefix + '_' + op.params['fileName']) if 'fileName' in op.params else op for op in plan]
+                    stateKey = job.runOperationsPlan(plan, stateKey)
+
+                if saveJob:
+                    # imported operations are merged to keep the prefixed output file names
+                    job.saveJob(dirName + filePrefix + '.job', mergeImported=True)
+
+    except SystemExit:
+        return [inputFile, 'error', time.time() - tStart, 'processing aborted']
+    except Exception as error:
+        return [inputFile, 'error', time.time() - tStart, '%s: %s' % (type(error).__name__, str(error))]
+
+    return [inputFile, 'ok', time.time() - tStart, '']
+
+
+def runBatch(fileList, operationsFiles=None, activeModule='ARanalysis', reader='fast', useCache=False, saveJob=False, quiet=False, nWorkers=None,
+             stateCacheDir=None, cacheDir=None):
+    """
+    Process a list of files in a pool of worker processes. See :func:`processFile`.
+
+    Parameters
+    ----------
+    nWorkers: int or None
+        number of worker processes. If None, the number of processors of the machine is used. If 1, the files are processed in the current process.
+
+    see :func:`processFile` for the other parameters.
+
+    Returns
+    -------
+    results: list
+        list of [inputFile, status, time_s, message], in the same order of `fileList`.
+    """
+    # operations files are compiled once and the plans are sent to the workers
+    plans = None
+    if operationsFiles is not None:
+        plans = [operationsCompiler.compileOperationsFile(f) for f in operationsFiles]
+
+    # each file is processed by a single process, so that the pool of files is not multiplied by the pools of the RR mark detection
+    args = [operationsFiles, activeModule, reader, useCache, saveJob, quiet, plans, stateCacheDir, 1, cacheDir]
+
+    if nWorkers == 1:
+        results = []
+        for inputFile in fileList:
+            results.append(processFile(inputFile, *args))
+            print('%s: %s (%.1f s)' % tuple(results[-1][0:3]))
+        return results
+
+    results = [None] * len(fileList)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=nWorkers) as executor:
+        futures = {executor.submit(processFile, inputFile, *args): i for i, inputFile in enumerate(fileList)}
+        for future in concurrent.futures.as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as error:  # worker process died
+                results[i] = [fileList[i], 'error', 0.0, '%s: %s' % (type(error).__name__, str(error))]
+            print('%s: %s (%.1f s)' % tuple(results[i][0:3]))
+
+    return results
+
+
+def saveManifest(filePath, results):
+    """
+    Save the manifest of the batch. The manifest is a ';' separated file with one line per input file and the columns FILE, STATUS, TIME_S, MESSAGE.
+    """
+    with open(filePath, 'w') as fOut:
+        fOut.write('FILE;STATUS;TIME_S;MESSAGE\n')
+        for [inputFile, status, time_s, message] in results:
+            # long messages (e.g. genfromtxt errors) are truncated
+            message = ' '.join(message.replace(';', ',').split())[:200]
+            fOut.write('%s;%s;%.3f;%s\n' % (inputFile, status, time_s, message))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Batch processing of CAAos jobs.')
+    parser.add_argument('inputs', nargs='+', help='.job files, raw data files, directories or glob patterns')
+    parser.add_argument('--operations', nargs='+', default=None, help='.PPO/.ARO files applied to raw data files. If not given, .job files are processed')
+    parser.add_argument('--module', choices=['preprocessing', 'ARanalysis'], default='ARanalysis', help='active module (default: ARanalysis)')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: number of processors)')
+    parser.add_argument('--manifest', default='manifest.csv', help='manifest file (default: manifest.csv)')
+    parser.add_argument('--reader', choices=['fast', 'genfromtxt'], default='fast', help='raw data reader (default: fast)')
+    parser.add_argument('--cache', action='store_true', help='use the binary sidecar cache of the raw data files')
+    parser.add_argument('--cacheDir', default=None, help='directory of the sidecar cache (default: next to the raw data files)')
+    parser.add_argument('--saveJob', action='store_true', help='save the resulting .job of raw data files')
+    parser.add_argument('--quiet', action='store_true', help='discard the messages of the workers')
+    parser.add_argument('--stateCache', default=None, help='directory of the cache of intermediate preprocessing states (default: no cache)')
+    args = parser.parse_args(argv)
+
+    fileList = listInputFiles(args.inputs, args.operations)
+    if len(fileList) == 0:
+        print('No input files found. Exiting...')
+        return 1
+
+    print('Processing %d files...' % len(fileList))
+    tStart = time.time()
+    results = runBatch(fileList, args.operations, args.module, args.reader, args.cache or args.cacheDir is not None, args.saveJob, args.quiet,
+                       args.workers, args.stateCache, args.cacheDir)
+    saveManifest(args.manifest, results)
+
+    nErrors = len([r for r in results if r[1] != 'ok'])
+    print('Done! %d files in %.1f s, %d errors. Manifest: %s' % (len(results), time.time() - tStart, nErrors, args.manifest))
+    return 0 if nErrors == 0 else 2
+
+
+if __name__ == '__main__':
+
+    if sys.version_info.major == 2:
+        sys.stdout.write('Sorry! This program requires Python 3.x\n')
+        sys.exit(1)
+
+    sys.exit(main())
@@ -0,0 +1,532 @@
+#!/bin/python
+
+# -*- coding: utf-8 -*-
+"""
+Readers of raw data files (.EXP, .DAT, .CSV, .PAR) and binary sidecar cache of the parsed data.
+
+The functions of this module do not depend on :class:`~patientData.patientData`. Data is returned as contiguous float arrays, one row per channel.
+"""
+import hashlib
+import os
+
+import numpy as np
+from lxml import etree as ETree
+
+import tools
+
+
+def _tokenizeLines(lines, delimiter=None):
+    """
+    split a list of lines into a flat list of tokens.
+
+    Parameters
+    ----------
+    lines: list of str
+        lines of the file
+    delimiter: str or None
+        column delimiter. If None, any whitespace is considered a delimiter.
+
+    Returns
+    -------
+    [tokens, nLines]: flat list of tokens and the number of non empty lines
+    """
+    text = ''.join(lines)
+    if delimiter is not None:
+        text = text.replace(delimiter, ' ')
+    nLines = sum(1 for line in lines if line.strip())
+    return [text.split(), nLines]
+
+
+def getFileType(fileName):
+    """
+    Return the type of a raw data file, based on its extension
+
+    Returns
+    -------
+    fileType: str or None
+        'EXP_DAT' (.EXP, .DAT), 'CSV' (.CSV), 'PAR' (.PAR) or None if the extension is not recognized
+    """
+    extension = os.path.splitext(fileName)[1].upper()
+
+    if extension in ['.EXP', '.DAT']:
+        return 'EXP_DAT'
+    if extension in ['.CSV']:
+        return 'CSV'
+    if extension in ['.PAR']:
+        return 'PAR'
+    return None
+
+
+def readHeader(fileName, fileType):
+    """
+    Read header information of raw data files.
+
+    See :meth:`patientData.patientData.loadDATAfileHeader` for the description of the header formats.
+
+    Parameters
+    ----------
+    fileName: str
+        full path to the file
+    fileType: str {'EXP_DAT', 'CSV', 'PAR'}
+        type of the file. See :func:`getFileType`
+
+    Returns
+    -------
+    header: dict
+        dictionary with keys
+          - 'samplingRate_Hz': sampling rate
+          - 'labels', 'units': list of labels and units of the columns. For EXP_DAT files, the first two columns (time stamp and sample #) are
+            included
+          - 'nChannels': number of channels
+          - 'sizeHeader': number of lines of the header
+          - 'nColumns': number of columns of the table of data, including columns that are not channels
+          - 'usecols': columns of the table that contain channel data
+          - 'delimiter': column delimiter. None means any whitespace
+    """
+    header = {}
+    with open(fileName, 'r') as file:
+        if fileType == 'EXP_DAT':
+            line = file.readline()
+            sizeHeader = 1
+
+            # extract sampling frequency in Hz
+            while not line.startswith('Sampling Rate'):
+                sizeHeader += 1
+                line = file.readline()
+
+            header['samplingRate_Hz'] = float(line.split()[2].replace(',', '.').replace('Hz', ''))
+
+            # next 2 lines should contain labels and units
+            header['labels'] = file.readline().rstrip().replace(' ', '_').replace('.', '').split('\t')
+            header['units'] = file.readline().rstrip().split('\t')
+
+            header['nChannels'] = len(header['units']) - 2
+            header['sizeHeader'] = sizeHeader + 2
+            # col 0: time stamp, col 1: sample #
+            header['nColumns'] = header['nChannels'] + 2
+            header['usecols'] = list(range(2, header['nChannels'] + 2))
+            header['delimiter'] = None
+
+        if fileType == 'CSV':
+            header['samplingRate_Hz'] = float(file.readline().rstrip().split(';')[1])
+
+            # next 2 lines should contain labels and units
+            header['labels'] = file.readline().rstrip().replace(' ', '_').replace('.', '').split(';')
+            header['units'] = file.readline().rstrip().split(';')
+            header['sizeHeader'] = 3
+
+            header['nChannels'] = len(header['units'])
+            header['nColumns'] = header['nChannels']
+            header['usecols'] = list(range(header['nChannels']))
+            header['delimiter'] = ';'
+
+        if fileType == 'PAR':
+            # PAR files have no header. Only the first two lines are needed to find the sampling rate
+            firstLine = file.readline().split()
+            secondLine = file.readline().split()
+
+            # sampling freq
+            header['samplingRate_Hz'] = 1.0 / (float(secondLine[0]) - float(firstLine[0]))
+            header['labels'] = ['CBFVL', 'APB', 'CBFVR']
+            header['units'] = ['cm/s', 'cmHg', 'cm/s']
+            header['sizeHeader'] = 0
+            header['nChannels'] = 3
+            # col 0: time, col 1: CBFVL, col 2: APB, col 3: CBFVR
+            header['nColumns'] = len(firstLine)
+            header['usecols'] = [1, 2, 3]
+            header['delimiter'] = None
+
+    return header
+
+
+def _iterBlocks(fileName, skipHeader, nColumns, usecols, delimiter=None, chunkSize=4194304):
+    """
+    Generator that reads the table of data of a raw data file in blocks of whole lines.
+
+    See :func:`readDataBlock` for the description of the arguments.
+
+    Yields
+    ------
+    block: 2D ndarray or None
+        array with shape (len(usecols), nLinesBlock). Yields None and stops if the block is not regular.
+    """
+    with open(fileName, 'r') as file:
+        for i in range(skipHeader):
+            file.readline()
+
+        while True:
+            lines = file.readlines(chunkSize)
+            if not lines:
+                return
+
+            [tokens, nLines] = _tokenizeLines(lines, delimiter)
+            if len(tokens) != nLines * nColumns:
+                yield None
+                return
+
+            block = np.empty((len(usecols), nLines))
+            try:
+                for i, col in enumerate(usecols):
+                    block[i] = np.array(tokens[col::nColumns], dtype=float)
+            except ValueError:
+                yield None
+                return
+            yield block
+
+
+def readDataBlock(fileName, skipHeader, nColumns, usecols, delimiter=None, chunkSize=4194304):
+    """
+    Fast column-selective reader of the numeric block of raw data files.
+
+    The file is read in chunks of whole lines. Each chunk is split into tokens in bulk and only the columns listed in `usecols` are converted to float.
+    Columns not listed (e.g. time stamp and sample number of .EXP/.DAT files) are never decoded.
+
+    Parameters
+    ----------
+    fileName: str
+        full path to the file
+    skipHeader: int
+        number of header lines to skip
+    nColumns: int
+        number of columns of each line of the table, including the columns that will be discarded
+    usecols: list of int
+        columns to convert, in the order they should appear in the output
+    delimiter: str or None
+        column delimiter. If None (default), any whitespace is considered a delimiter.
+    chunkSize: int
+        approximate number of characters read at once (default: 4MB). Limits the size of the temporary list of tokens.
+
+    Returns
+    -------
+    data: 2D ndarray or None
+        array with shape (len(usecols), nRows). Each row is a contiguous array with the data of one column.
+        Returns None if the table is not regular (missing values, extra columns, etc.). In this case the caller should fall back to a more
+        tolerant reader, like numpy.genfromtxt.
+    """
+    blocks = []
+    for block in _iterBlocks(fileName, skipHeader, nColumns, usecols, delimiter, chunkSize):
+        if block is None:
+            return None
+        blocks.append(block)
+
+    if len(blocks) == 0:
+        return np.empty((len(usecols), 0))
+
+    if len(blocks) == 1:
+        return blocks[0]
+
+    return np.concatenate(blocks, axis=1)
+
+
+def readColumn(fileName, skipHeader, nColumns, column, delimiter=None, chunkSize=4194304):
+    """
+    Read a single column of the numeric block of raw data files. See :func:`readDataBlock`.
+
+    To load several channels on demand, use :class:`columnLoader`, that reads the file only once.
+
+    Parameters
+    ----------
+    column: int
+        column to convert.
+
+    see :func:`readDataBlock` for the other parameters.
+
+    Returns
+    -------
+    data: 1D ndarray or None
+        data of the column. Returns None if the table is not regular.
+    """
+    data = readDataBlock(fileName, skipHeader, nColumns, [column], delimiter, chunkSize)
+    if data is None:
+        return None
+    return data[0]
+
+
+class columnLoader():
+    """
+    Loader of columns of the numeric block of a raw data file, used to load channels on demand.
+
+    The first call to :meth:`load` reads all the pending columns in a single pass of the file. The columns not requested yet are kept until
+    they are requested.
+
+    Parameters
+    ----------
+    columns: list of int
+        columns that will be loaded on demand.
+
+    see :func:`readDataBlock` for the other parameters.
+
+    **Example**
+
+    >>> import dataReader
+    >>> loader = dataReader.columnLoader('data.EXP', skipHeader=10, nColumns=6, columns=[3, 4, 5])
+    >>> data3 = loader.load(3)  # reads columns 3, 4 and 5
+    >>> data4 = loader.load(4)  # does not read the file again
+    """
+
+    def __init__(self, fileName, skipHeader, nColumns, columns, delimiter=None, chunkSize=4194304):
+        self.fileName = fileName
+        self.skipHeader = skipHeader
+        self.nColumns = nColumns
+        self.delimiter = delimiter
+        self.chunkSize = chunkSize
+        self._pending = list(columns)
+        self._loaded = {}
+
+    def load(self, column):
+        """
+        Return the data of the column (1D ndarray), or None if the table is not regular.
+
+        Each column is kept only until it is returned. A column requested again (e.g. after an undo) is read again from the file.
+        """
+        if column not in self._loaded:
+            columns = self._pending + [column] if column not in self._pending else self._pending
+            data = readDataBlock(self.fileName, self.skipHeader, self.nColumns, columns, self.delimiter, self.chunkSize)
+            if data is None:
+                return None
+            self._loaded.update(zip(columns, data))
+            self._pending = []
+        return self._loaded.pop(column)
+
+
+def iterChunks(fileName, chunkLength_s, overlap=0.0, chunkSize=4194304):
+    """
+    Generator of fixed-duration, time-aligned multichannel chunks of a raw data file (.EXP, .DAT, .CSV, .PAR).
+
+    The file is never loaded entirely. Only the current chunk and one block of lines (see `chunkSize`) are kept in memory.
+
+    Parameters
+    ----------
+    fileName: str
+        full path to the file
+    chunkLength_s: float
+        duration of each chunk, in seconds
+    overlap: float, optional
+        overlap between consecutive chunks, as a fraction of `chunkLength_s`. Valid values: [0,1). Default: 0.0 (no overlap)
+    chunkSize: int, optional
+        approximate number of characters read from the file at once
+
+    Yields
+    ------
+    [tStart_s, chunk]
+        tStart_s: time of the first sample of the chunk, in seconds, counted from the beginning of the file.
+        chunk: 2D ndarray with shape (nChannels, nSamples). The last chunk might be shorter than `chunkLength_s`.
+
+    **Example**
+
+    >>> import dataReader
+    >>> for [tStart_s, chunk] in dataReader.iterChunks('data.EXP', chunkLength_s=60.0, overlap=0.5):
+    >>>     print(tStart_s, chunk.mean(axis=1))
+    """
+    fileType = getFileType(fileName)
+    if fileType is None:
+        raise ValueError('file type of %s not recognized' % fileName)
+
+    if not 0.0 <= overlap < 1.0:
+        raise ValueError('overlap must be in the interval [0,1)')
+
+    header = readHeader(fileName, fileType)
+
+    nSamples = int(round(chunkLength_s * header['samplingRate_Hz']))
+    if nSamples < 1:
+        raise ValueError('chunkLength_s is shorter than one sample')
+
+    hop = max(1, nSamples - int(round(overlap * nSamples)))
+
+    buffer = np.empty((header['nChannels'], 0))
+    startSample = 0
+    for block in _iterBlocks(fileName, header['sizeHeader'], header['nColumns'], header['usecols'], header['delimiter'], chunkSize):
+        if block is None:
+            raise ValueError('irregular table of data in %s' % fileName)
+
+        buffer = np.concatenate((buffer, block), axis=1)
+        while buffer.shape[1] >= nSamples:
+            yield [startSample / header['samplingRate_Hz'], buffer[:, :nSamples]]
+            buffer = buffer[:, hop:]
+            startSample += hop
+
+    # remaining samples, not covered by the previous chunks
+    if buffer.shape[1] > 0 and (startSample == 0 or buffer.shape[1] > nSamples - hop):
+        yield [startSample / header['samplingRate_Hz'], buffer]
+
+
+def fileFingerprint(fileName, computeHash=True, blockSize=1048576):
+    """
+    Fingerprint of a file, used as the key of the binary sidecar cache.
+
+    Parameters
+    ----------
+    fileName: str
+        full path to the file
+    computeHash: bool
+        if False, only size and modification time are returned. The hash field is set to None.
+    blockSize: int
+        size of the blocks read to compute the hash
+
+    Returns
+    -------
+    fingerprint: dict
+        dictionary with keys 'size' (bytes), 'mtime' (modification time, in ns) and 'hash' (sha1 hex digest of the content)
+    """
+    stat = os.stat(fileName)
+    fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': None}
+
+    if computeHash:
+        sha1 = hashlib.sha1()
+        with open(fileName, 'rb') as file:
+            for block in iter(lambda: file.read(blockSize), b''):
+                sha1.update(block)
+        fingerprint['hash'] = sha1.hexdigest()
+
+    return fingerprint
+
+
+def sidecarFiles(fileName, cacheDir=None):
+    """
+    Return the names of the files of the binary sidecar cache of a raw data file
+
+    Ex: /path/to/file.DAT
+            data file: /path/to/file.DAT.cache.npy
+            metadata file: /path/to/file.DAT.cache.xml
+
+    If `cacheDir` is given, the files are written in this directory. Their names are prefixed with the hash of the directory of the raw data
+    file, so that files with the same name in different directories do not share the cache.
+    Ex: cacheDir=/tmp/cache
+            data file: /tmp/cache/<hash of /path/to>_file.DAT.cache.npy
+
+    Returns
+    -------
+        [dataFile, metadataFile]
+    """
+    if cacheDir is not None:
+        dirHash = hashlib.sha1(os.path.dirname(os.path.abspath(fileName)).encode()).hexdigest()[:12]
+        fileName = os.path.join(cacheDir, dirHash + '_' + os.path.basename(fileName))
+    return [fileName + '.cache.npy', fileName + '.cache.xml']
+
+
+def saveSidecar(fileName, channelData, labels, units, samplingRate_Hz, fingerprint, cacheDir=None):
+    """
+    Save the binary sidecar cache of a raw data file.
+
+    The cache is composed by two files. See :func:`sidecarFiles`.
+      - .npy file: 2D float array with shape (nChannels, nPoints). One row per channel.
+      - .xml file: fingerprint of the source file and header information (labels, units, sampling rate)
+
+    Parameters
+    ----------
+    fileName: str
+        full path to the source (raw data) file
+    channelData: list of 1D ndarrays or 2D ndarray
+        data of the channels. All channels must have the same length
+    labels, units: list of str
+        labels and units of the channels
+    samplingRate_Hz: float
+        sampling rate
+    fingerprint: dict
+        fingerprint of the source file. See :func:`fileFingerprint`
+    cacheDir: str or None
+        directory of the cache files. If None (default), the files are written next to the source file. See :func:`sidecarFiles`
+
+    Returns
+    -------
+    success: bool
+        False if the cache could not be written (read-only directory, disk full, etc.)
+    """
+    [dataFile, metaFile] = sidecarFiles(fileName, cacheDir)
+
+    root = ETree.Element('sidecarCache')
+    root.set('version', '1')
+    source = tools.ETaddElement(root, 'source', text=os.path.basename(fileName))
+    source.set('size', str(fingerprint['size']))
+    source.set('mtime', str(fingerprint['mtime']))
+    source.set('hash', str(fingerprint['hash']))
+    tools.ETaddElement(root, 'samplingRate_Hz', text=repr(float(samplingRate_Hz)))
+    tools.ETaddElement(root, 'nChannels', text=str(len(labels)))
+    for label, unit in zip(labels, units):
+        tools.ETaddElement(root, 'channel', attribList=[['label', label], ['unit', unit]])
+
+    try:
+        if cacheDir is not None:
+            os.makedirs(cacheDir, exist_ok=True)
+        # write to temporary files first, so that an interrupted write never leaves a valid-looking cache behind
+        with open(dataFile + '.tmp', 'wb') as file:
+            np.save(file, np.ascontiguousarray(np.vstack(channelData), dtype=np.float64))
+        with open(metaFile + '.tmp', 'wb') as file:
+            file.write(ETree.tostring(root, pretty_print=True, encoding='UTF-8', xml_declaration=True))
+        os.replace(dataFile + '.tmp', dataFile)
+        os.replace(metaFile + '.tmp', metaFile)
+    except OSError:
+        for tempFile in [dataFile + '.tmp', metaFile + '.tmp']:
+            if os.path.exists(tempFile):
+                os.remove(tempFile)
+        return False
+
+    return True
+
+
+def loadSidecar(fileName, cacheDir=None):
+    """
+    Load the binary sidecar cache of a raw data file, if it is valid.
+
+    The cache is valid if the size and the modification time of the source file match the values stored in the cache. If only the modification
+    time differs (e.g. the file was copied), the hash of the content is verified and the cache is updated if the content is the same.
+
+    The data is memory-mapped in copy-on-write mode: no data is read or copied until it is accessed and changes in memory are never written
+    back to the cache.
+
+    Parameters
+    ----------
+    fileName: str
+        full path to the source (raw data) file
+    cacheDir: str or None
+        directory of the cache files. If None (default), the files are next to the source file. See :func:`sidecarFiles`
+
+    Returns
+    -------
+    [channelData, labels, units, samplingRate_Hz, fingerprint] or None if there is no valid cache
+        channelData is a list of 1D contiguous arrays, one per channel. Incomplete or corrupted metadata files are not valid caches.
+    """
+    [dataFile, metaFile] = sidecarFiles(fileName, cacheDir)
+
+    if not (os.path.isfile(dataFile) and os.path.isfile(metaFile)):
+        return None
+
+    # the fields are read with find(): tools.getElemValueXpath ends the program if an element is missing
+    try:
+        root = ETree.parse(metaFile).getroot()
+        source = root.find('source')
+        fingerprint = {'size': int(source.attrib['size']), 'mtime': int(source.attrib['mtime']), 'hash': source.attrib['hash']}
+        samplingRate_Hz = float(root.find('samplingRate_Hz').text)
+        labels = [elem.attrib['label'] for elem in root.findall('channel')]
+        units = [elem.attrib['unit'] for elem in root.findall('channel')]
+    except (ETree.XMLSyntaxError, AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+    current = fileFingerprint(fileName, computeHash=False)
+    if current['size'] != fingerprint['size']:
+        return None
+
+    if current['mtime'] != fingerprint['mtime']:
+        current = fileFingerprint(fileName, computeHash=True)
+        if current['hash'] != fingerprint['hash']:
+            return None
+        fingerprint['mtime'] = current['mtime']
+        # content did not change. Register the new modification time
+        root.find('source').set('mtime', str(current['mtime']))
+        try:
+            with open(metaFile, 'wb') as file:
+                file.write(ETree.tostring(root, pretty_print=True, encoding='UTF-8', xml_declaration=True))
+        except OSError:
+            pass
+
+    try:
+        block = np.load(dataFile, mmap_mode='c')
+    except (OSError, ValueError):
+        return None
+
+    if block.ndim != 2 or block.shape[0] != len(labels):
+        return None
+
+    channelData = [np.asarray(block[i]) for i in range(block.shape[0])]
+
+    return [channelData, labels, units, samplingRate_Hz, fingerprint]
@@ -0,0 +1,258 @@
+#!/bin/python
+
+# -*- coding: utf-8 -*-
+"""
+Delay between channels, by cross-correlation limited to a range of lags.
+
+Physiological delays between channels are short (at most a few hundred milliseconds), so only the lags in a small window are computed. The
+channel is split in blocks and the correlation of each block with the matching segment of the reference is computed with FFTs of about
+the size of the lag window, so the cost grows linearly with the length of the signal. :func:`delayTrack` finds the delay in sliding windows, to
+follow delays that drift along the recording.
+"""
+import numpy as np
+from scipy import signal as scipySignal
+
+# number of samples transformed at once, limits the memory of the correlations
+FFT_BATCH_SIZE = 2 ** 20
+
+
+def _blockCorrelations(segments, blocks, nLags):
+    """
+    Correlation of each block with its segment of the reference, for nLags lags: corr[i, j] = sum_m segments[i, m + j] * blocks[i, m].
+
+    The FFTs of the blocks are computed in batches of about FFT_BATCH_SIZE samples.
+    """
+    fftLength = 2 ** int(np.ceil(np.log2(segments.shape[1])))
+    corr = np.zeros((blocks.shape[0], nLags))
+    batch = max(1, FFT_BATCH_SIZE // fftLength)
+    for first in range(0, blocks.shape[0], batch):
+        spectrum = np.fft.rfft(segments[first:first + batch], fftLength, axis=1)
+        spectrum *= np.conj(np.fft.rfft(blocks[first:first + batch], fftLength, axis=1))
+        corr[first:first + batch] = np.fft.irfft(spectrum, fftLength, axis=1)[:, :nLags]
+    return corr
+
+
+def laggedCorrelation(reference, data, minLag, maxLag):
+    """
+    Cross-correlation for lags minLag..maxLag.
+
+    corr[k - minLag] = sum_n reference[n + k] * data[n], with zeros outside the signals. This is the same of
+    scipy.signal.correlate(reference, data)[k + len(data) - 1], computed only for the requested lags.
+
+    Parameters
+    ----------
+    reference: 1D numpy array
+        reference signal
+    data: 1D numpy array
+        signal
+    minLag, maxLag: int
+        range of lags, in samples
+
+    Returns
+    -------
+    corr: 1D numpy array
+        correlation for the lags minLag..maxLag
+    """
+    reference = np.asarray(reference, dtype=float)
+    data = np.asarray(data, dtype=float)
+    nLags = maxLag - minLag + 1
+
+    blockLength = max(nLags, 1024)
+    nBlocks = int(np.ceil(len(data) / float(blockLength)))
+
+    # blocks of data and, for each block, the segment of the reference that overlaps it for all lags. Zeros outside the signals
+    blocks = np.zeros(nBlocks * blockLength)
+    blocks[:len(data)] = data
+    blocks = blocks.reshape(nBlocks, blockLength)
+
+    segments = np.zeros(nBlocks * blockLength + nLags - 1)  # segments[t] = reference[t + minLag]
+    start = max(minLag, 0)
+    end = min(len(reference), minLag + len(segments))
+    if end > start:
+        segments[start - minLag:end - minLag] = reference[start:end]
+    segments = np.lib.stride_tricks.sliding_window_view(segments, blockLength + nLags - 1)[::blockLength]
+
+    return _blockCorrelations(segments, blocks, nLags).sum(axis=0)
+
+
+def normalizedCorrelation(reference, data, minLag, maxLag):
+    """
+    Correlation coefficient of the overlapping parts of the signals, for lags minLag..maxLag.
+
+    For each lag k, the coefficient is computed from the samples where both data[n] and reference[n + k] exist, with the mean and the energy of
+    these samples only. Unlike :func:`laggedCorrelation`, the result does not decrease with the length of the overlap, so lags far from zero
+    are not penalized. The sums over the overlaps are computed with cumulative sums.
+
+    Parameters
+    ----------
+    reference: 1D numpy array
+        reference signal
+    data: 1D numpy array
+        signal
+    minLag, maxLag: int
+        range of lags, in samples
+
+    Returns
+    -------
+    corr: 1D numpy array
+        correlation coefficient for the lags minLag..maxLag, between -1 and 1. Zero for lags without overlap or with a constant overlap
+    """
+    reference = np.asarray(reference, dtype=float)
+    data = np.asarray(data, dtype=float)
+    lags = np.arange(minLag, maxLag + 1)
+
+    # overlap of each lag: data[dataStart:dataEnd] and reference[dataStart + k:dataEnd + k]
+    dataStart = np.clip(-lags, 0, len(data))
+    dataEnd = np.clip(len(reference) - lags, dataStart, len(data))
+    nOverlap = dataEnd - dataStart
+
+    [dataSum, dataSquares, refSum, refSquares] = [np.concatenate(([0.0], np.cumsum(x))) for x in [data, data ** 2, reference, reference ** 2]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dataMean = (dataSum[dataEnd] - dataSum[dataStart]) / nOverlap
+        refMean = (refSum[dataEnd + lags] - refSum[dataStart + lags]) / nOverlap
+        dataVar = dataSquares[dataEnd] - dataSquares[dataStart] - nOverlap * dataMean ** 2
+        refVar = refSquares[dataEnd + lags] - refSquares[dataStart + lags] - nOverlap * refMean ** 2
+        corr = (laggedCorrelation(reference, data, minLag, maxLag) - nOverlap * dataMean * refMean) / np.sqrt(dataVar * refVar)
+
+    valid = (nOverlap > 1) & (dataVar > 0) & (refVar > 0)
+    return np.where(valid, corr, 0.0)
+
+
+def _parabolicPeaks(values):
+    # parabolicPeak of each row
+    idx = np.argmax(values, axis=1)
+    inner = (idx > 0) & (idx < values.shape[1] - 1)
+    rows = np.arange(values.shape[0])
+    left = values[rows, np.clip(idx - 1, 0, None)]
+    center = values[rows, idx]
+    right = values[rows, np.clip(idx + 1, None, values.shape[1] - 1)]
+    curvature = left - 2 * center + right
+
+    refine = inner & (curvature < 0)
+    position = idx.astype(float)
+    position[refine] += 0.5 * (left[refine] - right[refine]) / curvature[refine]
+    return position
+
+
+def parabolicPeak(values):
+    """
+    Position of the maximum of `values`, refined by fitting a parabola to the maximum and its neighbours.
+
+    Returns
+    -------
+    position: float
+        position of the maximum, in samples. If the maximum is at the first or last sample, it is not refined.
+    """
+    return float(_parabolicPeaks(np.asarray(values, dtype=float)[np.newaxis, :])[0])
+
+
+def estimateDelay(reference, data, maxLag, decimationFactor=1):
+    """
+    Delay of `data` with respect to `reference`, in samples, with sub-sample precision.
+
+    The delay is the lag of the maximum of the correlation coefficient of the signals (see :func:`normalizedCorrelation`), within +- maxLag
+    samples, refined with :func:`parabolicPeak`. The coefficient is normalized by the overlap of the signals, so signals with strong low
+    frequencies (e.g. drifts) are not biased towards zero lag. It has the sign of the lag of scipy.signal.correlate(reference, data):
+    data[n] ~ reference[n + delay]. For example, if data is reference delayed by 7 samples (data[n] = reference[n - 7]), the delay is -7
+
+    Parameters
+    ----------
+    reference: 1D numpy array
+        reference signal
+    data: 1D numpy array
+        signal
+    maxLag: int
+        largest delay, in samples
+    decimationFactor: int, optional
+        If larger than 1, the delay is first searched in decimated copies of the signals, then refined at the full rate within
+        +- decimationFactor samples. Default: 1 (no decimation)
+
+    Returns
+    -------
+    delay: float
+        delay, in samples
+    """
+    reference = np.asarray(reference, dtype=float) - np.mean(reference)
+    data = np.asarray(data, dtype=float) - np.mean(data)
+    maxLag = int(maxLag)
+
+    [minLag, maxLagFine] = [-maxLag, maxLag]
+    if decimationFactor > 1:
+        coarseLag = int(np.ceil(maxLag / float(decimationFactor)))
+        corr = normalizedCorrelation(scipySignal.decimate(reference, decimationFactor, ftype='fir', zero_phase=True),
+                                     scipySignal.decimate(data, decimationFactor, ftype='fir', zero_phase=True), -coarseLag, coarseLag)
+        coarseDelay = (int(np.argmax(corr)) - coarseLag) * decimationFactor
+        minLag = max(coarseDelay - decimationFactor, -maxLag)
+        maxLagFine = min(coarseDelay + decimationFactor, maxLag)
+
+    # one extra lag on each side to refine a maximum at the limits of the window
+    corr = normalizedCorrelation(reference, data, minLag - 1, maxLagFine + 1)
+    delay = parabolicPeak(corr) + minLag - 1
+    return min(max(delay, -maxLag), maxLag)
+
+
+def delayTrack(reference, data, windowLength, step, maxLag):
+    """
+    Delay of `data` with respect to `reference` along the signal, in sliding windows.
+
+    The delay of each window is the lag of the maximum of the correlation coefficient of the window with the reference, within +- maxLag
+    samples, refined with :func:`parabolicPeak`. As in :func:`normalizedCorrelation`, the coefficient of each window and lag is computed from the
+    overlapping samples only, with their mean and energy, so trends along the recording do not bias the delays. The correlations of all windows
+    are computed together, with a batched FFT, and the sums over the overlaps with cumulative sums.
+
+    Parameters
+    ----------
+    reference: 1D numpy array
+        reference signal
+    data: 1D numpy array
+        signal, with the same sampling rate of reference
+    windowLength: int
+        length of the windows, in samples
+    step: int
+        distance between the start of consecutive windows, in samples
+    maxLag: int
+        largest delay, in samples
+
+    Returns
+    -------
+    [center, delay]: list of 1D numpy arrays
+        center of each window and its delay (data[n] ~ reference[n + delay]), in samples
+    """
+    maxLag = int(maxLag)
+    nPoints = min(len(reference), len(data))
+    windowLength = min(int(windowLength), nPoints)
+    nLags = 2 * maxLag + 1
+
+    # the global means are removed to reduce the rounding errors of the sums. They do not change the coefficients
+    reference = np.asarray(reference[:nPoints], dtype=float)
+    reference = reference - np.mean(reference)
+    data = np.asarray(data[:nPoints], dtype=float)
+    data = data - np.mean(data)
+
+    # window i is data[start:start + windowLength], its reference segment is reference[start - maxLag:start + windowLength + maxLag], with zeros
+    # outside the reference
+    padded = np.concatenate((np.zeros(maxLag), reference, np.zeros(maxLag)))
+    blocks = np.lib.stride_tricks.sliding_window_view(data, windowLength)[::int(step)]
+    segments = np.lib.stride_tricks.sliding_window_view(padded, windowLength + nLags - 1)[::int(step)]
+    crossSum = _blockCorrelations(segments, blocks, nLags)
+
+    # overlap of each window and lag k: data[start + first:start + last] and reference[start + first + k:start + last + k]
+    start = np.arange(blocks.shape[0])[:, np.newaxis] * int(step)
+    lags = np.arange(-maxLag, maxLag + 1)[np.newaxis, :]
+    first = np.clip(-start - lags, 0, windowLength)
+    last = np.clip(nPoints - start - lags, first, windowLength)
+    nOverlap = last - first
+
+    [dataSum, dataSquares, refSum, refSquares] = [np.concatenate(([0.0], np.cumsum(x))) for x in [data, data ** 2, reference, reference ** 2]]
+    [dataStart, dataEnd] = [start + first, start + last]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dataMean = (dataSum[dataEnd] - dataSum[dataStart]) / nOverlap
+        refMean = (refSum[dataEnd + lags] - refSum[dataStart + lags]) / nOverlap
+        dataVar = dataSquares[dataEnd] - dataSquares[dataStart] - nOverlap * dataMean ** 2
+        refVar = refSquares[dataEnd + lags] - refSquares[dataStart + lags] - nOverlap * refMean ** 2
+        corr = (crossSum - nOverlap * dataMean * refMean) / np.sqrt(dataVar * refVar)
+    corr = np.where((nOverlap > 1) & (dataVar > 0) & (refVar > 0), corr, 0.0)
+
+    delay = np.clip(_parabolicPeaks(corr) - maxLag, -maxLag, maxLag)
+    center = np.arange(blocks.shape[0]) * int(step) + (windowLength - 1) / 2.0
+    return [center, delay]
@@ -0,0 +1,193 @@
+#!/bin/python
+
+# -*- coding: utf-8 -*-
+"""
+Compiler of operations elements (**.job**, **.PPO**, **.ARO** files) into execution plans.
+
+An execution plan is a list of :class:`operation` objects, with the parameters already converted to the expected types and validated.
+Plans do not depend on the recording and can be reused to process many recordings. See :meth:`patientData.patientData.runOperationsPlan`.
+"""
+import copy
+
+from lxml import etree as ETree
+
+import tools
+
+# specification of the operations: tag -> list of [field, valType, required]
+# valType: see tools.convStr.  Fields not required are None if not present
+OPERATION_SPECS = {'preprocessing': {'setType': [['type', 'str', True], ['channel', 'int', True]],
+                                     'setLabel': [['label', 'str', True], ['channel', 'int', True]],
+                                     'setUnit': [['unit', 'str', True], ['channel', 'int', True]],
+                                     'resample': [['sampleRate', 'float', True], ['method', 'str', True], ['channel', 'int', True]],
+                                     'calibrate': [['valMin', 'float', True], ['valMax', 'float', True], ['method', 'str', True],
+                                                   ['segmentIndexes', 'list_int', True], ['channel', 'int', True]],
+                                     'synchronize': [['method', 'str', True], ['channels', 'list_int', False], ['ABPdelay_s', 'float', False],
+                                                     ['maxLag_s', 'float', False], ['decimationFactor', 'int', False]],
+                                     'delayTrack': [['channels', 'list_int', True], ['windowLength_s', 'float', True], ['step_s', 'float', True],
+                                                    ['maxLag_s', 'float', True], ['warp', 'bool', True]],
+                                     'LPfilter': [['method', 'str', True], ['channel', 'int', True], ['Ntaps', 'int', False], ['order', 'int', False]],
+                                     'interpolate': [['frameStart', 'int', True], ['frameEnd', 'int', True], ['method', 'str', True],
+                                                     ['channel', 'int', True]],
+                                     'cropInterval': [['frameStart', 'int', True], ['frameEnd', 'int', True], ['RemoveSegment', 'bool', True],
+                                                      ['segmentIndexes', 'list_int', True], ['channel', 'int', True]],
+                                     'findRRmarks': [['refChannel', 'int', True], ['method', 'str', True], ['findPeaks', 'bool', True],
+                                                     ['findValleys', 'bool', True], ['decimationFactor', 'int', False]],
+                                     'remapRRmarks': [['frameStart', 'int', True], ['frameEnd', 'int', True], ['isCrop', 'bool', True]],
+                                     'insertPeak': [['newIdx', 'int', True], ['isPeak', 'bool', True]],
+                                     'removePeak': [['Idx', 'int', True], ['isPeak', 'bool', True]],
+                                     'insertPeaks': [['indexes', 'list_int', True], ['isPeak', 'bool', True]],
+                                     'removePeaks': [['indexes', 'list_int', True], ['isPeak', 'bool', True]],
+                                     'SIGsave': [['channels', 'list_int', True], ['format', 'str', True], ['fileName', 'str', True]],
+                                     'B2Bcalc': [['resampleMethod', 'str', True], ['resampleRate_Hz', 'float', True]],
+                                     'B2Bsave': [['channels', 'list_int', True], ['format', 'str', True], ['fileName', 'str', True], ['features', 'bool', False]],
+                                     'B2B_LPfilter': [['method', 'str', True], ['Ntaps', 'int', True]]},
+                   'ARanalysis': {'PSDwelch': [['useB2B', 'bool', True], ['overlap', 'float', True], ['segmentLength_s', 'float', True],
+                                               ['windowType', 'str', True], ['detrend', 'bool', True], ['filterType', 'str', True],
+                                               ['nTapsFilter', 'int', False]],
+                                  'PSDsave': [['fileName', 'str', True], ['format', 'str', True], ['freqRange', 'str', True]],
+                                  'TFA': [['estimatorType', 'str', True]],
+                                  'TFAsave': [['fileName', 'str', True], ['format', 'str', True], ['freqRange', 'str', True]],
+                                  'TFAsaveStat': [['fileName', 'str', True], ['plotFileFormat', 'str', True], ['remNegPhase', 'bool', True],
+                                                  ['coheTreshold', 'bool', True]],
+                                  'ARI': [],
+                                  'ARIsave': [['fileName', 'str', True], ['plotFileFormat', 'str', True], ['format', 'str', True]],
+                                  'ARIARMA': [['useB2B', 'bool', True], ['p', 'int', True], ['q', 'int', True]],
+                                  'ARIARMAsave': [['fileName', 'str', True], ['plotFileFormat', 'str', True], ['format', 'str', True]],
+                                  'MX': [['useB2B', 'bool', True], ['epochLength_s', 'int', True], ['blockLength_s', 'int', True]],
+                                  'MXsave': [['fileName', 'str', True], ['plotFileFormat', 'str', True], ['format', 'str', True]]}}
+
+# fields required only for some values of another field: tag -> [field, {value: list of required fields}]
+CONDITIONAL_FIELDS = {'synchronize': ['method', {'correlation': ['channels'], 'lagCorrelation': ['channels', 'maxLag_s'], 'fixedAPB': ['ABPdelay_s']}],
+                      'LPfilter': ['method', {'movingAverage': ['Ntaps'], 'median': ['Ntaps'], 'butterworth': ['order']}],
+                      'PSDwelch': ['filterType', {'rect': ['nTapsFilter'], 'boxcar': ['nTapsFilter'], 'triangular': ['nTapsFilter']}]}
+
+
+class operation():
+    """
+    Compiled operation.
+
+    Parameters
+    ----------
+    section: str {'preprocessing', 'ARanalysis'}
+        section of the operation
+    tag: str
+        name of the operation, the same tag used in **.job** files
+    params: dict
+        parameters of the operation, already converted to the types defined in :data:`OPERATION_SPECS`
+    """
+
+    def __init__(self, section, tag, params):
+        self.section = section
+        self.tag = tag
+        self.params = params
+
+    def __repr__(self):
+        return 'operation(%s: %s)' % (self.tag, ', '.join(['%s=%s' % (k, str(v)) for k, v in self.params.items()]))
+
+    def __eq__(self, other):
+        return isinstance(other, operation) and [self.section, self.tag, self.params] == [other.section, other.tag, other.params]
+
+    def copy(self, **params):
+        """
+        Return a copy of the operation. Keyword arguments replace the values of the parameters.
+        """
+        newParams = copy.deepcopy(self.params)
+        newParams.update(params)
+        return operation(self.section, self.tag, newParams)
+
+
+def compileOperation(element, section):
+    """
+    Compile one operation element.
+
+    Each sub element is read only once. The program exits if the operation is not recognized, if a required parameter is missing or if a
+    parameter cannot be converted, like :func:`tools.getElemValueXpath`.
+
+    Parameters
+    ----------
+    element: lxml element
+        operation element, for example <resample>
+    section: str {'preprocessing', 'ARanalysis'}
+        section of the operation
+
+    Returns
+    -------
+    op: :class:`operation`
+    """
+    specs = OPERATION_SPECS[section]
+    if element.tag not in specs:
+        print('Operation \'%s\' not recognized. Exiting...' % element.tag)
+        exit()
+
+    # first occurrence of each sub element, like tools.getElemValueXpath
+    texts = {}
+    for child in element:
+        if child.tag not in texts:
+            texts[child.tag] = child.text
+
+    params = {}
+    for [field, valType, required] in specs[element.tag]:
+        if field not in texts:
+            if required:
+                print('ERROR! Operation \'%s\': parameter -> %s <- not found! Exiting...' % (element.tag, field))
+                exit()
+            params[field] = None
+            continue
+        try:
+            params[field] = tools.convStr(texts[field], valType)
+        except (ValueError, AttributeError):
+            print('ERROR! Operation \'%s\': invalid value of parameter -> %s <- : %s. Exiting...' % (element.tag, field, str(texts[field])))
+            exit()
+
+    if element.tag in CONDITIONAL_FIELDS:
+        [selector, requiredFields] = CONDITIONAL_FIELDS[element.tag]
+        for field in requiredFields.get(params[selector], []):
+            if params[field] is None:
+                print('ERROR! Operation \'%s\' %s=%s: parameter -> %s <- not found! Exiting...' % (element.tag, selector, params[selector], field))
+                exit()
+
+    return operation(section, element.tag, params)
+
+
+def compileOperations(operationsElem, section):
+    """
+    Compile an operations element into an execution plan.
+
+    Parameters
+    ----------
+    operationsElem: lxml element
+        element with the operations, for example <preprocessing> or <ARanalysis>
+    section: str {'preprocessing', 'ARanalysis'}
+        section of the operations
+
+    Returns
+    -------
+    plan: list of :class:`operation`
+    """
+    return [compileOperation(element, section) for element in operationsElem if isinstance(element.tag, str)]
+
+
+def compileOperationsFile(fileName):
+    """
+    Compile all operations of a **.PPO**, **.ARO** or **.job** file into an execution plan.
+
+    Operations files linked in **.job** files (<operationsFile> elements) are not included.
+
+    Parameters
+    ----------
+    fileName: str
+        full path to the file
+
+    Returns
+    -------
+    plan: list of :class:`operation`
+        preprocessing operations followed by AR analysis operations, in the order they appear in the file.
+    """
+    parser = ETree.XMLParser(remove_blank_text=True)
+    rootNode = ETree.parse(fileName, parser).getroot()
+
+    plan = []
+    for section in ['preprocessing', 'ARanalysis']:
+        for elem in rootNode.xpath('%s | operations/%s' % (section, section)):
+            plan += compileOperations(elem, section)
+    return plan
@@ -4,21 +4,28 @@
 .. warning:: Include here brief description of this module
 """
 import copy
+import functools
+import hashlib
 import os
 # -*- coding: utf-8 -*-
 import sys
-from datetime import datetime
 
 import numpy as np
 from lxml import etree as ETree
 from scipy import signal as scipySignal
 
+import dataReader
+import operationsCompiler
+import delayEstimation
+import signals_b2b
 import tools
 from ARI import ARIanalysis
 from ARIARMA import ARIARMAanalysis
 from PSDestimator import PSDestimator
-from signals import signal
+from signals import resampleArray, signal
+from stateCache import STATE_ATTRIBUTES
 from TFA import transferFunctionAnalysis
+from undoHistory import undoHistory
 from Mx import meanFlowIdx
 
 __version__ = '0.2'
@@ -35,6 +42,33 @@ class patientData():
     inputFile : str
         File with patient's data. Accepted files: **.EXP**, **.DAT** (Raw Data file) or **.PPO** (preprocessing operation file)
 
+    reader : str {'fast', 'genfromtxt'}, optional
+        Reader used to parse **.EXP**, **.DAT** and **.CSV** files. 'fast' (default) uses :func:`dataReader.readDataBlock` and falls back to
+        'genfromtxt' if the table is not regular (missing values, etc.). Both readers give identical results.
+
+    useCache : bool, optional
+        If True, the parsed raw data is stored in a memory-mappable binary sidecar file in the first load. Subsequent loads map the sidecar
+        file instead of parsing the raw data again. See :meth:`loadDATAfile`. Default: False
+
+    cacheDir : str or None, optional
+        Directory of the sidecar files, used if `useCache` is True. If None (default), the sidecar files are written next to the raw data
+        file. See :func:`dataReader.sidecarFiles`.
+
+    channels : list, optional
+        Channels parsed when the raw data file is loaded. Each element can be a channel index (int), a channel label, as written in the raw
+        data file, or a signal type ('ABP', 'CBFV_L', etc). Signal types are resolved with the **setType** operations of **.JOB** files.
+        The other channels are loaded on first access to their data. If None (default), all channels are parsed. See :meth:`loadDATAfile`.
+
+    stateCache : :class:`stateCache.stateCache`, optional
+        Cache of intermediate preprocessing states. If given, the preprocessing operations of **.JOB** files resume from the longest prefix of
+        operations already in the cache. See :meth:`runOperationsPlan`. Default: None. The arrays of cached states are shared with the
+        instance and are read-only, see the notes of :meth:`runOperationsPlan`.
+
+    nWorkers : int or None, optional
+        Number of worker processes used by :meth:`findRRmarks` in recordings longer than :attr:`PARALLEL_PEAKS_MIN_DURATION_s`. If None
+        (default), the number of processors of the machine is used. Use 1 when the recording is already processed in a worker process, e.g.
+        by :func:`batchProcessing.runBatch`.
+
     """
 
     @staticmethod
@@ -50,27 +84,33 @@ class patientData():
         """
         return __version__
 
-    def __init__(self, inputFile, activeModule):
+    def __init__(self, inputFile, activeModule, reader='fast', useCache=False, channels=None, stateCache=None, nWorkers=None, cacheDir=None):
         # input file:  .EXP-DAT  or .JOB
         # activeModule- Valid options: 'preprocessing', 'ARanalysis'
+        # reader- Valid options: 'fast', 'genfromtxt'
+        # useCache- use binary sidecar cache of the raw data file
+        # cacheDir- directory of the sidecar cache. None: next to the raw data file
+        # channels- list of channel indexes, labels or types parsed during load. None: all channels
+        # stateCache- instance of stateCache.stateCache or None
+        # nWorkers- worker processes of the RR mark detection of long recordings. None: number of processors
         self.activeModule = activeModule
+        self.DATAreader = reader
+        self.useCache = useCache
+        self.cacheDir = cacheDir
+        self.channelSelection = channels
+        self.stateCache = stateCache
+        self.nWorkers = nWorkers
+        self.DATAfileHash = None
 
         [self.dirName, self.filePrefix, extension] = tools.splitPath(inputFile)
 
         self.hasRRmarks = False
         self.hasB2Bdata = False
-        self.hasPSDdata_L = False
-        self.hasPSDdata_R = False
-        self.hasTFdata_L = False
-        self.hasTFdata_R = False
-        self.hasARIdata_L = False
-        self.hasARIdata_R = False
-        self.hasARIARMAdata_L = False
-        self.hasARIARMAdata_R = False
-        self.hasMXdata_L = False
-        self.hasMXdata_R = False
-        self.historySignals = []
-        self.historyOperations = []
+        self.RRmarksSettings = None  # parameters of findRRmarks, used to detect the RR marks again after cropInterval/interpolate
+        self.delayTracks = None  # channel -> delay track with respect to the ABP channel, see trackDelays
+        self.ARfingerprints = {}  # AR analysis result ('PSD_L', 'TFA_R', etc) -> fingerprint of its inputs and parameters
+        self.ARparameters = {}  # AR analysis ('PSD', 'TFA', etc) -> parameters of the last computation
+        self.history = undoHistory()
 
         if extension.lower() in ['.exp', '.dat', '.csv', '.par']:
             self.newJob(inputFile)
@@ -89,12 +129,7 @@ class patientData():
         # create InputFile Element
         [dir, filePrefix, extension] = tools.splitPath(self.DATAfileName)
 
-        if extension.upper() in ['.EXP', '.DAT']:
-            self.DATAfileType = 'EXP_DAT'
-        if extension.upper() in ['.CSV']:
-            self.DATAfileType = 'CSV'
-        if extension.upper() in ['.PAR']:
-            self.DATAfileType = 'PAR'
+        self.DATAfileType = dataReader.getFileType(self.DATAfileName)
 
         tools.ETaddElement(self.jobRootNode, 'inputFile', text=filePrefix + extension, attribList=[['type', self.DATAfileType]])
 
@@ -109,14 +144,7 @@ class patientData():
         self.jobRootNode = ETree.parse(inputFile_Job, parser).getroot()
         self.DATAfileName = self.dirName + tools.getElemValueXpath(self.jobRootNode, xpath='inputFile', valType='str')
 
-        [dir, filePrefix, extension] = tools.splitPath(self.DATAfileName)
-
-        if extension.upper() in ['.EXP', '.DAT']:
-            self.DATAfileType = 'EXP_DAT'
-        if extension.upper() in ['.CSV']:
-            self.DATAfileType = 'CSV'
-        if extension.upper() in ['.PAR']:
-            self.DATAfileType = 'PAR'
+        self.DATAfileType = dataReader.getFileType(self.DATAfileName)
 
         self.createNewOperation()
 
@@ -131,8 +159,10 @@ class patientData():
 
         # run all operations
         print('running preprocessing operations...')
+        plan = []
         for elem in self.jobRootNode.xpath('operations/preprocessing'):
-            self.runPreprocessingOperations(elem)
+            plan += operationsCompiler.compileOperations(elem, 'preprocessing')
+        self.runOperationsPlan(plan, stateKey=self.getStateKey())
 
         if self.activeModule == 'ARanalysis':
             print('running AR operations...')
@@ -200,14 +230,16 @@ class patientData():
             self.ARoperationsNode = tools.ETaddElement(self.operationsNode, 'ARanalysis', text=None, attribList=None)
 
     def storeState(self):
-        self.historySignals.append(copy.deepcopy(self.signals))
-        self.historyOperations.append(copy.deepcopy(self.PPoperationsNode))
+        """
+        Store the current preprocessing state in the undo history. See :class:`undoHistory.undoHistory`.
+        """
+        self.history.store(self)
 
     def undoState(self):
-        del self.historyOperations[-1]
-        del self.historySignals[-1]
-        self.PPoperationsNode = copy.deepcopy(self.historyOperations[-1])
-        self.signals = copy.deepcopy(self.historySignals[-1])
+        """
+        Restore the state stored before the last call of :meth:`storeState`. The operations registered after that state are removed.
+        """
+        self.history.undo(self)
 
     def loadDATAfileHeader(self):
         """
@@ -241,6 +273,8 @@ class patientData():
         * The number of channels is stored in the attribute :attr:`nChannels`.
         * The sampling rate is stored in the attribute :attr:`samplingRate_Hz`. The value of this attribute is sent to instances of :class:`~signals.signal` after calling :meth:`loadData` and this attribute is removed after that
         * Channel labels and units are stored in the attribute :attr:`signalLabels` and :attr:`signalUnits`. The values of these attributes are sent to instances of :class:`~signals.signal` after calling :meth:`loadData`  and these attributes are removed after that
+        * For **.PAR** files, only the first two lines of the file are read. The sampling rate is derived from their time stamps.
+        * This function returns the dictionary created by :func:`dataReader.readHeader`, with the geometry of the table of data.
 
         **Example**
 
@@ -257,53 +291,15 @@ class patientData():
         ['HH:mm:ss:ms', 'N', 'cm/s', 'cm/s', 'mV', 'mV']
 
         """
-        with open(self.DATAfileName, 'r') as file:
-            if self.DATAfileType == 'EXP_DAT':
-                line = file.readline()
-                self.sizeHeader = 1
-                # extract examination date
-                if False:
-                    while not line.startswith('Examination'):
-                        line = file.readline()
-                        self.sizeHeader += 1
-
-                    date = datetime.strptime(line[12:].split()[0], '%d:%m:%Y').date()
-                    time = datetime.strptime(line[12:].split()[1], '%H:%M:%S').time()
-                    delf.examDate = datetime.combine(date, time)  #: Examination Date.
-
-                # extract sampling frequency in Hz
-                while not line.startswith('Sampling Rate'):
-                    self.sizeHeader += 1
-                    line = file.readline()
+        header = dataReader.readHeader(self.DATAfileName, self.DATAfileType)
 
-                self.samplingRate_Hz = float(line.split()[2].replace(',', '.').replace('Hz', ''))
+        self.samplingRate_Hz = header['samplingRate_Hz']
+        self.signalLabels = header['labels']
+        self.signalUnits = header['units']
+        self.nChannels = header['nChannels']
+        self.sizeHeader = header['sizeHeader']
 
-                # next 2 lines should contain labels and units
-                self.signalLabels = file.readline().rstrip().replace(' ', '_').replace('.', '').split('\t')
-                self.signalUnits = file.readline().rstrip().split('\t')
-
-                self.nChannels = len(self.signalUnits) - 2
-                self.sizeHeader += 2
-
-            if self.DATAfileType == 'CSV':
-                self.samplingRate_Hz = float(file.readline().rstrip().split(';')[1])
-
-                # next 2 lines should contain labels and units
-                self.signalLabels = file.readline().rstrip().replace(' ', '_').replace('.', '').split(';')
-                self.signalUnits = file.readline().rstrip().split(';')
-                self.sizeHeader = 3
-
-                self.nChannels = len(self.signalUnits)
-
-            if self.DATAfileType == 'PAR':
-                data = np.loadtxt(file, usecols=[0,1,2,3])
-
-                #sampling freq
-                self.samplingRate_Hz = 1.0/(data[1,0]-data[0,0])
-                self.signalLabels = ['CBFVL', 'APB', 'CBFVR']
-                self.signalUnits = ['cm/s','cmHg','cm/s']
-                self.sizeHeader = 0
-                self.nChannels = 3
+        return header
 
     def loadDATAfile(self):
         """
@@ -317,6 +313,14 @@ class patientData():
 
         * In the end of this function, the attributes :attr:`samplingRate_Hz`, :attr:`signalLabels` and :attr:`signalUnits` are removed. This information is passed to the instances of :class:`~signals.signal`
 
+        * If :attr:`useCache` is True, the parsed data is saved in a binary sidecar file (**<inputFile>.cache.npy** and **<inputFile>.cache.xml**,
+          in :attr:`cacheDir` if not None), keyed by size, modification time and hash of the raw data file. Next loads of the same file map the sidecar file without parsing
+          the raw data file. See :func:`dataReader.loadSidecar`.
+
+        * If :attr:`channelSelection` is not None, only the selected channels are parsed. The other channels are parsed on first access to
+          their data (see :attr:`signals.signal.data`). Crop and beat to beat operations applied to these channels are postponed until then.
+          The sidecar cache is saved only when all channels are parsed. If a valid sidecar cache exists, all channels are mapped from it.
+
         **Example**
 
         >>> from patientData import patientData as pD
@@ -342,9 +346,78 @@ class patientData():
         -------------------------------
 
         """
-        self.loadDATAfileHeader()
+        channelData = None
+        if self.useCache:
+            channelData = self._loadDATAcache()
+
+        channelLoaders = {}
+        if channelData is None:
+            [channelData, channelLoaders] = self._parseDATAfile()
+            # the cache must contain all channels
+            if self.useCache and len(channelLoaders) == 0:
+                self._saveDATAcache(channelData)
+
+        nPoints = [x.shape[0] for x in channelData if x is not None][0]
+        self.signals = []
+        for i in range(self.nChannels):
+            label = self.signalLabels[i]
+            newSignal = signal(channel=i, label=label, unit=self.signalUnits[i], data=channelData[i], samplingRate_Hz=self.samplingRate_Hz,
+                               operationsXML=self.PPoperationsNode, dataLoader=channelLoaders.get(i), nPoints=nPoints)
+            self.signals.append(newSignal)
+
+        if self.DATAfileType == 'PAR':
+            self.hasB2Bdata = True
+            self.hasRRmarks = True
+            # when loading PAR file, all samples are aready peaks
+            self.peakIdx = np.arange(self.signals[0].nPoints)
+            for ch in range(self.nChannels):
+                self.signals[ch].beat2beat(self.peakIdx, resampleRate_Hz=self.signals[ch].samplingRate_Hz, resampleMethod='linear')  # print(self.signals[ch].beat2beatData.max)
+
+        del self.signalLabels
+        del self.signalUnits
+        del self.samplingRate_Hz
+
+    def _parseDATAfile(self):
+        """
+        Parse the raw data file.
 
-        if self.DATAfileType == 'EXP_DAT':
+        This function is called by :meth:`loadDATAfile` when there is no valid sidecar cache of the file.
+
+        Returns a list with the data of each channel and a dictionary {channel: loader} of the channels not parsed. The data of these channels
+        is None. See :meth:`_selectChannels`.
+        """
+        header = self.loadDATAfileHeader()
+        channelLoaders = {}
+
+        rawData = None
+        if self.DATAreader == 'fast':
+            if self.DATAfileType == 'EXP_DAT':
+                channelLabels = self.signalLabels[2:]
+            else:
+                channelLabels = self.signalLabels
+            selection = self._selectChannels(channelLabels)
+
+            # only the channel columns are converted. EXP/DAT time stamp and sample # columns and PAR time column are never decoded
+            rawData = dataReader.readDataBlock(self.DATAfileName, skipHeader=header['sizeHeader'], nColumns=header['nColumns'],
+                                               usecols=[header['usecols'][i] for i in selection], delimiter=header['delimiter'])
+            if rawData is not None and self.DATAfileType == 'EXP_DAT':
+                self.signalLabels = self.signalLabels[2:]
+                self.signalUnits = self.signalUnits[2:]
+
+            if rawData is None:
+                print('Fast reader: irregular data table. Using genfromtxt...')
+            else:
+                channelData = [None] * self.nChannels
+                for i, ch in enumerate(selection):
+                    channelData[ch] = rawData[i]
+                # channels not selected are loaded on demand. All of them are read in a single pass, when the first one is needed
+                unselected = [ch for ch in range(self.nChannels) if ch not in selection]
+                loader = dataReader.columnLoader(self.DATAfileName, header['sizeHeader'], header['nColumns'], [header['usecols'][ch] for ch in unselected],
+                                                 header['delimiter'])
+                for ch in unselected:
+                    channelLoaders[ch] = functools.partial(loader.load, header['usecols'][ch])
+
+        if rawData is None and self.DATAfileType == 'EXP_DAT':
             # create dtype of the file
             dtypes = ('U11', 'i4')  # col 0: time (11 char string)   col 1: frame (32 bit int)
             dtypes = dtypes + ('f8',) * self.nChannels  # the other columns will be treated as float (8bits)
@@ -357,40 +430,84 @@ class patientData():
             self.signalUnits=self.signalUnits[2:]
             names = list(rawData.dtype.names)[2:]
             rawData=rawData[names]
+            channelData = [rawData[label] for label in self.signalLabels]
 
-        if self.DATAfileType == 'CSV':
+        if rawData is None and self.DATAfileType == 'CSV':
             # create dtype of the file
             dtypes = ('f8',) * self.nChannels  # the other columns will be treated as float (8bits)
 
             rawData = np.genfromtxt(self.DATAfileName, delimiter=';', skip_header=self.sizeHeader, autostrip=True, names=','.join(self.signalLabels),
                                     dtype=dtypes)
+            channelData = [rawData[label] for label in self.signalLabels]
 
-        if self.DATAfileType == 'PAR':
+        if rawData is None and self.DATAfileType == 'PAR':
             # create dtype of the file
             dtypes = ('f8',) * self.nChannels  # the other columns will be treated as float (8bits)
 
             # col 0: time, col 1: CBFVL, col 2: APB, col 3: CBFVR
             rawData = np.genfromtxt(self.DATAfileName, delimiter=None, skip_header=self.sizeHeader, autostrip=True, names=','.join(self.signalLabels),
                                     dtype=dtypes,usecols=[1,2,3])
+            channelData = [rawData[label] for label in self.signalLabels]
 
-        self.signals = []
-        for i in range(self.nChannels):
-            label = self.signalLabels[i]
-            newSignal = signal(channel=i, label=label, unit=self.signalUnits[i], data=rawData[label], samplingRate_Hz=self.samplingRate_Hz,
-                               operationsXML=self.PPoperationsNode)
-            self.signals.append(newSignal)
+        return [channelData, channelLoaders]
 
-        if self.DATAfileType == 'PAR':
-            self.hasB2Bdata = True
-            self.hasRRmarks = True
-            # when loading PAR file, all samples are aready peaks
-            self.peakIdx = np.array(range(self.signals[0].nPoints))
-            for ch in range(self.nChannels):
-                self.signals[ch].beat2beat(self.peakIdx, resampleRate_Hz=self.signals[ch].samplingRate_Hz, resampleMethod='linear')  # print(self.signals[ch].beat2beatData.max)
+    def _selectChannels(self, channelLabels):
+        """
+        Resolve :attr:`channelSelection` into a sorted list of channel indexes.
 
-        del self.signalLabels
-        del self.signalUnits
-        del self.samplingRate_Hz
+        Labels are compared with `channelLabels`, the labels of the raw data file. Signal types are found in the **setType** operations
+        already present in the job. Items not found are ignored. If :attr:`channelSelection` is None or no item is found, all channels are
+        selected.
+        """
+        if self.channelSelection is None:
+            return list(range(len(channelLabels)))
+
+        types = {}
+        for operation in self.jobRootNode.xpath('operations/preprocessing/setType'):
+            channel = tools.getElemValueXpath(operation, xpath='channel', valType='int')
+            types[tools.getElemValueXpath(operation, xpath='type', valType='str')] = channel
+
+        selection = set()
+        for item in self.channelSelection:
+            if isinstance(item, (int, np.integer)) and 0 <= item < len(channelLabels):
+                selection.add(int(item))
+            elif item in channelLabels:
+                selection.add(channelLabels.index(item))
+            elif item in types:
+                selection.add(types[item])
+            else:
+                print('Warning: channel \'%s\' not found. Ignoring...' % str(item))
+
+        if len(selection) == 0:
+            return list(range(len(channelLabels)))
+
+        return sorted(selection)
+
+    def _loadDATAcache(self):
+        """
+        Load channel data and header information from the binary sidecar cache. See :func:`dataReader.loadSidecar`.
+
+        Returns the list with the data of each channel or None if there is no valid cache.
+        """
+        cache = dataReader.loadSidecar(self.DATAfileName, self.cacheDir)
+        if cache is None:
+            return None
+
+        [channelData, self.signalLabels, self.signalUnits, self.samplingRate_Hz, fingerprint] = cache
+        self.nChannels = len(channelData)
+        self.DATAfileHash = fingerprint['hash']
+        print('Raw data loaded from cache file %s' % dataReader.sidecarFiles(self.DATAfileName, self.cacheDir)[0])
+        return channelData
+
+    def _saveDATAcache(self, channelData):
+        """
+        Save channel data and header information to the binary sidecar cache. See :func:`dataReader.saveSidecar`.
+        """
+        fingerprint = dataReader.fileFingerprint(self.DATAfileName, computeHash=True)
+        self.DATAfileHash = fingerprint['hash']
+        if not dataReader.saveSidecar(self.DATAfileName, channelData, self.signalLabels, self.signalUnits, self.samplingRate_Hz, fingerprint,
+                                      self.cacheDir):
+            print('Warning: could not write cache file %s' % dataReader.sidecarFiles(self.DATAfileName, self.cacheDir)[0])
 
     def saveSIG(self, filePath, channelList=None, format='csv', register=True):
         """
@@ -496,7 +613,7 @@ class patientData():
 
         # channelList: list or None.  List with the channels to save.
 
-    def saveB2B(self, filePath, channelList=None, format='csv', register=True):
+    def saveB2B(self, filePath, channelList=None, format='csv', register=True, features=False):
         """
         Save beat-to-beat data to a text file.
 
@@ -512,6 +629,13 @@ class patientData():
         format : string, optional
             File format. Avaiable values: 'csv', 'numpy', 'simple_text'
 
+        features : bool, optional
+            If True, the features of each beat (see :func:`signals_b2b.beatFeatures`) are saved too. Default: False
+
+            - 'csv': saved in a second file, with suffix **_features.csv**. One line per beat.
+            - 'numpy': saved in the fields 'beatTime_(s)' and one field per feature.
+            - 'simple_text': saved in the lines BEAT_TIME_(S) and one line per feature.
+
         **Notes**
 
         * This function will save beat-to-beat data only if Beat-to-beat analysis was performed before. See :meth:`getBeat2beat`.
@@ -566,6 +690,18 @@ class patientData():
                 np.savetxt(fOut, signals.T, delimiter=';', fmt='%1.8e')
                 fOut.write('-------DATA END-------;\n')
 
+            if features:
+                featuresFile = os.path.splitext(outputFile)[0] + '_features.csv'
+                with open(featuresFile, 'w') as fOut:
+                    listSignals = [self.signals[channelList[0]].beat2beatData.beatTime_s]
+                    stringHeader = 'BEAT TIME (s)'
+                    for ch in channelList:
+                        listSignals.append(self._beatFeatures(ch))
+                        stringHeader += ''.join([';%s ch%d' % (name, ch) for name in signals_b2b.BEAT_FEATURES])
+
+                    fOut.write(stringHeader + '\n')
+                    np.savetxt(fOut, np.vstack(tuple(listSignals)).T, delimiter=';', fmt='%1.8e')
+
         if format.lower() == 'numpy':
             outputFile = tools.setFileExtension(filePath, '.npy', case='lower')
 
@@ -580,9 +716,16 @@ class patientData():
             sizeSigType = max([len(str(self.signals[ch].sigType)) for ch in channelList])
             sizeData = max([self.signals[ch].beat2beatData.xData.size for ch in channelList])
 
-            dt = np.dtype([('channel', np.int32), ('label', 'U%d' % sizeLabel), ('unit', 'U%d' % sizeUnit), ('sigType', 'U%d' % sizeSigType),
-                           ('samplingRate_(Hz)', np.float64), ('time_(s)', np.float64, (sizeData,)), ('avg', np.float64, (sizeData,)),
-                           ('min', np.float64, (sizeData,)), ('max', np.float64, (sizeData,))])
+            fields = [('channel', np.int32), ('label', 'U%d' % sizeLabel), ('unit', 'U%d' % sizeUnit), ('sigType', 'U%d' % sizeSigType),
+                      ('samplingRate_(Hz)', np.float64), ('time_(s)', np.float64, (sizeData,)), ('avg', np.float64, (sizeData,)),
+                      ('min', np.float64, (sizeData,)), ('max', np.float64, (sizeData,))]
+
+            if features:
+                nBeats = self.signals[channelList[0]].beat2beatData.beatTime_s.size
+                fields += [('beatTime_(s)', np.float64, (nBeats,))] + [(name, np.float64, (nBeats,)) for name in signals_b2b.BEAT_FEATURES]
+                data = [row + (self.signals[ch].beat2beatData.beatTime_s,) + tuple(self._beatFeatures(ch)) for row, ch in zip(data, channelList)]
+
+            dt = np.dtype(fields)
 
             x = np.array(data, dtype=dt)
             np.save(outputFile, x)
@@ -592,7 +735,7 @@ class patientData():
             fileObj = open(outputFile, 'w')
 
             for i in channelList:
-                self.signals[i].saveB2B(fileObj)
+                self.signals[i].saveB2B(fileObj, features)
 
             fileObj.close()
 
@@ -601,10 +744,19 @@ class patientData():
             tools.ETaddElement(parent=xmlElement, tag='channels', text=str(channelList).replace(',', ''))
             tools.ETaddElement(parent=xmlElement, tag='fileName', text=os.path.basename(filePath))
             tools.ETaddElement(parent=xmlElement, tag='format', text=format.lower())
+            if features:
+                tools.ETaddElement(parent=xmlElement, tag='features', text=str(features))
             self.PPoperationsNode.append(xmlElement)
 
         print('Ok!')
 
+    def _beatFeatures(self, channel):
+        # features of the beats of a channel, one row per feature. NaN if not available (e.g. PAR files)
+        b2b = self.signals[channel].beat2beatData
+        if b2b.features is None:
+            return np.full((len(signals_b2b.BEAT_FEATURES), b2b.beatTime_s.size), np.nan)
+        return b2b.features
+
     def saveJob(self, fileName, mergeImported=False):
         """
         Save the history of operations applied to the file.
@@ -679,250 +831,356 @@ class patientData():
         """
         Apply the operations previously loaded.
 
+        The operations element is compiled with :func:`operationsCompiler.compileOperations` and executed by :meth:`runOperationsPlan`.
+
         **Note**
 
         This function os automatically called during the initialization  :meth:`__init__` if the input is a **.PPO** file.
 
         """
-        for operation in operationsElem:
-            if operation.tag not in ['resample', 'setLabel', 'setUnit', 'synchronize', 'findRRmarks', 'B2Bcalc', 'setType', 'calibrate', 'LPfilter',
-                                     'interpolate', 'cropInterval', 'insertPeak', 'removePeak', 'SIGsave', 'B2Bsave', 'B2B_LPfilter']:
-                print('Operation \'%s\' not recognized. Exiting...' % operation.tag)
-                exit()
-
-            if operation.tag == 'setType':
-                typeSignal = tools.getElemValueXpath(operation, xpath='type', valType='str')
-                channel = tools.getElemValueXpath(operation, xpath='channel', valType='int')
-                print('Setting Type channel=%d: %s' % (channel, typeSignal))
-                if typeSignal == 'None':
-                    typeSignal = None
-                self.signals[channel].setType(typeSignal, register=False)
-
-            if operation.tag == 'setLabel':
-                label = tools.getElemValueXpath(operation, xpath='label', valType='str')
-                channel = tools.getElemValueXpath(operation, xpath='channel', valType='int')
-                print('Setting Label channel=%d: %s' % (channel, label))
-                self.signals[channel].setLabel(label, register=False)
-
-            if operation.tag == 'setUnit':
-                unit = tools.getElemValueXpath(operation, xpath='unit', valType='str')
-                channel = tools.getElemValueXpath(operation, xpath='channel', valType='int')
-                print('Setting Unit channel=%d: %s' % (channel, unit))
-                self.signals[channel].setUnit(unit, register=False)
-
-            if operation.tag == 'resample':
-                sampleRate = tools.getElemValueXpath(operation, xpath='sampleRate', valType='float')
-                method = tools.getElemValueXpath(operation, xpath='method', valType='str')
-                channel = tools.getElemValueXpath(operation, xpath='channel', valType='int')
-                print('Resampling channel=%d: Fs= %f, method=%s' % (channel, sampleRate, method))
-                self.signals[channel].resample(sampleRate, method, register=False)
-
-            if operation.tag == 'calibrate':
-                valMin = tools.getElemValueXpath(operation, xpath='valMin', valType='float')
-                valMax = tools.getElemValueXpath(operation, xpath='valMax', valType='float')
-                method = tools.getElemValueXpath(operation, xpath='method', valType='str')
-                segmentIdx = tools.getElemValueXpath(operation, xpath='segmentIndexes', valType='list_int')
-                channel = tools.getElemValueXpath(operation, xpath='channel', valType='int')
-                print('Calibrating channel= %d: method= %s, valMin=%f, valMax=%f' % (channel, method, valMin, valMax))
-                self.signals[channel].calibrate(valMax, valMin, method, segmentIdx, register=False)
-
-            if operation.tag == 'synchronize':
-                method = tools.getElemValueXpath(operation, xpath='method', valType='str')
-                if method == 'correlation':
-                    channelList = tools.getElemValueXpath(operation, xpath='channels', valType='list_int')
-                    print('Synchronizing Channels %s: method=%s' % (str(channelList), method))
-                    self.synchronizeSignals(channelList, method, ABPdelay_s=None, register=False)
-                if method == 'fixedAPB':
-                    ABPdelay_s = tools.getElemValueXpath(operation, xpath='ABPdelay_s', valType='float')
-                    print('Synchronizing ABP channel: method=%s' % (method))
-                    self.synchronizeSignals([], method, ABPdelay_s, register=False)
-
-            if operation.tag == 'LPfilter':
-                method = tools.getElemValueXpath(operation, xpath='method', valType='str')
-                channel = tools.getElemValueXpath(operation, xpath='channel', valType='int')
-                if method == 'movingAverage' or method == 'median':
-                    Ntaps = tools.getElemValueXpath(operation, xpath='Ntaps', valType='int')
-                    print('Low Pass filter channel=%d: method=%s, Ntaps=%d' % (channel, method, Ntaps))
-                    self.signals[channel].LPfilter(method, nTaps=Ntaps, order=None, register=False)
-                if method == 'butterworth':
-                    order = tools.getElemValueXpath(operation, xpath='order', valType='int')
-                    print('Low Pass filter channel=%d: method=%s, Ntaps=%d' % (channel, method))
-                    self.signals[channel].LPfilter(method, order=order, register=False)
-
-            if operation.tag == 'interpolate':
-                frameStart = tools.getElemValueXpath(operation, xpath='frameStart', valType='int')
-                frameEnd = tools.getElemValueXpath(operation, xpath='frameEnd', valType='int')
-                method = tools.getElemValueXpath(operation, xpath='method', valType='str')
-                channel = tools.getElemValueXpath(operation, xpath='channel', valType='int')
-                print('Interpolating channel=%d: start=%d, end=%d, method=%s' % (channel, frameStart, frameEnd, method))
-                self.signals[channel].interpolate(frameStart, frameEnd, method, register=False)
-
-            if operation.tag == 'cropInterval':
-                frameStart = tools.getElemValueXpath(operation, xpath='frameStart', valType='int')
-                frameEnd = tools.getElemValueXpath(operation, xpath='frameEnd', valType='int')
-                RemoveSegment = tools.getElemValueXpath(operation, xpath='RemoveSegment', valType='bool')
-                segmentIndexes = tools.getElemValueXpath(operation, xpath='segmentIndexes', valType='list_int')
-                channel = tools.getElemValueXpath(operation, xpath='channel', valType='int')
-                print('Cropping channel %s: start=%d, end=%d, removeSegment=%s' % (channel, frameStart, frameEnd, str(RemoveSegment)))
-                self.signals[channel].cropInterval(frameStart, frameEnd, False, RemoveSegment, segmentIndexes)
-
-            if operation.tag == 'findRRmarks':
-                refChannel = tools.getElemValueXpath(operation, xpath='refChannel', valType='int')
-                method = tools.getElemValueXpath(operation, xpath='method', valType='str')
-                findPeaks = tools.getElemValueXpath(operation, xpath='findPeaks', valType='bool')
-                findValleys = tools.getElemValueXpath(operation, xpath='findValleys', valType='bool')
-                print('Finding RRmarks: refChannel=%d method=%s findPeaks=%s findValleys=%s' % (refChannel, method, findPeaks, findValleys))
-                self.findRRmarks(refChannel, method, findPeaks, findValleys, register=False)
-
-            if operation.tag == 'insertPeak':
-                newIdx = tools.getElemValueXpath(operation, xpath='newIdx', valType='int')
-                isPeak = tools.getElemValueXpath(operation, xpath='isPeak', valType='bool')
-                print('Inserting Peak: newIdx=%d, isPeak=%s' % (newIdx, str(isPeak)))
-                self.insertPeak(newIdx, isPeak, register=False)
-
-            if operation.tag == 'removePeak':
-                Idx = tools.getElemValueXpath(operation, xpath='Idx', valType='int')
-                isPeak = tools.getElemValueXpath(operation, xpath='isPeak', valType='bool')
-                print('Removing Peak: Idx=%d, isPeak=%s' % (Idx, str(isPeak)))
-                self.removePeak(Idx, isPeak, register=False)
-
-            if operation.tag == 'SIGsave':
-                channelList = tools.getElemValueXpath(operation, xpath='channels', valType='list_int')
-                format = tools.getElemValueXpath(operation, xpath='format', valType='str')
-                fileName = tools.getElemValueXpath(operation, xpath='fileName', valType='str')
-                print('SIGsave: Channels%s filename=%s format=%s' % (str(channelList), fileName, format))
-                self.saveSIG(self.dirName + fileName, channelList, format, register=False)
-
-            if operation.tag == 'B2Bcalc':
-                resampleMethod = tools.getElemValueXpath(operation, xpath='resampleMethod', valType='str')
-                resampleRate_Hz = tools.getElemValueXpath(operation, xpath='resampleRate_Hz', valType='float')
-                print('Extracting beat-to-beat data: resampleMethod=%s, Freq=%f' % (resampleMethod, resampleRate_Hz))
-                self.getBeat2beat(resampleRate_Hz, resampleMethod, register=False)
-
-            if operation.tag == 'B2Bsave':
-                channelList = tools.getElemValueXpath(operation, xpath='channels', valType='list_int')
-                format = tools.getElemValueXpath(operation, xpath='format', valType='str')
-                fileName = tools.getElemValueXpath(operation, xpath='fileName', valType='str')
-                print('B2Bsave: Channels%s filename=%s format=%s' % (str(channelList), fileName, format))
-                self.saveB2B(self.dirName + fileName, channelList, format, register=False)
-
-            if operation.tag == 'B2B_LPfilter':
-                method = tools.getElemValueXpath(operation, xpath='method', valType='str')
-                Ntaps = tools.getElemValueXpath(operation, xpath='Ntaps', valType='int')
-                print('B2B LP filter: method=%s, Ntaps=%d' % (method, Ntaps))
-                self.LPfilterBeat2beat(method, Ntaps, register=False)
+        self.runOperationsPlan(operationsCompiler.compileOperations(operationsElem, 'preprocessing'))
 
     def runARanalysisOperations(self, operationsElem):
         """
             Apply the operations previously loaded.
 
+            The operations element is compiled with :func:`operationsCompiler.compileOperations` and executed by :meth:`runOperationsPlan`.
+
             **Note**
 
             This function os automatically called during the initialization  :meth:`__init__` if the input is a **.PPO** file.
 
             """
-        for operation in operationsElem:
-            if operation.tag not in ['PSDwelch', 'PSDsave', 'TFA', 'TFAsave', 'TFAsaveStat', 'ARI', 'ARIsave', 'MX', 'MXsave', 'ARIARMA',
-                                     'ARIARMAsave']:
-                print('Operation \'%s\' not recognized. Exiting...' % operation.tag)
-                exit()
-
-            if operation.tag == 'PSDwelch':
-                useB2B = tools.getElemValueXpath(operation, xpath='useB2B', valType='bool')
-                overlap = tools.getElemValueXpath(operation, xpath='overlap', valType='float')
-                segmentLength_s = tools.getElemValueXpath(operation, xpath='segmentLength_s', valType='float')
-                windowType = tools.getElemValueXpath(operation, xpath='windowType', valType='str')
-                detrend = tools.getElemValueXpath(operation, xpath='detrend', valType='bool')
-                filterType = tools.getElemValueXpath(operation, xpath='filterType', valType='str')
-                nTapsFilter = tools.getElemValueXpath(operation, xpath='nTapsFilter', valType='int')
-                print('Computing PSDwelch: useB2B=%s overlap=%f segmentLength_s=%f windowType=%s detrend=%s filterType=%s  nTapsFilter=%d' % (
-                    str(useB2B), overlap, segmentLength_s, windowType, str(detrend), filterType, nTapsFilter))
-                self.computePSDwelch(useB2B, overlap, segmentLength_s, windowType, detrend, filterType, nTapsFilter, register=False)
-
-            if operation.tag == 'PSDsave':
-                fileName = tools.getElemValueXpath(operation, xpath='fileName', valType='str')
-                format = tools.getElemValueXpath(operation, xpath='format', valType='str')
-                freqRange = tools.getElemValueXpath(operation, xpath='freqRange', valType='str')
-                print('PSDsave: freqRange%s filename=%s format=%s' % (freqRange, fileName, format))
-                self.savePSD(self.dirName + fileName, format, freqRange, register=False)
-
-            if operation.tag == 'TFA':
-                estimatorType = tools.getElemValueXpath(operation, xpath='estimatorType', valType='str')
-                print('TFA: estimatorType=%s' % estimatorType)
-                self.computeTFA(estimatorType, register=False)
-
-            if operation.tag == 'TFAsave':
-                fileName = tools.getElemValueXpath(operation, xpath='fileName', valType='str')
-                format = tools.getElemValueXpath(operation, xpath='format', valType='str')
-                freqRange = tools.getElemValueXpath(operation, xpath='freqRange', valType='str')
-                print('TFAsave: format=%s freqRange=%s fileName=%s' % (format, freqRange, fileName))
-                self.saveTF(self.dirName + fileName, format, freqRange, register=False)
-
-            if operation.tag == 'TFAsaveStat':
-                fileName = tools.getElemValueXpath(operation, xpath='fileName', valType='str')
-                plotFileFormat = tools.getElemValueXpath(operation, xpath='plotFileFormat', valType='str')
-                remNegPhase = tools.getElemValueXpath(operation, xpath='remNegPhase', valType='bool')
-                coheTreshold = tools.getElemValueXpath(operation, xpath='coheTreshold', valType='bool')
-                print('TFAsaveStat: remNegPhase=%s coheTreshold=%s fileName=%s  plotFileFormat=%s' % (
-                    str(remNegPhase), str(coheTreshold), fileName, plotFileFormat))
-
-                if plotFileFormat.lower() == 'none':
-                    plotFileFormat = None
-
-                self.saveTFAstatistics(self.dirName + fileName, plotFileFormat, coheTreshold, remNegPhase, register=False)
-
-            if operation.tag == 'ARI':
-                print('ARI:')
-                self.computeARI(register=False)
-
-            if operation.tag == 'ARIsave':
-                fileName = tools.getElemValueXpath(operation, xpath='fileName', valType='str')
-                plotFileFormat = tools.getElemValueXpath(operation, xpath='plotFileFormat', valType='str')
-                format = tools.getElemValueXpath(operation, xpath='format', valType='str')
-                print('ARIsave: format=%s fileName=%s' % (format, fileName))
-
-                if plotFileFormat.lower() == 'none':
-                    plotFileFormat = None
-
-                self.saveARI(self.dirName + fileName, plotFileFormat, format, register=False)
-
-            if operation.tag == 'ARIARMA':
-                useB2B = tools.getElemValueXpath(operation, xpath='useB2B', valType='bool')
-                p = tools.getElemValueXpath(operation, xpath='p', valType='int')
-                q = tools.getElemValueXpath(operation, xpath='q', valType='int')
-                print('ARIARMA:')
-                self.computeARIARMA(useB2B,p,q,register=False)
-
-            if operation.tag == 'ARIARMAsave':
-                fileName = tools.getElemValueXpath(operation, xpath='fileName', valType='str')
-                plotFileFormat = tools.getElemValueXpath(operation, xpath='plotFileFormat', valType='str')
-                format = tools.getElemValueXpath(operation, xpath='format', valType='str')
-                print('ARIARMAsave: format=%s fileName=%s' % (format, fileName))
-
-                if plotFileFormat.lower() == 'none':
-                    plotFileFormat = None
-
-                self.saveARIARMA(self.dirName + fileName, plotFileFormat, format, register=False)
-
-            if operation.tag == 'MX':
-                useB2B = tools.getElemValueXpath(operation, xpath='useB2B', valType='bool')
-                epochLength_s = tools.getElemValueXpath(operation, xpath='epochLength_s', valType='int')
-                blockLength_s = tools.getElemValueXpath(operation, xpath='blockLength_s', valType='int')
-
-                print('Computing Mx: useB2B=%s epochLength_s=%d blockLength_s=%d' % (
-                    str(useB2B), epochLength_s, blockLength_s ))
-                self.computeMX(useB2B, epochLength_s, blockLength_s, register=False)
-
-            if operation.tag == 'MXsave':
-                fileName = tools.getElemValueXpath(operation, xpath='fileName', valType='str')
-                plotFileFormat = tools.getElemValueXpath(operation, xpath='plotFileFormat', valType='str')
-                format = tools.getElemValueXpath(operation, xpath='format', valType='str')
-                print('MXsave: format=%s fileName=%s' % (format, fileName))
-
-                if plotFileFormat.lower() == 'none':
-                    plotFileFormat = None
-
-                self.saveMX(self.dirName + fileName, plotFileFormat, format, register=False)
+        self.runOperationsPlan(operationsCompiler.compileOperations(operationsElem, 'ARanalysis'))
+
+    def runOperationsPlan(self, plan, stateKey=None):
+        """
+        Execute an execution plan, created by :mod:`operationsCompiler`.
+
+        The same plan can be executed in many instances of :class:`patientData`, so that the operations file is parsed only once.
+        AR analysis operations are skipped if :attr:`activeModule` is not 'ARanalysis'.
+
+        If :attr:`stateCache` is not None and `stateKey` is given, the preprocessing state is stored in the cache after the checkpoint operations
+        (see :class:`stateCache.stateCache`), and the execution resumes from the longest prefix of the plan already in the cache. Only the
+        preprocessing operations before the first save or AR analysis operation can be skipped, so that all output files are written.
+
+        Parameters
+        ----------
+        plan : list of :class:`operationsCompiler.operation`
+            operations to execute
+
+        stateKey : str or None, optional
+            key of the current state, see :meth:`getStateKey`. If None (default), the state cache is not used.
+
+        Returns
+        -------
+        stateKey : str or None
+            key of the state after the plan. None if `stateKey` is None.
+
+        **Notes**
+
+        * Read-only arrays: to avoid copying the signals, the cache shares the numpy arrays of the stored and restored states with this
+          instance (see :func:`stateCache.shareArrays`). These arrays (data of the signals, RR marks, beat to beat series, etc.) become
+          read-only when the state is stored or restored, and remain read-only after this function returns. The operations of this class
+          always assign new arrays, so they are not affected. Code that modifies these arrays in place (e.g. ``myCase.signals[0].data[10] = 0``)
+          raises ValueError: assign a modified copy instead (``data = myCase.signals[0].data.copy()``). Instances created without a state cache
+          are not affected.
+
+        **Example**
+
+        >>> import operationsCompiler
+        >>> from patientData import patientData as pD
+        >>> plan = operationsCompiler.compileOperationsFile('protocol.PPO')
+        >>> for file in ['data1.EXP', 'data2.EXP']:
+        >>>     myCase=pD(file, activeModule='preprocessing')
+        >>>     myCase.runOperationsPlan(plan)
+
+        """
+        if self.stateCache is None or stateKey is None:
+            for [first, last] in self._planSteps(plan):
+                self._runStep(plan, first, last)
+            return None
+
+        keys = self.stateCache.chainKeys(stateKey, plan)
+
+        # states can be stored/restored only up to the first save or AR analysis operation
+        nResumable = 0
+        while nResumable < len(plan) and plan[nResumable].section == 'preprocessing' and 'fileName' not in plan[nResumable].params:
+            nResumable += 1
+        checkpoints = [i for i in range(nResumable) if plan[i].tag in self.stateCache.checkpointTags or i == nResumable - 1]
+
+        start = 0
+        for i in reversed(checkpoints):
+            state = self.stateCache.load(keys[i])
+            if state is not None:
+                self._restoreState(state)
+                print('Resuming from cached state after operation %d (%s)' % (i, plan[i].tag))
+                start = i + 1
+                break
+
+        for [first, last] in self._planSteps(plan, start):
+            self._runStep(plan, first, last)
+            if any([i in checkpoints for i in range(first, last + 1)]) and not self.stateCache.has(keys[last]):
+                self.stateCache.store(keys[last], self._captureState())
+
+        if len(keys) == 0:
+            return stateKey
+        return keys[-1]
+
+    def _planSteps(self, plan, start=0):
+        """
+        Steps of the execution of plan[start:]: list of [first, last] indexes of the operations executed together by :meth:`_runStep`.
+
+        Consecutive **resample** operations of different channels with the same sampling rate and method are a single step, so that the channels
+        are resampled together (see :meth:`resampleSignals`). AR analysis operations are skipped if :attr:`activeModule` is not 'ARanalysis'.
+        """
+        steps = []
+        i = start
+        while i < len(plan):
+            op = plan[i]
+            last = i
+            if op.tag == 'resample':
+                channels = [op.params['channel']]
+                while (last + 1 < len(plan) and plan[last + 1].tag == 'resample' and plan[last + 1].params['channel'] not in channels and
+                       [plan[last + 1].params['sampleRate'], plan[last + 1].params['method']] == [op.params['sampleRate'], op.params['method']]):
+                    last += 1
+                    channels.append(plan[last].params['channel'])
+
+            if op.section == 'preprocessing' or self.activeModule == 'ARanalysis':
+                steps.append([i, last])
+            i = last + 1
+        return steps
+
+    def _runStep(self, plan, first, last):
+        """
+        Execute the operations plan[first:last + 1], see :meth:`_planSteps`.
+        """
+        op = plan[first]
+        if op.tag == 'resample':
+            self._runResample(op.params['sampleRate'], op.params['method'], [plan[i].params['channel'] for i in range(first, last + 1)])
+            return
+        self._operationHandlers()[op.tag](**op.params)
+
+    def getStateKey(self):
+        """
+        Return the key of the raw data state, used by :meth:`runOperationsPlan`, or None if :attr:`stateCache` is None.
+        """
+        if self.stateCache is None:
+            return None
+
+        if self.DATAfileHash is None:
+            self.DATAfileHash = dataReader.fileFingerprint(self.DATAfileName, computeHash=True)['hash']
+        return self.stateCache.rootKey(self.DATAfileHash, self.getVersion())
+
+    def _captureState(self):
+        """
+        Return the preprocessing state, see :data:`stateCache.STATE_ATTRIBUTES`. The signals are shallow copies without the reference to the operations tree.
+        """
+        state = {}
+        for attribute in STATE_ATTRIBUTES:
+            if hasattr(self, attribute):
+                state[attribute] = getattr(self, attribute)
+
+        state['signals'] = []
+        for s in self.signals:
+            newSignal = copy.copy(s)
+            newSignal.operationsXML = None
+            state['signals'].append(newSignal)
+        return state
+
+    def _restoreState(self, state):
+        """
+        Restore a state returned by :meth:`_captureState`.
+        """
+        self.removeRRmarks()
+        for attribute in STATE_ATTRIBUTES:
+            if attribute in state:
+                setattr(self, attribute, state[attribute])
+        for s in self.signals:
+            s.operationsXML = self.PPoperationsNode
+        self.nChannels = len(self.signals)
+
+    def _operationHandlers(self):
+        """
+        Dispatch table of the operations: tag -> function. The arguments of the functions are the parameters of the compiled operations.
+        """
+        return {'setType': self._runSetType, 'setLabel': self._runSetLabel, 'setUnit': self._runSetUnit, 'resample': self._runResample,
+                'calibrate': self._runCalibrate, 'synchronize': self._runSynchronize, 'delayTrack': self._runDelayTrack, 'LPfilter': self._runLPfilter,
+                'interpolate': self._runInterpolate, 'cropInterval': self._runCropInterval, 'findRRmarks': self._runFindRRmarks,
+                'remapRRmarks': self._runRemapRRmarks, 'insertPeak': self._runInsertPeak, 'removePeak': self._runRemovePeak, 'insertPeaks': self._runInsertPeaks,
+                'removePeaks': self._runRemovePeaks, 'SIGsave': self._runSIGsave, 'B2Bcalc': self._runB2Bcalc,
+                'B2Bsave': self._runB2Bsave, 'B2B_LPfilter': self._runB2B_LPfilter, 'PSDwelch': self._runPSDwelch, 'PSDsave': self._runPSDsave,
+                'TFA': self._runTFA, 'TFAsave': self._runTFAsave, 'TFAsaveStat': self._runTFAsaveStat, 'ARI': self._runARI,
+                'ARIsave': self._runARIsave, 'ARIARMA': self._runARIARMA, 'ARIARMAsave': self._runARIARMAsave, 'MX': self._runMX,
+                'MXsave': self._runMXsave}
+
+    # preprocessing operations
+    def _runSetType(self, type, channel):
+        print('Setting Type channel=%d: %s' % (channel, type))
+        if type == 'None':
+            type = None
+        self.signals[channel].setType(type, register=False)
+
+    def _runSetLabel(self, label, channel):
+        print('Setting Label channel=%d: %s' % (channel, label))
+        self.signals[channel].setLabel(label, register=False)
+
+    def _runSetUnit(self, unit, channel):
+        print('Setting Unit channel=%d: %s' % (channel, unit))
+        self.signals[channel].setUnit(unit, register=False)
+
+    # channel: channel or list of channels, resampled together (see resampleSignals)
+    def _runResample(self, sampleRate, method, channel):
+        channels = channel if isinstance(channel, list) else [channel]
+        for ch in channels:
+            print('Resampling channel=%d: Fs= %f, method=%s' % (ch, sampleRate, method))
+        self.resampleSignals(sampleRate, method, channels, register=False)
+
+    def _runCalibrate(self, valMin, valMax, method, segmentIndexes, channel):
+        print('Calibrating channel= %d: method= %s, valMin=%f, valMax=%f' % (channel, method, valMin, valMax))
+        self.signals[channel].calibrate(valMax, valMin, method, segmentIndexes, register=False)
+
+    def _runSynchronize(self, method, channels, ABPdelay_s, maxLag_s, decimationFactor):
+        if method == 'correlation':
+            print('Synchronizing Channels %s: method=%s' % (str(channels), method))
+            self.synchronizeSignals(channels, method, ABPdelay_s=None, register=False)
+        if method == 'lagCorrelation':
+            if decimationFactor is None:
+                decimationFactor = 1
+            print('Synchronizing Channels %s: method=%s maxLag_s=%f decimationFactor=%d' % (str(channels), method, maxLag_s, decimationFactor))
+            self.synchronizeSignals(channels, method, ABPdelay_s=None, register=False, maxLag_s=maxLag_s, decimationFactor=decimationFactor)
+        if method == 'fixedAPB':
+            print('Synchronizing ABP channel: method=%s' % (method))
+            self.synchronizeSignals([], method, ABPdelay_s, register=False)
+
+    def _runDelayTrack(self, channels, windowLength_s, step_s, maxLag_s, warp):
+        print('Tracking delays of channels %s: windowLength_s=%f step_s=%f maxLag_s=%f warp=%s' % (str(channels), windowLength_s, step_s, maxLag_s,
+                                                                                                   str(warp)))
+        self.trackDelays(channels, windowLength_s, step_s, maxLag_s, warp, register=False)
+
+    def _runLPfilter(self, method, channel, Ntaps, order):
+        if method == 'movingAverage' or method == 'median':
+            print('Low Pass filter channel=%d: method=%s, Ntaps=%d' % (channel, method, Ntaps))
+            self.signals[channel].LPfilter(method, nTaps=Ntaps, order=None, register=False)
+        if method == 'butterworth':
+            print('Low Pass filter channel=%d: method=%s, order=%d' % (channel, method, order))
+            self.signals[channel].LPfilter(method, order=order, register=False)
+
+    def _runInterpolate(self, frameStart, frameEnd, method, channel):
+        print('Interpolating channel=%d: start=%d, end=%d, method=%s' % (channel, frameStart, frameEnd, method))
+        self.signals[channel].interpolate(frameStart, frameEnd, method, register=False)
+
+    def _runCropInterval(self, frameStart, frameEnd, RemoveSegment, segmentIndexes, channel):
+        print('Cropping channel %s: start=%d, end=%d, removeSegment=%s' % (channel, frameStart, frameEnd, str(RemoveSegment)))
+        self.signals[channel].cropInterval(frameStart, frameEnd, False, RemoveSegment, segmentIndexes)
+
+    def _runRemapRRmarks(self, frameStart, frameEnd, isCrop):
+        print('Updating RRmarks: start=%d, end=%d, isCrop=%s' % (frameStart, frameEnd, str(isCrop)))
+        self.remapRRmarks(frameStart, frameEnd, isCrop, register=False)
+
+    def _runFindRRmarks(self, refChannel, method, findPeaks, findValleys, decimationFactor, nWorkers=None):
+        if decimationFactor is None:
+            decimationFactor = 1
+        print('Finding RRmarks: refChannel=%d method=%s findPeaks=%s findValleys=%s decimationFactor=%d' % (refChannel, method, findPeaks, findValleys,
+                                                                                                             decimationFactor))
+        self.findRRmarks(refChannel, method, findPeaks, findValleys, register=False, decimationFactor=decimationFactor, nWorkers=nWorkers)
+
+    def _runInsertPeak(self, newIdx, isPeak):
+        print('Inserting Peak: newIdx=%d, isPeak=%s' % (newIdx, str(isPeak)))
+        self.insertPeak(newIdx, isPeak, register=False)
+
+    def _runRemovePeak(self, Idx, isPeak):
+        print('Removing Peak: Idx=%d, isPeak=%s' % (Idx, str(isPeak)))
+        self.removePeak(Idx, isPeak, register=False)
+
+    def _runInsertPeaks(self, indexes, isPeak):
+        print('Inserting Peaks: %d indexes, isPeak=%s' % (len(indexes), str(isPeak)))
+        self.insertPeaks(indexes, isPeak, register=False)
+
+    def _runRemovePeaks(self, indexes, isPeak):
+        print('Removing Peaks: %d indexes, isPeak=%s' % (len(indexes), str(isPeak)))
+        self.removePeaks(indexes, isPeak, register=False)
+
+    def _runSIGsave(self, channels, format, fileName):
+        print('SIGsave: Channels%s filename=%s format=%s' % (str(channels), fileName, format))
+        self.saveSIG(self.dirName + fileName, channels, format, register=False)
+
+    def _runB2Bcalc(self, resampleMethod, resampleRate_Hz):
+        print('Extracting beat-to-beat data: resampleMethod=%s, Freq=%f' % (resampleMethod, resampleRate_Hz))
+        self.getBeat2beat(resampleRate_Hz, resampleMethod, register=False)
+
+    def _runB2Bsave(self, channels, format, fileName, features):
+        features = bool(features)
+        print('B2Bsave: Channels%s filename=%s format=%s features=%s' % (str(channels), fileName, format, str(features)))
+        self.saveB2B(self.dirName + fileName, channels, format, register=False, features=features)
+
+    def _runB2B_LPfilter(self, method, Ntaps):
+        print('B2B LP filter: method=%s, Ntaps=%d' % (method, Ntaps))
+        self.LPfilterBeat2beat(method, Ntaps, register=False)
+
+    # AR analysis operations
+    def _runPSDwelch(self, useB2B, overlap, segmentLength_s, windowType, detrend, filterType, nTapsFilter):
+        print('Computing PSDwelch: useB2B=%s overlap=%f segmentLength_s=%f windowType=%s detrend=%s filterType=%s  nTapsFilter=%s' % (
+            str(useB2B), overlap, segmentLength_s, windowType, str(detrend), filterType, str(nTapsFilter)))
+        self.computePSDwelch(useB2B, overlap, segmentLength_s, windowType, detrend, filterType, nTapsFilter, register=False)
+
+    def _runPSDsave(self, fileName, format, freqRange):
+        print('PSDsave: freqRange%s filename=%s format=%s' % (freqRange, fileName, format))
+        self.savePSD(self.dirName + fileName, format, freqRange, register=False)
+
+    def _runTFA(self, estimatorType):
+        print('TFA: estimatorType=%s' % estimatorType)
+        self.computeTFA(estimatorType, register=False)
+
+    def _runTFAsave(self, fileName, format, freqRange):
+        print('TFAsave: format=%s freqRange=%s fileName=%s' % (format, freqRange, fileName))
+        self.saveTF(self.dirName + fileName, format, freqRange, register=False)
+
+    def _runTFAsaveStat(self, fileName, plotFileFormat, remNegPhase, coheTreshold):
+        print('TFAsaveStat: remNegPhase=%s coheTreshold=%s fileName=%s  plotFileFormat=%s' % (
+            str(remNegPhase), str(coheTreshold), fileName, plotFileFormat))
+
+        if plotFileFormat is None or plotFileFormat.lower() == 'none':
+            plotFileFormat = None
+
+        self.saveTFAstatistics(self.dirName + fileName, plotFileFormat, coheTreshold, remNegPhase, register=False)
+
+    def _runARI(self):
+        print('ARI:')
+        self.computeARI(register=False)
+
+    def _runARIsave(self, fileName, plotFileFormat, format):
+        print('ARIsave: format=%s fileName=%s' % (format, fileName))
+
+        if plotFileFormat is None or plotFileFormat.lower() == 'none':
+            plotFileFormat = None
+
+        self.saveARI(self.dirName + fileName, plotFileFormat, format, register=False)
+
+    def _runARIARMA(self, useB2B, p, q):
+        print('ARIARMA:')
+        self.computeARIARMA(useB2B, p, q, register=False)
+
+    def _runARIARMAsave(self, fileName, plotFileFormat, format):
+        print('ARIARMAsave: format=%s fileName=%s' % (format, fileName))
+
+        if plotFileFormat is None or plotFileFormat.lower() == 'none':
+            plotFileFormat = None
+
+        self.saveARIARMA(self.dirName + fileName, plotFileFormat, format, register=False)
+
+    def _runMX(self, useB2B, epochLength_s, blockLength_s):
+        print('Computing Mx: useB2B=%s epochLength_s=%d blockLength_s=%d' % (
+            str(useB2B), epochLength_s, blockLength_s ))
+        self.computeMX(useB2B, epochLength_s, blockLength_s, register=False)
+
+    def _runMXsave(self, fileName, plotFileFormat, format):
+        print('MXsave: format=%s fileName=%s' % (format, fileName))
+
+        if plotFileFormat is None or plotFileFormat.lower() == 'none':
+            plotFileFormat = None
+
+        self.saveMX(self.dirName + fileName, plotFileFormat, format, register=False)
 
     def findChannel(self, attribute, identifier):
         """
@@ -989,7 +1247,10 @@ class patientData():
         if attribute.lower() == 'type':
             return [x.sigType for x in self.signals]
 
-    def findRRmarks(self, refChannel, method='ampd', findPeaks=True, findValleys=False, register=True):
+    # recordings longer than this are processed in parallel by findRRmarks, see peakDetection.ampdParallel
+    PARALLEL_PEAKS_MIN_DURATION_s = 1800.0
+
+    def findRRmarks(self, refChannel, method='ampd', findPeaks=True, findValleys=False, register=True, decimationFactor=1, nWorkers=None):
         """
         Find RR mark locations, given a reference signal.
 
@@ -1015,10 +1276,21 @@ class patientData():
         register : bool, optional
             include this operation in the list of preprocessing operations. If False then the operation will not be stored.
 
+        decimationFactor : int, optional
+            If larger than 1, the marks are detected in the reference signal decimated by this factor (with anti-aliasing filter) and then
+            moved to the local maximum/minimum of the full rate signal, within +- decimationFactor samples. Use it to speed up the detection
+            in high sampling rate signals, keeping the decimated rate above ~50Hz. Default: 1 (no decimation)
+
+        nWorkers : int or None, optional
+            Number of worker processes used if the reference channel is longer than :attr:`PARALLEL_PEAKS_MIN_DURATION_s`. If None
+            (default), :attr:`nWorkers` is used. The number of workers is not registered.
+
 
         **Notes**
 
         * This function calls :meth:`~signals.signal.findPeaks` from each instance of :class:`~signals.signal` in the list of channels.
+        * Reference channels longer than :attr:`PARALLEL_PEAKS_MIN_DURATION_s` are split in windows processed in parallel, by `nWorkers`
+          processes. The RR marks are the same.
 
         **Example**
 
@@ -1030,8 +1302,16 @@ class patientData():
         >>> myCase.findRRmarks(refChannel=2,method='ampd',findPeaks=True,findValleys=True,register=True) # find local maxima and minima using channel 2 as reference. Register the operation
 
         """
-        [self.peakIdx, _, self.valleyIdx, _] = self.signals[refChannel].findPeaks(method, findPeaks, findValleys, register=False)
+        refSignal = self.signals[refChannel]
+        if nWorkers is None:
+            nWorkers = self.nWorkers
+        if refSignal.nPoints / refSignal.samplingRate_Hz <= self.PARALLEL_PEAKS_MIN_DURATION_s:
+            nWorkers = 1
+
+        [self.peakIdx, _, self.valleyIdx, _] = refSignal.findPeaks(method, findPeaks, findValleys, register=False, nWorkers=nWorkers,
+                                                                    decimationFactor=decimationFactor)
         self.hasRRmarks = True
+        self.RRmarksSettings = {'refChannel': refChannel, 'method': method, 'decimationFactor': decimationFactor}
 
         # register operation
         if register:
@@ -1040,6 +1320,8 @@ class patientData():
             tools.ETaddElement(parent=xmlElement, tag='method', text=method)
             tools.ETaddElement(parent=xmlElement, tag='findPeaks', text=str(findPeaks))
             tools.ETaddElement(parent=xmlElement, tag='findValleys', text=str(findValleys))
+            if decimationFactor > 1:
+                tools.ETaddElement(parent=xmlElement, tag='decimationFactor', text=str(decimationFactor))
             self.PPoperationsNode.append(xmlElement)
 
     def insertPeak(self, newIdx, isPeak=True, register=True):
@@ -1078,6 +1360,7 @@ class patientData():
             pos = np.searchsorted(self.peakIdx, newIdx)
             self.peakIdx = np.insert(self.peakIdx, pos, newIdx)
             self.peakIdx = np.unique(self.peakIdx)  # removes eventual repeated indexes
+            self._updateBeat2beat()
         else:
             pos = np.searchsorted(self.valleyIdx, newIdx)
             self.valleyIdx = np.insert(self.valleyIdx, pos, newIdx)
@@ -1109,7 +1392,7 @@ class patientData():
 
 
         **Note**
-        * If a peak is not registered at the given `Idx`, no peak is removed and the function ends without any error or warning messages.
+        * The registered peak/valley closest to `Idx` is removed (the one on the right in case of a tie), even if no peak is registered at `Idx`.
 
 
         **Example**
@@ -1124,27 +1407,14 @@ class patientData():
         if not self.hasRRmarks:
             return
 
-        if isPeak:
-            pos = np.searchsorted(self.peakIdx, Idx)
-            if pos == 0 or (pos == len(self.peakIdx) - 1):
-                self.peakIdx = np.delete(self.peakIdx, pos)
-                return
-            else:
-                if abs(Idx - self.peakIdx[pos - 1]) < abs(Idx - self.peakIdx[pos]):
-                    self.peakIdx = np.delete(self.peakIdx, pos - 1)
-                else:
-                    self.peakIdx = np.delete(self.peakIdx, pos)
-        else:
-            pos = np.searchsorted(self.peakIdx, Idx)
-
-            if pos == 0 or (pos == len(self.valleyIdx) - 1):
-                self.valleyIdx = np.delete(self.valleyIdx, pos)
-                return
+        marks = self.peakIdx if isPeak else self.valleyIdx
+        if len(marks) > 0:
+            marks = np.delete(marks, self._closestMarks(marks, [Idx])[0])
+            if isPeak:
+                self.peakIdx = marks
+                self._updateBeat2beat()
             else:
-                if abs(Idx - self.valleyIdx[pos - 1]) < abs(Idx - self.valleyIdx[pos]):
-                    self.valleyIdx = np.delete(self.valleyIdx, pos - 1)
-                else:
-                    self.valleyIdx = np.delete(self.valleyIdx, pos)
+                self.valleyIdx = marks
 
         # register operation
         if register:
@@ -1153,6 +1423,114 @@ class patientData():
             tools.ETaddElement(parent=xmlElement, tag='isPeak', text=str(isPeak))
             self.PPoperationsNode.append(xmlElement)
 
+    def insertPeaks(self, indexes, isPeak=True, register=True):
+        """
+        Insert many peak/valley marks at once
+
+        The new marks are merged with the registered ones in a single pass. The operation is registered as one **insertPeaks** element.
+
+        Parameters
+        ----------
+        indexes : list of int
+            indices of the new peaks/valleys. Indices already registered are ignored.
+
+        isPeak : bool, optional
+            Register the new indices as peaks if True (default) or valleys if False.
+
+        register : bool, optional
+            include this operation in the list of preprocessing operations. If False then the operation will not be stored.
+
+        **Example**
+
+        >>> from patientData import patientData as pD
+        >>> myCase=pD('data.EXP')
+        >>> myCase.findRRmarks(refChannel=2,method='ampd',findPeaks=True,findValleys=True,register=True)
+        >>> myCase.insertPeaks([1200, 5300, 9100],isPeak=True,register=True) # add peaks at 1200, 5300 and 9100
+        """
+        if not self.hasRRmarks:
+            return
+
+        indexes = np.asarray(indexes, dtype=int)
+        if isPeak:
+            self.peakIdx = np.union1d(self.peakIdx, indexes)
+            self._updateBeat2beat()
+        else:
+            self.valleyIdx = np.union1d(self.valleyIdx, indexes)
+
+        # register operation
+        if register:
+            xmlElement = ETree.Element('insertPeaks')
+            tools.ETaddElement(parent=xmlElement, tag='indexes', text=self._indexesToStr(indexes))
+            tools.ETaddElement(parent=xmlElement, tag='isPeak', text=str(isPeak))
+            self.PPoperationsNode.append(xmlElement)
+
+    def removePeaks(self, indexes, isPeak=True, register=True):
+        """
+        Remove many peak/valley marks at once
+
+        The result is the same of calling :meth:`removePeak` for each index, in order: each index removes the remaining mark closest to it. The
+        closest marks are found in a single pass, which is repeated from the first index whose closest mark was already removed. The operation is
+        registered as one **removePeaks** element.
+
+        Parameters
+        ----------
+        indexes : list of int
+            indices of the peaks/valleys to be removed
+
+        isPeak : bool, optional
+            Removes peaks if True (default) or valleys if False.
+
+        register : bool, optional
+            include this operation in the list of preprocessing operations. If False then the operation will not be stored.
+
+        **Example**
+
+        >>> from patientData import patientData as pD
+        >>> myCase=pD('data.EXP')
+        >>> myCase.findRRmarks(refChannel=2,method='ampd',findPeaks=True,findValleys=True,register=True)
+        >>> myCase.removePeaks([1200, 5300, 9100],isPeak=True,register=True) # remove the peaks closest to 1200, 5300 and 9100
+        """
+        if not self.hasRRmarks:
+            return
+
+        indexes = np.asarray(indexes, dtype=int)
+        marks = np.asarray(self.peakIdx if isPeak else self.valleyIdx, dtype=int)
+        pending = indexes
+        while len(marks) > 0 and len(pending) > 0:
+            # the indexes before the first one whose closest mark is also the closest mark of a previous index are removed at once
+            closest = self._closestMarks(marks, pending)
+            isFirst = np.zeros(len(pending), dtype=bool)
+            isFirst[np.unique(closest, return_index=True)[1]] = True
+            nIndexes = len(pending) if np.all(isFirst) else np.argmin(isFirst)
+            marks = np.delete(marks, closest[:nIndexes])
+            pending = pending[nIndexes:]
+
+        if isPeak:
+            self.peakIdx = marks
+            self._updateBeat2beat()
+        else:
+            self.valleyIdx = marks
+
+        # register operation
+        if register:
+            xmlElement = ETree.Element('removePeaks')
+            tools.ETaddElement(parent=xmlElement, tag='indexes', text=self._indexesToStr(indexes))
+            tools.ETaddElement(parent=xmlElement, tag='isPeak', text=str(isPeak))
+            self.PPoperationsNode.append(xmlElement)
+
+    @staticmethod
+    def _closestMarks(marks, indexes):
+        # position of the mark closest to each index. In case of a tie, the mark on the right
+        indexes = np.asarray(indexes, dtype=int)
+        right = np.clip(np.searchsorted(marks, indexes), 0, len(marks) - 1)
+        left = np.clip(right - 1, 0, len(marks) - 1)
+        return np.where(np.abs(indexes - marks[left]) < np.abs(indexes - marks[right]), left, right)
+
+    @staticmethod
+    def _indexesToStr(indexes):
+        # all values are written (str() of numpy arrays summarizes long arrays). Format read by tools.convStr(..., 'list_int')
+        return '[' + ' '.join([str(x) for x in indexes]) + ']'
+
     def removeRRmarks(self):
         """
         cleanup RR interval information
@@ -1179,8 +1557,227 @@ class patientData():
             pass
 
         self.hasRRmarks = False
+        self.RRmarksSettings = None
+
+    # margin around an edited interval where the marks are detected again, see remapMarks
+    REDETECT_MARGIN_s = 20.0
+
+    def remapMarks(self, marks, refChannel, start, end, isCrop, method=None, isPeak=True, decimationFactor=1):
+        """
+        Update peak/valley marks after the interval [start, end] of the reference channel was cropped or interpolated.
+
+        Marks inside the interval are removed and marks after a cropped interval are shifted. If a detection method is given, the marks around
+        the edited interval are detected again with :meth:`signals.signal.findPeaksRegion`, using the parameters of the whole reference channel,
+        and replace the old marks in that region. The rest of the signal is not processed.
+
+        **Notes**
 
-    def synchronizeSignals(self, channelList, method='correlation', ABPdelay_s=0.0, register=True):
+        * With method 'ampd' (no decimation), the marks after an interpolation are the same of running :meth:`findRRmarks` again.
+        * In the other cases the result is approximate: the marks around the edit are those of the full detection, but a full detection
+          could also change marks far from the edit, since its parameters depend on the whole channel (the AMPD windows depend on the length of
+          the channel and the 'md' thresholds on its percentiles). Call :meth:`findRRmarks` to detect all the marks again.
+
+        Parameters
+        ----------
+        marks : 1D array
+            sorted indexes of the marks, before the edit
+        refChannel : int
+            channel used to detect the marks. It must be already edited.
+        start, end : int
+            edited interval, including the limits. See :meth:`signals.signal.cropInterval` and :meth:`signals.signal.interpolate`.
+        isCrop : bool
+            True if the interval was removed, False if it was interpolated.
+        method : str {'ampd', 'md'} or None, optional
+            detection method, see :meth:`findRRmarks`. If None (default), the marks are only remapped.
+        isPeak : bool, optional
+            True (default) if the marks are peaks, False if they are valleys.
+        decimationFactor : int, optional
+            see :meth:`findRRmarks`.
+
+        Returns
+        -------
+        marks : 1D numpy array
+            sorted indexes of the marks, after the edit
+        """
+        marks = np.asarray(marks, dtype=int)
+        marks = marks[(marks < start) | (marks > end)]
+        if isCrop:
+            marks = np.where(marks > end, marks - (end - start + 1), marks)
+            editEnd = start
+        else:
+            editEnd = end + 1
+
+        if method is None:
+            return marks
+
+        refSignal = self.signals[refChannel]
+        margin = int(self.REDETECT_MARGIN_s * refSignal.samplingRate_Hz)
+        [newMarks, regionStart, regionEnd] = refSignal.findPeaksRegion(method, isPeak, max(start - 1, 0), editEnd, margin, decimationFactor)
+
+        marks = marks[(marks < regionStart) | (marks >= regionEnd)]
+        return np.unique(np.concatenate((marks, newMarks)))
+
+    def remapRRmarks(self, start, end, isCrop, register=True):
+        """
+        Update the RR marks after the interval [start, end] of the reference channel of :meth:`findRRmarks` was cropped or interpolated.
+
+        See :meth:`remapMarks`. The marks are detected again around the interval with the settings of the last call to :meth:`findRRmarks`. If
+        the RR marks were not detected by :meth:`findRRmarks` (e.g. **.PAR** files), nothing is done.
+
+        Parameters
+        ----------
+        start, end : int
+            edited interval, including the limits
+        isCrop : bool
+            True if the interval was removed, False if it was interpolated.
+        register : bool, optional
+            include this operation in the list of preprocessing operations. If False then the operation will not be stored.
+        """
+        settings = self.RRmarksSettings
+        if not self.hasRRmarks or settings is None:
+            return
+
+        for attribute, isPeak in [['peakIdx', True], ['valleyIdx', False]]:
+            marks = getattr(self, attribute, None)
+            if marks is not None:
+                setattr(self, attribute, self.remapMarks(marks, settings['refChannel'], start, end, isCrop, settings['method'], isPeak,
+                                                         settings['decimationFactor']))
+
+        # register operation
+        if register:
+            xmlElement = ETree.Element('remapRRmarks')
+            tools.ETaddElement(parent=xmlElement, tag='frameStart', text=str(start))
+            tools.ETaddElement(parent=xmlElement, tag='frameEnd', text=str(end))
+            tools.ETaddElement(parent=xmlElement, tag='isCrop', text=str(isCrop))
+            self.PPoperationsNode.append(xmlElement)
+
+    def cropInterval(self, start, end, channels=None, RemoveSegment=False, segmentIndexes=None, register=True):
+        """
+        Remove an interval of the channels
+
+        See :meth:`signals.signal.cropInterval`. If the RR marks were detected, they are kept: when the reference channel is cropped, the RR
+        marks are updated with :meth:`remapRRmarks`, detecting again only the marks close to the removed interval.
+
+        Parameters
+        ----------
+        start, end : int
+            interval to be removed, including the limits
+        channels : list of int, optional
+            channels to crop. If None (default), all channels are cropped.
+        RemoveSegment, segmentIndexes:
+            see :meth:`signals.signal.cropInterval`
+        register : bool, optional
+            include this operation in the list of preprocessing operations. If False then the operation will not be stored. The update of the
+            RR marks is registered as a separate **remapRRmarks** operation.
+
+        Returns
+        -------
+        [start, end] : list
+            interval removed from the last channel or None if the interval is not valid.
+
+        **Example**
+
+        >>> from patientData import patientData as pD
+        >>> myCase=pD('data.EXP')
+        >>> myCase.findRRmarks(refChannel=2,method='ampd',findPeaks=True,findValleys=False)
+        >>> myCase.cropInterval(1000, 1500) # remove the interval [1000,1500] of all channels and update the RR marks
+        """
+        if channels is None:
+            channels = range(len(self.signals))
+
+        interval = None
+        for channel in channels:
+            interval = self.signals[channel].cropInterval(start, end, register, RemoveSegment, segmentIndexes)
+            if interval is not None and channel == self._RRmarksRefChannel():
+                self.remapRRmarks(interval[0], interval[1], isCrop=True, register=register)
+        return interval
+
+    def interpolate(self, start, end, method='linear', channels=None, register=True):
+        """
+        Interpolate an interval of the channels
+
+        See :meth:`signals.signal.interpolate`. If the RR marks were detected, they are kept: when the reference channel is interpolated, the RR
+        marks close to the interval are detected again with :meth:`remapRRmarks`.
+
+        Parameters
+        ----------
+        start, end : int
+            interval to be interpolated, including the limits
+        method : str, optional
+            interpolation method. See :meth:`signals.signal.interpolate`
+        channels : list of int, optional
+            channels to interpolate. If None (default), all channels are interpolated.
+        register : bool, optional
+            include this operation in the list of preprocessing operations. If False then the operation will not be stored. The update of the
+            RR marks is registered as a separate **remapRRmarks** operation.
+
+        Returns
+        -------
+        [start, end] : list
+            interpolated interval or None if the data was not changed.
+        """
+        if channels is None:
+            channels = range(len(self.signals))
+
+        interval = None
+        for channel in channels:
+            interval = self.signals[channel].interpolate(start, end, method, register)
+            if interval is not None and channel == self._RRmarksRefChannel():
+                self.remapRRmarks(interval[0], interval[1], isCrop=False, register=register)
+        return interval
+
+    # reference channel of the RR marks or None if the marks were not detected by findRRmarks (e.g. PAR files)
+    def _RRmarksRefChannel(self):
+        if not self.hasRRmarks or self.RRmarksSettings is None:
+            return None
+        return self.RRmarksSettings['refChannel']
+
+    def resampleSignals(self, newSampleRate, method='linear', channelList=None, register=True):
+        """
+        Resample the channels
+
+        Loaded channels with the same sampling rate and number of samples are resampled together, as a single 2D array. See
+        :func:`signals.resampleArray`. Channels not loaded yet (see :class:`patientData`, argument `channels`) are resampled when loaded.
+
+        Parameters
+        ----------
+        newSampleRate : float
+            new sampling rate, in Hz
+
+        method : string, optional
+            'polyphase': polyphase filtering, with anti-aliasing filter. Interpolation methods: 'linear' (default), 'nearest', 'zero',
+            'slinear', 'quadratic', 'cubic', 'previous', 'next'.
+
+        channelList : list of integers, optional
+            List of channels to resample. If `None` (default) then all channels are resampled.
+
+        register : bool, optional
+            include this operation in the list of preprocessing operations. If False then the operation will not be stored. Each channel is
+            registered as a **resample** operation, see :meth:`~signals.signal.resample`.
+
+        **Example**
+
+        >>> from patientData import patientData as pD
+        >>> myCase=pD('data.EXP')
+        >>> myCase.resampleSignals(50.0,method='polyphase',channelList=None,register=True) # resample all channels at 50Hz
+        """
+        if channelList is None:
+            channelList = list(range(self.nChannels))
+
+        # loaded channels with the same sampling rate and number of samples. Channels not loaded yet are resampled when loaded
+        groups = {}
+        for ch in channelList:
+            if not self.signals[ch].isLoaded():
+                self.signals[ch].resample(newSampleRate, method, register)
+                continue
+            groups.setdefault((self.signals[ch].samplingRate_Hz, self.signals[ch].nPoints), []).append(ch)
+
+        for (samplingRate_Hz, _), group in groups.items():
+            newData = resampleArray(np.vstack([self.signals[ch].data for ch in group]), samplingRate_Hz, newSampleRate, method)
+            for i, ch in enumerate(group):
+                self.signals[ch].resample(newSampleRate, method, register, newData=newData[i])
+
+    def synchronizeSignals(self, channelList, method='correlation', ABPdelay_s=0.0, register=True, maxLag_s=0.5, decimationFactor=1):
         """
         Synchronize the channels
 
@@ -1188,9 +1785,9 @@ class patientData():
         Parameters
         ----------
         channelList : list of integers
-            List of channels to synchronize. This argument is used only when method='correlation'
+            List of channels to synchronize. This argument is used only when method='correlation' or 'lagCorrelation'
 
-        method : string  {'correlation', 'fixedAPB'}
+        method : string  {'correlation', 'lagCorrelation', 'fixedAPB'}
             synchronization method. Default: 'correlation'
 
             * fixedAPB: Based on Marco Duarte's implementation <https://github.com/demotu/BMC/blob/master/notebooks/DetectPeaks.ipynb>
@@ -1198,6 +1795,13 @@ class patientData():
         ABPdelay_s : float
             Arterial blood pressure fxed delay in seconds. This argument is used only when method='fixedAPB'.
 
+        maxLag_s : float, optional
+            Largest delay between channels, in seconds. This argument is used only when method='lagCorrelation'. Default: 0.5
+
+        decimationFactor : int, optional
+            If larger than 1, the delays are first searched in decimated copies of the channels. This argument is used only when
+            method='lagCorrelation'. Default: 1 (no decimation)
+
         register : bool, optional
             include this operation in the list of preprocessing operations. If False then the operation will not be stored.
 
@@ -1206,6 +1810,10 @@ class patientData():
 
         * Correlation: synchronization is based on the correlation between the channels. For each two channels, the delay is define by the index of the peak in correlation between the channels.
 
+        * lagCorrelation: same of Correlation, but only delays up to `maxLag_s` are searched (see :func:`delayEstimation.estimateDelay`). The
+          delays are refined to a fraction of sample: the integer part is cropped and the fractional part is applied by interpolation
+          (see :meth:`~signals.signal.shiftFraction`).
+
         * fixedABP: Only the arterial blood pressure (ABP) channel is delayed. The argument `ABPdelay_s` defines the delay, in seconds. This algorithms will look for the APB channel. See :meth:`~signals.signal.setType`.
 
 
@@ -1245,6 +1853,25 @@ class patientData():
                 delays.append(delaySamples)
             delays = [-(x - max(delays)) for x in delays]
 
+        fractions = None  # fraction of sample of the delays, only for lagCorrelation
+        if method == 'lagCorrelation':
+            if len(channelList) == 0:
+                return
+
+            # delays with respect to ABP channel
+            for s in self.signals:  # finds ABP channel  # delay in samples
+                if s.sigType == 'ABP':
+                    refChannel = s.channel
+
+            maxLag = int(round(maxLag_s * self.signals[refChannel].samplingRate_Hz))
+            for ch in channelList:
+                delays.append(delayEstimation.estimateDelay(self.signals[refChannel].data, self.signals[ch].data, maxLag, decimationFactor))
+            delays = [max(delays) - x for x in delays]
+
+            # integer part is cropped, the fraction is interpolated
+            fractions = [x - np.floor(x) for x in delays]
+            delays = [int(np.floor(x)) for x in delays]
+
         if method == 'fixedAPB':
             for s in self.signals:  # finds ABP channel  # delay in samples
                 if s.sigType == 'ABP':
@@ -1263,6 +1890,8 @@ class patientData():
             delay = delays[ch]
             # print('ch: %d   delay:%d' %(channel,delay))
             self.signals[channel].cropFromLeft(delay, register=False)
+            if fractions is not None:
+                self.signals[channel].shiftFraction(fractions[ch])
             length.append(self.signals[channel].nPoints)
 
         minLength = min(length)
@@ -1273,17 +1902,114 @@ class patientData():
         if register:
             xmlElement = ETree.Element('synchronize')
             tools.ETaddElement(parent=xmlElement, tag='method', text=method)
-            if method == 'correlation':
+            if method in ['correlation', 'lagCorrelation']:
                 tools.ETaddElement(parent=xmlElement, tag='channels', text=str(channelList).replace(',', ''))
+            if method == 'lagCorrelation':
+                tools.ETaddElement(parent=xmlElement, tag='maxLag_s', text=str(maxLag_s))
+                if decimationFactor > 1:
+                    tools.ETaddElement(parent=xmlElement, tag='decimationFactor', text=str(decimationFactor))
             if method == 'fixedAPB':
                 tools.ETaddElement(parent=xmlElement, tag='ABPdelay_s', text=str(ABPdelay_s))
             self.PPoperationsNode.append(xmlElement)
 
+    def trackDelays(self, channelList, windowLength_s=60.0, step_s=10.0, maxLag_s=0.5, warp=False, register=True):
+        """
+        Track the delay of the channels with respect to the ABP channel along the recording.
+
+        The delay is computed in sliding windows, see :func:`delayEstimation.delayTrack`. The tracks are stored in :attr:`delayTracks`, a
+        dictionary channel -> 2D array with two rows: time of the center of the windows and delay, both in seconds. A positive delay means
+        the channel is ahead of the ABP channel.
+
+        Parameters
+        ----------
+        channelList : list of integers
+            List of channels to track.
+
+        windowLength_s : float, optional
+            Length of the windows, in seconds. Default: 60.0
+
+        step_s : float, optional
+            Distance between the start of consecutive windows, in seconds. Default: 10.0
+
+        maxLag_s : float, optional
+            Largest delay, in seconds. Default: 0.5
+
+        warp : bool, optional
+            If True, each channel is resampled on the time base of the ABP channel, following its delay track (see
+            :meth:`~signals.signal.warp`). The RR marks are removed. Default: False
+
+        register : bool, optional
+            include this operation in the list of preprocessing operations. If False then the operation will not be stored.
+
+        **Example**
+
+        >>> from patientData import patientData as pD
+        >>> myCase=pD('data.EXP')
+        >>> myCase.signals[2].setType('ABP')
+        >>> myCase.trackDelays(channelList=[0,1],windowLength_s=60.0,step_s=10.0,maxLag_s=0.5,warp=True,register=True)
+        >>> [time_s, delay_s] = myCase.delayTracks[0]
+        """
+        refChannel = [s.channel for s in self.signals if s.sigType == 'ABP']
+        if len(refChannel) == 0:
+            print('Error: ABP channel not found. Please set the ABP channel first...')
+            return
+        reference = self.signals[refChannel[0]]
+        Fs = reference.samplingRate_Hz
+
+        delayTracks = {}
+        for ch in channelList:
+            [center, delay] = delayEstimation.delayTrack(reference.data, self.signals[ch].data, int(round(windowLength_s * Fs)),
+                                                         max(1, int(round(step_s * Fs))), int(round(maxLag_s * Fs)))
+            delayTracks[ch] = np.vstack((center / Fs, delay / Fs))
+        self.delayTracks = delayTracks
+
+        if warp:
+            self.removeRRmarks()
+            for ch in channelList:
+                [center, delay] = self.delayTracks[ch] * Fs
+                self.signals[ch].warp(center, delay)
+
+        # register operation
+        if register:
+            xmlElement = ETree.Element('delayTrack')
+            tools.ETaddElement(parent=xmlElement, tag='channels', text=str(channelList).replace(',', ''))
+            tools.ETaddElement(parent=xmlElement, tag='windowLength_s', text=str(windowLength_s))
+            tools.ETaddElement(parent=xmlElement, tag='step_s', text=str(step_s))
+            tools.ETaddElement(parent=xmlElement, tag='maxLag_s', text=str(maxLag_s))
+            tools.ETaddElement(parent=xmlElement, tag='warp', text=str(warp))
+            self.PPoperationsNode.append(xmlElement)
+
+    def _updateBeat2beat(self):
+        # beat to beat data after the peaks changed: updated locally if possible, otherwise removed (see signals.signal.updateBeat2beat)
+        if not self.hasB2Bdata:
+            return
+
+        for s in self.signals:
+            if not s.updateBeat2beat(self.peakIdx):
+                self.removeBeat2beat()
+                return
+
     def getBeat2beat(self, resampleRate_Hz=100.0, resampleMethod='linear', register=True):
 
         self.hasB2Bdata = True
+
+        # statistics and features of the beats of the loaded channels. Each channel is reduced separately, stacking the channels in a single
+        # array would copy all of them. Channels not loaded yet compute them when loaded
+        loaded = [ch for ch in range(self.nChannels) if self.signals[ch].isLoaded()]
+        stats = {}
+        if len(self.peakIdx) > 1:
+            for ch in loaded:
+                statistics = signals_b2b.beatStatistics(self.signals[ch].data, self.peakIdx)
+                features = signals_b2b.beatFeatures(self.signals[ch].data, self.peakIdx, self.signals[ch].samplingRate_Hz, statistics)
+                stats[ch] = statistics + [features]
+
+        # the loaded channels are resampled together. Channels not loaded yet are resampled when loaded
         for ch in range(self.nChannels):
-            self.signals[ch].beat2beat(self.peakIdx, resampleRate_Hz, resampleMethod)  # print(self.signals[ch].beat2beatData.max)
+            if ch in stats:
+                self.signals[ch].beat2beat(self.peakIdx, None, resampleMethod, stats[ch][:3], stats[ch][3])
+            else:
+                self.signals[ch].beat2beat(self.peakIdx, resampleRate_Hz, resampleMethod)  # print(self.signals[ch].beat2beatData.max)
+        signals_b2b.resampleBeat2beat([self.signals[ch].beat2beatData for ch in stats], resampleRate_Hz, resampleMethod)
 
         # register operation
         if register:
@@ -1297,10 +2023,7 @@ class patientData():
             return
 
         for ch in range(self.nChannels):
-            try:
-                del self.signals[ch].beat2beatData
-            except AttributeError:
-                pass
+            self.signals[ch].removeBeat2beat()
         self.hasB2Bdata = False
 
     def LPfilterBeat2beat(self, method='movvalueingAverage', nTaps=5, register=True):
@@ -1310,7 +2033,7 @@ class patientData():
             return
 
         for s in self.signals:
-            s.beat2beatData.LPfilter(method, nTaps)
+            s.LPfilterBeat2beat(method, nTaps)
 
         # register operation
         if register:
@@ -1319,10 +2042,29 @@ class patientData():
             tools.ETaddElement(parent=xmlElement, tag='Ntaps', text=str(nTaps))
             self.PPoperationsNode.append(xmlElement)
 
-    # filterType: valid values: 'triangular', 'rect', None (no filter)
-    def computePSDwelch(self, useB2B=True, overlap=0.5, segmentLength_s=100, windowType='hanning', detrend=False, filterType=None,
-                        nTapsFilter=3,
-                        register=True):
+    # dependency graph of the AR analysis: result -> results computed from it
+    AR_DEPENDENTS = {'PSD': ['TFA'], 'TFA': ['ARI'], 'ARI': [], 'ARIARMA': [], 'MX': []}
+    AR_COMPUTE = {'PSD': 'computePSDwelch', 'TFA': 'computeTFA', 'ARI': 'computeARI', 'ARIARMA': 'computeARIARMA', 'MX': 'computeMX'}
+
+    # flags of AR analysis results. A result exists if it has a fingerprint, see _setARresult
+    hasPSDdata_L = property(lambda self: 'PSD_L' in self.ARfingerprints)
+    hasPSDdata_R = property(lambda self: 'PSD_R' in self.ARfingerprints)
+    hasTFdata_L = property(lambda self: 'TFA_L' in self.ARfingerprints)
+    hasTFdata_R = property(lambda self: 'TFA_R' in self.ARfingerprints)
+    hasARIdata_L = property(lambda self: 'ARI_L' in self.ARfingerprints)
+    hasARIdata_R = property(lambda self: 'ARI_R' in self.ARfingerprints)
+    hasARIARMAdata_L = property(lambda self: 'ARIARMA_L' in self.ARfingerprints)
+    hasARIARMAdata_R = property(lambda self: 'ARIARMA_R' in self.ARfingerprints)
+    hasMXdata_L = property(lambda self: 'MX_L' in self.ARfingerprints)
+    hasMXdata_R = property(lambda self: 'MX_R' in self.ARfingerprints)
+
+    def _ARinputs(self, useB2B):
+        """
+        Input and output signals of the AR analysis of each side.
+
+        Returns [inputs_L, inputs_R]. Each element is [inputSignal, outputSignal, Fs, unitX, unitY] or None if the ABP or CBFV channel of the
+        side is not defined. See :meth:`~signals.signal.setType`.
+        """
         # find ABP and CBFV channels
         ABP_channel = None
         CBFv_R_channel = None
@@ -1335,47 +2077,101 @@ class patientData():
             if s.sigType == 'CBFV_L':
                 CBFv_L_channel = s.channel
 
-        # left side
-        if (ABP_channel is not None) and (CBFv_L_channel is not None):
+        inputs = []
+        for CBFv_channel in [CBFv_L_channel, CBFv_R_channel]:
+            if (ABP_channel is None) or (CBFv_channel is None):
+                inputs.append(None)
+                continue
+
             if useB2B:
                 inputSignal = self.signals[ABP_channel].beat2beatData.avg
-                outputSignal = self.signals[CBFv_L_channel].beat2beatData.avg
+                outputSignal = self.signals[CBFv_channel].beat2beatData.avg
                 Fs = self.signals[ABP_channel].beat2beatData.samplingRate_Hz
             else:
                 inputSignal = self.signals[ABP_channel].data
-                outputSignal = self.signals[CBFv_L_channel].data
+                outputSignal = self.signals[CBFv_channel].data
                 Fs = self.signals[ABP_channel].samplingRate_Hz
+            inputs.append([inputSignal, outputSignal, Fs, self.signals[ABP_channel].unit, self.signals[CBFv_channel].unit])
 
-            self.PSD_L = PSDestimator(inputSignal, outputSignal, Fs, overlap, segmentLength_s, windowType, detrend,self.signals[ABP_channel].unit,
-                                      self.signals[CBFv_L_channel].unit)
-            self.PSD_L.computeWelch()
-            self.hasPSDdata_L = True
+        return inputs
 
-            if filterType is not None:
-                self.PSD_L.filterAll(filterType, nTapsFilter, keepFirst=True)
-        else:
-            self.hasPSDdata_L = False
+    @staticmethod
+    def _ARfingerprint(result, params, upstream):
+        """
+        Fingerprint of an AR analysis result: hash of the name of the result, its parameters and the fingerprint of its inputs.
+        """
+        return hashlib.sha1(repr([result, sorted(params.items()), upstream]).encode()).hexdigest()
 
-        # right channel
-        if (ABP_channel is not None) and (CBFv_R_channel is not None):
-            if useB2B:
-                inputSignal = self.signals[ABP_channel].beat2beatData.avg
-                outputSignal = self.signals[CBFv_R_channel].beat2beatData.avg
-                Fs = self.signals[ABP_channel].beat2beatData.samplingRate_Hz
-            else:
-                inputSignal = self.signals[ABP_channel].data
-                outputSignal = self.signals[CBFv_R_channel].data
-                Fs = self.signals[ABP_channel].samplingRate_Hz
+    @staticmethod
+    def _inputFingerprint(inputs):
+        """
+        Fingerprint of the signals returned by :meth:`_ARinputs`.
+        """
+        [inputSignal, outputSignal, Fs, unitX, unitY] = inputs
+        fingerprint = hashlib.sha1(repr([Fs, unitX, unitY]).encode())
+        fingerprint.update(np.ascontiguousarray(inputSignal, dtype=float).tobytes())
+        fingerprint.update(np.ascontiguousarray(outputSignal, dtype=float).tobytes())
+        return fingerprint.hexdigest()
+
+    def _setARresult(self, name, fingerprint):
+        self.ARfingerprints[name] = fingerprint
+
+    def _removeARresult(self, name):
+        """
+        Remove the fingerprint of the result and of all results that depend on it.
+        """
+        if self.ARfingerprints.pop(name, None) is None:
+            return
+        [result, side] = name.split('_')
+        for dependent in self.AR_DEPENDENTS[result]:
+            self._removeARresult(dependent + '_' + side)
+
+    def _updateARdependents(self, result):
+        """
+        Recompute the results that depend on `result` and were computed before, with the same parameters. Results that are up to date are not
+        recomputed. The operations are not registered again.
+        """
+        for dependent in self.AR_DEPENDENTS[result]:
+            if dependent in self.ARparameters:
+                getattr(self, self.AR_COMPUTE[dependent])(register=False, **self.ARparameters[dependent])
+
+    # filterType: valid values: 'triangular', 'rect', None (no filter)
+    def computePSDwelch(self, useB2B=True, overlap=0.5, segmentLength_s=100, windowType='hanning', detrend=False, filterType=None,
+                        nTapsFilter=3,
+                        register=True):
+        """
+        Compute the power spectral densities of each side.
 
-            self.PSD_R = PSDestimator(inputSignal, outputSignal, Fs, overlap, segmentLength_s, windowType, detrend,self.signals[ABP_channel].unit,
-                                      self.signals[CBFv_R_channel].unit)
-            self.PSD_R.computeWelch()
-            self.hasPSDdata_R = True
+        Each side is computed only if its input signals or the parameters changed since the last call. Results computed from the PSD (TFA,
+        ARI) are recomputed if needed. See :meth:`_updateARdependents`.
+        """
+        if filterType is None:
+            nTapsFilter = None
+        params = dict(useB2B=useB2B, overlap=overlap, segmentLength_s=segmentLength_s, windowType=windowType, detrend=detrend,
+                      filterType=filterType, nTapsFilter=nTapsFilter)
+
+        for side, inputs in zip(['L', 'R'], self._ARinputs(useB2B)):
+            name = 'PSD_' + side
+            if inputs is None:
+                self._removeARresult(name)
+                continue
+
+            fingerprint = self._ARfingerprint('PSD', params, self._inputFingerprint(inputs))
+            if self.ARfingerprints.get(name) == fingerprint:
+                continue
+
+            [inputSignal, outputSignal, Fs, unitX, unitY] = inputs
+            PSD = PSDestimator(inputSignal, outputSignal, Fs, overlap, segmentLength_s, windowType, detrend, unitX, unitY)
+            PSD.computeWelch()
 
             if filterType is not None:
-                self.PSD_R.filterAll(filterType, nTapsFilter, keepFirst=True)
-        else:
-            self.hasPSDdata_R = False
+                PSD.filterAll(filterType, nTapsFilter, keepFirst=True)
+
+            setattr(self, name, PSD)
+            self._setARresult(name, fingerprint)
+
+        self.ARparameters['PSD'] = params
+        self._updateARdependents('PSD')
 
         if register:
             xmlElement = ETree.Element('PSDwelch')
@@ -1481,21 +2277,28 @@ class patientData():
     # estimatorType:  'H1'   or 'H2'
     def computeTFA(self, estimatorType='H1', register=True):
 
-        if self.hasPSDdata_L:
-            self.TFA_L = transferFunctionAnalysis(PSDdata=self.PSD_L)
-            if estimatorType.upper() == 'H1':
-                self.TFA_L.computeH1()
-            if estimatorType.upper() == 'H2':
-                self.TFA_L.computeH2()
-            self.hasTFdata_L = True
+        params = dict(estimatorType=estimatorType)
+        for side in ['L', 'R']:
+            name = 'TFA_' + side
+            if not 'PSD_' + side in self.ARfingerprints:
+                self._removeARresult(name)
+                continue
+
+            fingerprint = self._ARfingerprint('TFA', params, self.ARfingerprints['PSD_' + side])
+            if self.ARfingerprints.get(name) == fingerprint:
+                continue
 
-        if self.hasPSDdata_R:
-            self.TFA_R = transferFunctionAnalysis(PSDdata=self.PSD_R)
+            TFA = transferFunctionAnalysis(PSDdata=getattr(self, 'PSD_' + side))
             if estimatorType.upper() == 'H1':
-                self.TFA_R.computeH1()
+                TFA.computeH1()
             if estimatorType.upper() == 'H2':
-                self.TFA_R.computeH2()
-            self.hasTFdata_R = True
+                TFA.computeH2()
+
+            setattr(self, name, TFA)
+            self._setARresult(name, fingerprint)
+
+        self.ARparameters['TFA'] = params
+        self._updateARdependents('TFA')
 
         # self.TFA_R.savePlot(fileNamePrefix=None)
 
@@ -1626,13 +2429,23 @@ class patientData():
 
     def computeARI(self, register=True):
 
-        if self.hasTFdata_L:
-            self.ARI_L = ARIanalysis(self.TFA_L.H, self.TFA_L.PSDdata.Ts,self.TFA_L.PSDdata.unitX,self.TFA_L.PSDdata.unitY)
-            self.hasARIdata_L = True
+        params = dict()
+        for side in ['L', 'R']:
+            name = 'ARI_' + side
+            if not 'TFA_' + side in self.ARfingerprints:
+                self._removeARresult(name)
+                continue
 
-        if self.hasTFdata_R:
-            self.ARI_R = ARIanalysis(self.TFA_R.H, self.TFA_R.PSDdata.Ts,self.TFA_R.PSDdata.unitX,self.TFA_R.PSDdata.unitY)
-            self.hasARIdata_R = True
+            fingerprint = self._ARfingerprint('ARI', params, self.ARfingerprints['TFA_' + side])
+            if self.ARfingerprints.get(name) == fingerprint:
+                continue
+
+            TFA = getattr(self, 'TFA_' + side)
+            setattr(self, name, ARIanalysis(TFA.H, TFA.PSDdata.Ts, TFA.PSDdata.unitX, TFA.PSDdata.unitY))
+            self._setARresult(name, fingerprint)
+
+        self.ARparameters['ARI'] = params
+        self._updateARdependents('ARI')
 
         if register:
             xmlElement = ETree.Element('ARI')
@@ -1726,55 +2539,23 @@ class patientData():
 
     def computeARIARMA(self, useB2B=True, orderP=2,orderQ=2,register=True):
 
-        # find ABP and CBFV channels
-        ABP_channel = None
-        CBFv_R_channel = None
-        CBFv_L_channel = None
-        for s in self.signals:
-            if s.sigType == 'ABP':
-                ABP_channel = s.channel
-            if s.sigType == 'CBFV_R':
-                CBFv_R_channel = s.channel
-            if s.sigType == 'CBFV_L':
-                CBFv_L_channel = s.channel
-
-        # left side
-        if (ABP_channel is not None) and (CBFv_L_channel is not None):
-            if useB2B:
-                inputSignal = self.signals[ABP_channel].beat2beatData.avg
-                outputSignal = self.signals[CBFv_L_channel].beat2beatData.avg
-                Fs = self.signals[ABP_channel].beat2beatData.samplingRate_Hz
-            else:
-                inputSignal = self.signals[ABP_channel].data
-                outputSignal = self.signals[CBFv_L_channel].data
-                Fs = self.signals[ABP_channel].samplingRate_Hz
-
-            self.ARIARMA_L = ARIARMAanalysis(inputSignal, outputSignal, Fs,  orderP, orderQ,self.signals[ABP_channel].unit,
-                                      self.signals[CBFv_L_channel].unit)
+        params = dict(useB2B=useB2B, orderP=orderP, orderQ=orderQ)
+        for side, inputs in zip(['L', 'R'], self._ARinputs(useB2B)):
+            name = 'ARIARMA_' + side
+            if inputs is None:
+                self._removeARresult(name)
+                continue
 
-            self.hasARIARMAdata_L = True
+            fingerprint = self._ARfingerprint('ARIARMA', params, self._inputFingerprint(inputs))
+            if self.ARfingerprints.get(name) == fingerprint:
+                continue
 
-        else:
-            self.hasARIARMAdata_L = False
+            [inputSignal, outputSignal, Fs, unitX, unitY] = inputs
+            setattr(self, name, ARIARMAanalysis(inputSignal, outputSignal, Fs, orderP, orderQ, unitX, unitY))
+            self._setARresult(name, fingerprint)
 
-        # right channel
-        if (ABP_channel is not None) and (CBFv_R_channel is not None):
-            if useB2B:
-                inputSignal = self.signals[ABP_channel].beat2beatData.avg
-                outputSignal = self.signals[CBFv_R_channel].beat2beatData.avg
-                Fs = self.signals[ABP_channel].beat2beatData.samplingRate_Hz
-            else:
-                inputSignal = self.signals[ABP_channel].data
-                outputSignal = self.signals[CBFv_R_channel].data
-                Fs = self.signals[ABP_channel].samplingRate_Hz
-
-            self.ARIARMA_R = ARIARMAanalysis(inputSignal, outputSignal, Fs,  orderP, orderQ,self.signals[ABP_channel].unit,
-                                      self.signals[CBFv_R_channel].unit)
-
-            self.hasARIARMAdata_R = True
-
-        else:
-            self.hasARIARMAdata_R = False
+        self.ARparameters['ARIARMA'] = params
+        self._updateARdependents('ARIARMA')
 
         if register:
             xmlElement = ETree.Element('ARIARMA')
@@ -1871,55 +2652,25 @@ class patientData():
 
     def computeMX(self, useB2B=True, epochLength_s=30, blockLength_s=10, register=True):
 
-        # find ABP and CBFV channels
-        ABP_channel = None
-        CBFv_R_channel = None
-        CBFv_L_channel = None
-        for s in self.signals:
-            if s.sigType == 'ABP':
-                ABP_channel = s.channel
-            if s.sigType == 'CBFV_R':
-                CBFv_R_channel = s.channel
-            if s.sigType == 'CBFV_L':
-                CBFv_L_channel = s.channel
-
-        # left side
-        if (ABP_channel is not None) and (CBFv_L_channel is not None):
-            if useB2B:
-                inputSignal = self.signals[ABP_channel].beat2beatData.avg
-                outputSignal = self.signals[CBFv_L_channel].beat2beatData.avg
-                Fs = self.signals[ABP_channel].beat2beatData.samplingRate_Hz
-            else:
-                inputSignal = self.signals[ABP_channel].data
-                outputSignal = self.signals[CBFv_L_channel].data
-                Fs = self.signals[ABP_channel].samplingRate_Hz
-
-            self.Mx_L = meanFlowIdx(inputSignal, outputSignal, Fs, epochLength_s, blockLength_s, self.signals[ABP_channel].unit,
-                                      self.signals[CBFv_L_channel].unit)
-            self.Mx_L.calcMx()
-            self.hasMXdata_L = True
-
-        else:
-            self.hasMXdata_L = False
-
-        # right channel
-        if (ABP_channel is not None) and (CBFv_R_channel is not None):
-            if useB2B:
-                inputSignal = self.signals[ABP_channel].beat2beatData.avg
-                outputSignal = self.signals[CBFv_R_channel].beat2beatData.avg
-                Fs = self.signals[ABP_channel].beat2beatData.samplingRate_Hz
-            else:
-                inputSignal = self.signals[ABP_channel].data
-                outputSignal = self.signals[CBFv_R_channel].data
-                Fs = self.signals[ABP_channel].samplingRate_Hz
-
-            self.Mx_R = meanFlowIdx(inputSignal, outputSignal, Fs, epochLength_s, blockLength_s,self.signals[ABP_channel].unit,
-                                      self.signals[CBFv_R_channel].unit)
-            self.Mx_R.calcMx()
-            self.hasMXdata_R = True
-
-        else:
-            self.hasMXdata_R = False
+        params = dict(useB2B=useB2B, epochLength_s=epochLength_s, blockLength_s=blockLength_s)
+        for side, inputs in zip(['L', 'R'], self._ARinputs(useB2B)):
+            name = 'MX_' + side
+            if inputs is None:
+                self._removeARresult(name)
+                continue
+
+            fingerprint = self._ARfingerprint('MX', params, self._inputFingerprint(inputs))
+            if self.ARfingerprints.get(name) == fingerprint:
+                continue
+
+            [inputSignal, outputSignal, Fs, unitX, unitY] = inputs
+            Mx = meanFlowIdx(inputSignal, outputSignal, Fs, epochLength_s, blockLength_s, unitX, unitY)
+            Mx.calcMx()
+            setattr(self, 'Mx_' + side, Mx)
+            self._setARresult(name, fingerprint)
+
+        self.ARparameters['MX'] = params
+        self._updateARdependents('MX')
 
         if register:
             xmlElement = ETree.Element('MX')
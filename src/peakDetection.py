@@ -0,0 +1,284 @@
+#!/bin/python
+
+# -*- coding: utf-8 -*-
+"""
+Windowed peak detection in a pool of worker processes.
+
+The channel is split in windows, the detector runs on each window in a worker process and the indexes found in the windows are shifted to
+the position of the window and merged. The windows are mapped in order, so the result does not depend on the number of workers.
+"""
+import concurrent.futures
+
+import numpy as np
+
+import ampdLib
+
+
+def overlappingWindows(nPoints, windowLength, step):
+    """
+    Windows [start, end) of length `windowLength`, starting every `step` samples. The last windows may be shorter.
+
+    Parameters
+    ----------
+    nPoints: int
+        length of the signal
+    windowLength: int
+        length of the windows, in samples
+    step: int
+        distance between the start of consecutive windows, in samples. If smaller than `windowLength`, the windows overlap.
+
+    Returns
+    -------
+    windows: list of [start, end]
+    """
+    return [[start, min(start + windowLength, nPoints)] for start in range(0, nPoints - step, step)]
+
+
+def runWindows(detector, data, windows, nWorkers=None, **kwargs):
+    """
+    Run a detector on each window of the signal.
+
+    Parameters
+    ----------
+    detector: function
+        function called as detector(data[start:end], \\*\\*kwargs). It must be defined at module level, so it can be sent to the worker processes.
+    data: 1D numpy array
+        signal
+    windows: list of [start, end]
+        windows of the signal
+    nWorkers: int or None
+        number of worker processes. If None, the number of processors of the machine is used. If 1, the windows are processed in the current
+        process.
+    kwargs:
+        arguments of the detector
+
+    Returns
+    -------
+    results: list
+        result of the detector for each window, in the order of `windows`.
+    """
+    segments = [data[start:end] for [start, end] in windows]
+
+    if nWorkers == 1 or len(windows) < 2:
+        return [detector(segment, **kwargs) for segment in segments]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=nWorkers) as executor:
+        futures = [executor.submit(detector, segment, **kwargs) for segment in segments]
+        return [future.result() for future in futures]
+
+
+def mergeWindows(indexList, windows, unique=True):
+    """
+    Shift the indexes found in each window to the position of the window and merge them.
+
+    Parameters
+    ----------
+    indexList: list of 1D arrays
+        indexes found in each window, relative to the start of the window
+    windows: list of [start, end]
+        windows of the signal
+    unique: bool
+        If True (default), the indexes are sorted and indexes found in more than one window (overlaps) are kept once. If False, the
+        indexes are concatenated in the order of the windows.
+
+    Returns
+    -------
+    indexes: 1D numpy array
+    """
+    indexes = np.concatenate([np.array([], dtype=int)] + [np.asarray(idx) + start for idx, [start, _] in zip(indexList, windows)])
+    if unique:
+        return np.unique(indexes)
+    return indexes
+
+
+def mergeClosePeaks(peakIdx, minDistance):
+    """
+    Merge peaks closer than `minDistance` samples.
+
+    Each peak is compared with the next one: if they are more than `minDistance` samples apart, the peak is kept, otherwise it is replaced by
+    the next peak. The last peak is compared with no other peak and is kept only when it replaces the previous one.
+
+    Parameters
+    ----------
+    peakIdx: 1D array
+        sorted indexes of the peaks
+    minDistance: int
+        minimum distance between peaks, in samples
+
+    Returns
+    -------
+    peakIdx: 1D numpy array
+        indexes of the peaks. May contain repeated indexes.
+    """
+    peakIdx = np.asarray(peakIdx, dtype=int)
+    return np.where(np.diff(peakIdx) > minDistance, peakIdx[:-1], peakIdx[1:])
+
+
+def _backtrackValley(data, peak, minProminence):
+    # sample by sample search of backtrackValleys
+    cumulativeProminence = 0
+    idx = peak
+    dx = data[idx] - data[idx - 1]
+    while idx >= 0 and (dx > 0 or cumulativeProminence < minProminence):
+        cumulativeProminence += dx
+        idx -= 1
+        dx = data[idx] - data[idx - 1]
+    return idx
+
+
+def backtrackValleys(data, peakIdx, minProminence):
+    """
+    Find the valley before each peak.
+
+    Starting at the peak and walking backwards, the valley is the first sample that is not above the previous sample (data[-1] is the sample
+    before data[0]) and is at least `minProminence` below the peak.
+
+    Only the samples that are not above the previous one are visited, all peaks at once. The drop from the peak is computed as
+    data[peak] - data[idx]. The walk accumulates the differences one by one, so peaks whose drop is within rounding error of `minProminence` at
+    any visited sample are searched again sample by sample, to give the same indexes.
+
+    Parameters
+    ----------
+    data: 1D numpy array
+        signal
+    peakIdx: 1D array
+        indexes of the peaks
+    minProminence: float
+        minimum drop from the peak to the valley
+
+    Returns
+    -------
+    valleyIdx: 1D numpy array
+        index of the valley of each peak, or -1 if no valley was found.
+    """
+    peakIdx = np.asarray(peakIdx, dtype=int)
+    valleyIdx = np.full(len(peakIdx), -1, dtype=int)
+    if len(peakIdx) == 0:
+        return valleyIdx
+
+    dx = data - np.roll(data, 1)  # dx[i] = data[i] - data[i-1]
+    candidates = np.flatnonzero(dx <= 0)
+    tolerance = 1e-9 * (np.max(np.abs(data)) + abs(minProminence))
+
+    position = np.searchsorted(candidates, peakIdx, side='right') - 1  # last candidate before each peak
+    nearTie = np.zeros(len(peakIdx), dtype=bool)
+    active = np.flatnonzero(position >= 0)
+    while len(active) > 0:
+        idx = candidates[position[active]]
+        drop = data[peakIdx[active]] - data[idx] - minProminence
+        nearTie[active[np.abs(drop) <= tolerance]] = True
+
+        found = drop >= 0
+        valleyIdx[active[found]] = idx[found]
+
+        active = active[~found]
+        position[active] -= 1
+        active = active[position[active] >= 0]
+
+    for i in np.flatnonzero(nearTie):
+        valleyIdx[i] = _backtrackValley(data, peakIdx[i], minProminence)
+
+    return valleyIdx
+
+
+def ampdParallel(data, order, LSMlimit=1, nWorkers=None):
+    """
+    AMPD peak detection in overlapping windows, processed in parallel. The windows and the result are the same of :func:`ampdLib.ampdFast`.
+
+    Parameters
+    ----------
+    data: 1D numpy array
+        signal
+    order: int
+        the signal is divided in about 2*`order` windows, with 50% overlap
+    LSMlimit: float
+        see :func:`ampdLib.ampd`
+    nWorkers: int or None
+        number of worker processes. See :func:`runWindows`
+
+    Returns
+    -------
+    pks: 1D numpy array
+        sorted indexes of the peaks
+    """
+    windows = ampdWindows(len(data), order)
+    return mergeWindows(runWindows(ampdLib.ampd, data, windows, nWorkers, LSMlimit=LSMlimit), windows)
+
+
+def ampdWindows(nPoints, order):
+    """
+    Windows of :func:`ampdParallel` and :func:`ampdLib.ampdFast`: about 2*`order` windows with 50% overlap. The windows depend on the length
+    of the signal.
+
+    Returns
+    -------
+    windows: list of [start, end]
+    """
+    while nPoints % order != 0:
+        order -= 1
+    N = int(nPoints / order / 2)
+    return overlappingWindows(nPoints, 2 * N - 1, N)
+
+
+def ampdRegion(data, order, start, end, LSMlimit=1, minDistance=None):
+    """
+    Peaks of :func:`ampdParallel` around the samples [start, end), without processing the whole signal.
+
+    Only the windows of :func:`ampdParallel` that overlap [start, end) and some of their neighbours are processed. Each window is processed
+    as in :func:`ampdParallel`, so the peaks returned are the same of ampdParallel(data, order, LSMlimit) in the region [regionStart, regionEnd),
+    that contains [start, end).
+
+    Parameters
+    ----------
+    data: 1D numpy array
+        signal
+    order, LSMlimit:
+        see :func:`ampdParallel`
+    start, end: int
+        samples [start, end) of interest
+    minDistance: int or None
+        If given, the peaks are merged with :func:`mergeClosePeaks` and repeated indexes are removed, as in
+        :meth:`signals.signal.findPeaks`. The region is extended until the peaks next to it are known, so the merge is also the same.
+
+    Returns
+    -------
+    [pks, regionStart, regionEnd]
+        sorted indexes of the peaks in [regionStart, regionEnd)
+    """
+    windows = ampdWindows(len(data), order)
+    if len(windows) == 0:
+        return [np.array([], dtype=int), 0, len(data)]
+
+    # windows that overlap [start, end)
+    changed = [k for k, [wStart, wEnd] in enumerate(windows) if wStart < end and wEnd > start]
+    if len(changed) == 0:
+        changed = [int(np.clip(np.searchsorted([w[0] for w in windows], start) - 1, 0, len(windows) - 1))]
+    [changedStart, changedEnd] = [windows[changed[0]][0], windows[changed[-1]][1]]
+    [first, last] = [changed[0] - 1, changed[-1] + 1]
+
+    while True:
+        first = max(first, 0)
+        last = min(last, len(windows) - 1)
+
+        # peaks found only by the processed windows
+        regionStart = 0 if first == 0 else windows[first - 1][1]
+        regionEnd = len(data) if last == len(windows) - 1 else windows[last + 1][0]
+        pks = mergeWindows(runWindows(ampdLib.ampd, data, windows[first:last + 1], 1, LSMlimit=LSMlimit), windows[first:last + 1])
+        pks = pks[(pks >= regionStart) & (pks < regionEnd)]
+        if minDistance is None:
+            return [pks, regionStart, regionEnd]
+
+        # each merged peak depends on the peaks before and after it: two peaks are needed on each side of the windows that overlap [start, end)
+        hasLeft = first == 0 or np.count_nonzero(pks < changedStart) >= 2
+        hasRight = last == len(windows) - 1 or np.count_nonzero(pks >= changedEnd) >= 2
+        if hasLeft and hasRight:
+            break
+        first -= 0 if hasLeft else 1
+        last += 0 if hasRight else 1
+
+    merged = np.unique(mergeClosePeaks(pks, minDistance))
+    if first > 0:
+        regionStart = pks[1]
+    if last < len(windows) - 1:
+        regionEnd = pks[-2] + 1
+    return [merged[(merged >= regionStart) & (merged < regionEnd)], regionStart, regionEnd]
@@ -9,7 +9,8 @@ from signalPlotWidget import plotArray
 
 # dict format:  '#code' : (paramValue,'string name')
 resampleFsMethodDict = {0: ('min', 'Min'), 1: ('max', 'Max'), 2: ('custom', 'Custom')}
-resampleInterpolationMethod = {0: ('zero', 'Zero'), 1: ('linear', 'Linear'), 2: ('quadratic', 'Quadratic'), 3: ('cubic', 'Cubic')}
+resampleInterpolationMethod = {0: ('zero', 'Zero'), 1: ('linear', 'Linear'), 2: ('quadratic', 'Quadratic'), 3: ('cubic', 'Cubic'),
+                               4: ('polyphase', 'Polyphase')}
 calibrationMethodDict = {0: ('absolute', 'Absolute'), 1: ('percentile', 'Percentiles 5/95')}
 calibrationWindowDict = {0: ('alldata', 'All data'), 1: ('window10s', 'Window 10s'), 2: ('window5s', 'Window 5s'), 3: ('window2s', 'Window 2s')}
 
@@ -131,9 +132,8 @@ class resampleCalibrateWidget(QtWidgets.QWidget):
         if self.fsMethod == 'custom':
             Fs = self.Fs_custom
 
-        # resample via interpolation
-        for s in self.data.signals:
-            s.resample(Fs, method=self.interpMethod)
+        # resample all channels
+        self.data.resampleSignals(Fs, method=self.interpMethod)
 
         self.plotArea.replotAllsignals()
         self.resampleButton.clearFocus()
@@ -1,27 +1,170 @@
 #!/bin/python
 
 # -*- coding: utf-8 -*-
+from fractions import Fraction
+
 import numpy as np
 from lxml import etree as ETree
 from scipy import interpolate as scipyInterpolate
+from scipy import ndimage
 from scipy import signal as scipySignal
 
-import ampdLib
+import peakDetection
 import signals_b2b
 import tools
 
 
+# peaks and valleys of one segment of findPeaksBySegments
+def _findPeaksSegment(data, DeltaTMin):
+    sMax = np.percentile(data, 90.0)
+    smph = np.percentile(data, 60.0)
+    sMin = np.percentile(data, 10.0)
+    prominence = (sMax - sMin) * 0.1
+
+    peakIdx = tools.detect_peaks(data, mph=smph, mpd=DeltaTMin, threshold=0, edge='rising', kpsh=False, MinPeakProminence=prominence,
+                                 MinPeakProminenceSide='left', valley=False, fast=True)
+
+    valleyIdx = peakDetection.backtrackValleys(data, peakIdx, (sMax - sMin) * 0.5)
+    valleyIdx = valleyIdx[valleyIdx >= 0]
+
+    return [peakIdx, valleyIdx]
+
+
+# largest up/down factor of the polyphase resampling. Ratios that need larger factors are resampled by interpolation
+MAX_POLYPHASE_FACTOR = 1000
+
+
+def polyphaseFactors(samplingRate_Hz, newSampleRate):
+    """
+    Up and down factors of the polyphase resampling from `samplingRate_Hz` to `newSampleRate`, or None if the ratio of the rates is not a
+    fraction with numerator and denominator up to MAX_POLYPHASE_FACTOR.
+    """
+    ratio = Fraction(newSampleRate).limit_denominator(MAX_POLYPHASE_FACTOR ** 2) / Fraction(samplingRate_Hz).limit_denominator(MAX_POLYPHASE_FACTOR ** 2)
+    if ratio.numerator > MAX_POLYPHASE_FACTOR or ratio.denominator > MAX_POLYPHASE_FACTOR:
+        return None
+    return [ratio.numerator, ratio.denominator]
+
+
+def resampledLength(nPoints, samplingRate_Hz, newSampleRate, method='linear'):
+    """
+    Number of samples of a signal of `nPoints` samples after :func:`resampleArray`, without resampling it.
+    """
+    if method == 'polyphase':
+        factors = polyphaseFactors(samplingRate_Hz, newSampleRate)
+        if factors is not None:
+            return -((-(nPoints - 1) * factors[0]) // factors[1])
+
+    # length of np.arange(0, (nPoints - 1) / samplingRate_Hz, 1.0 / newSampleRate)
+    return max(int(np.ceil(((nPoints - 1) / samplingRate_Hz) / (1.0 / newSampleRate))), 0)
+
+
+def resampleArray(data, samplingRate_Hz, newSampleRate, method='linear'):
+    """
+    Resample signals along the last axis.
+
+    The new samples are at the times 0, 1/newSampleRate, 2/newSampleRate... before the time of the last sample, for all methods.
+
+    Parameters
+    ----------
+    data: numpy array
+        signal (1D) or signals (2D, one channel per row), all with the same sampling rate
+    samplingRate_Hz: float
+        sampling rate of data
+    newSampleRate: float
+        new sampling rate
+    method: string
+        'polyphase': polyphase filtering (scipy.signal.resample_poly), with anti-aliasing lowpass filter. If the ratio of the rates is not a
+        simple fraction (see :func:`polyphaseFactors`), cubic interpolation is used.
+
+        interpolation methods (see scipy.interpolate.interp1d): 'linear', 'nearest', 'zero', 'slinear', 'quadratic', 'cubic', 'previous',
+        'next'
+
+    Returns
+    -------
+    newData: numpy array
+        resampled signals
+    """
+    nPoints = data.shape[-1]
+    if method == 'polyphase':
+        factors = polyphaseFactors(samplingRate_Hz, newSampleRate)
+        if factors is not None:
+            [up, down] = factors
+            nNew = -((-(nPoints - 1) * up) // down)  # new samples before the last sample: ceil((nPoints - 1) * up / down)
+            return scipySignal.resample_poly(data, up, down, axis=-1, padtype='line')[..., :nNew]
+        print('Sampling rates %g Hz -> %g Hz are not a simple ratio: using cubic interpolation' % (samplingRate_Hz, newSampleRate))
+        method = 'cubic'
+
+    xData = np.arange(nPoints) / samplingRate_Hz
+    f = scipyInterpolate.interp1d(xData, data, kind=method, axis=-1, fill_value=(data[..., 0], data[..., -1]), assume_sorted=True)
+
+    xNew = np.arange(xData[0], xData[-1], 1.0 / newSampleRate)
+    return f(xNew)
+
+
 class signal():
-    def __init__(self, channel, label, unit, data, samplingRate_Hz, operationsXML):
+    # data: 1D array with the samples or None if the channel is loaded on demand. In this case, dataLoader is a callable
+    #       that returns the samples and nPoints is the number of samples
+    def __init__(self, channel, label, unit, data, samplingRate_Hz, operationsXML, dataLoader=None, nPoints=None):
         self.channel = channel
         self.label = label
         self.unit = unit
         self.sigType = None  # 'ABP','CBFV_L', 'CBFV_R', 'ETCO2', None
-        self.data = data
+        self._data = data
+        self._dataLoader = dataLoader
+        self._pendingOps = []  # operations applied before the data is loaded. They are replayed by _loadData
+        self._beat2beatData = None
         self.samplingRate_Hz = float(samplingRate_Hz)
-        self.nPoints = self.data.shape[0]
+        if data is None:
+            self.nPoints = nPoints
+        else:
+            self.nPoints = self._data.shape[0]
         self.operationsXML = operationsXML
 
+    @property
+    def data(self):
+        if self._data is None and self._dataLoader is not None:
+            self._loadData()
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    # beat to beat data (see signals_b2b.beat2beat). Raises AttributeError if it was not computed. Channels not loaded yet compute it on first
+    # access
+    @property
+    def beat2beatData(self):
+        if any(op[0] == 'beat2beat' for op in self._pendingOps):
+            self._loadData()
+        if self._beat2beatData is None:
+            raise AttributeError('beat2beatData')
+        return self._beat2beatData
+
+    @beat2beatData.setter
+    def beat2beatData(self, value):
+        self._beat2beatData = value
+
+    def isLoaded(self):
+        return self._data is not None
+
+    def _loadData(self):
+        data = self._dataLoader()
+        if data is None:
+            raise IOError('could not load data of channel %d' % self.channel)
+
+        self._data = data
+        self._dataLoader = None
+
+        # the operations are replayed from the number of samples and the sampling rate of the loaded data
+        pendingOps = self._pendingOps
+        self._pendingOps = []
+        self.nPoints = data.shape[0]
+        resampleOps = [args for [method, args] in pendingOps if method == '_resampleFrom']
+        if len(resampleOps) > 0:
+            self.samplingRate_Hz = resampleOps[0][0]
+        for [method, args] in pendingOps:
+            getattr(self, method)(*args)
+
     def info(self):
         print('-------------------------------')
         print('Channel: %d' % self.channel)
@@ -47,7 +190,8 @@ class signal():
 
         fileObj.write('=' * 80 + '\n')
 
-    def saveB2B(self, fileObj):
+    # features: if True, saves the features of each beat too (see signals_b2b.beatFeatures)
+    def saveB2B(self, fileObj, features=False):
         fileObj.write('CHANNEL=%d\n' % self.channel)
         fileObj.write('LABEL=%s\n' % self.label)
         fileObj.write('UNIT=%s\n' % self.unit)
@@ -62,6 +206,11 @@ class signal():
         fileObj.write('MIN=' + np.array2string(self.beat2beatData.min, **args) + '\n')
         fileObj.write('AVG=' + np.array2string(self.beat2beatData.avg, **args) + '\n')
 
+        if features and self.beat2beatData.features is not None:
+            fileObj.write('BEAT_TIME_(S)=' + np.array2string(self.beat2beatData.beatTime_s, **args) + '\n')
+            for name in signals_b2b.BEAT_FEATURES:
+                fileObj.write(name.upper() + '=' + np.array2string(self.beat2beatData.getFeature(name), **args) + '\n')
+
         fileObj.write('=' * 80 + '\n')
 
     def registerOperation(self, xmlElement):
@@ -96,46 +245,21 @@ class signal():
             tools.ETaddElement(parent=xmlElement, tag='type', text=newType)
             self.registerOperation(xmlElement)
 
-    def findPeaksBySegments(self, segmentLengh_s=20.0):
+    def findPeaksBySegments(self, segmentLengh_s=20.0, nWorkers=1):
         segmentLength = segmentLengh_s * self.samplingRate_Hz  # equivalent to 20seconds of data
         nSegments = int(self.nPoints / segmentLength)
         fmax_bpm = 200
         DeltaTMin = int(60.0 / float(fmax_bpm) * self.samplingRate_Hz)  # number of samples that represents a frequency of 220bpm
 
-        dataSegments = np.array_split(self.data, nSegments)
-
-        peakIdx = np.array([], dtype=int)
-        valleyIdx = np.array([], dtype=int)
-
-        idxStart = 0
-        for s in range(len(dataSegments)):
-            data = dataSegments[s]
-            sMax = np.percentile(data, 90.0)
-            smph = np.percentile(data, 60.0)
-            sMin = np.percentile(data, 10.0)
-            prominence = (sMax - sMin) * 0.1
-
-            peakIdxSegment = tools.detect_peaks(data, mph=smph, mpd=DeltaTMin, threshold=0, edge='rising', kpsh=False, MinPeakProminence=prominence,
-                                                MinPeakProminenceSide='left', valley=False)
-
-            valleyIdxSegment = []
-            for i in peakIdxSegment:
-                cumulativeProminence = 0
-                idx = i
-                dx = data[idx] - data[idx - 1]
-                while idx >= 0 and (dx > 0 or cumulativeProminence < (sMax - sMin) * 0.5):
-                    cumulativeProminence += dx
-                    idx -= 1
-                    dx = data[idx] - data[idx - 1]
-
-                if idx >= 0:
-                    valleyIdxSegment.append(idx)
-
-            valleyIdxSegment = np.array(valleyIdxSegment)
-            # print(valleyIdxSegment)
-            peakIdx = np.append(peakIdx, peakIdxSegment + idxStart, axis=None)
-            valleyIdx = np.append(valleyIdx, valleyIdxSegment + idxStart, axis=None)
-            idxStart += data.shape[0]
+        # same segments of np.array_split: the first nPoints % nSegments segments have one extra sample
+        segmentSizes = [self.nPoints // nSegments + 1] * (self.nPoints % nSegments) + [self.nPoints // nSegments] * (nSegments - self.nPoints % nSegments)
+        boundaries = np.cumsum([0] + segmentSizes)
+        windows = [[boundaries[i], boundaries[i + 1]] for i in range(nSegments)]
+
+        results = peakDetection.runWindows(_findPeaksSegment, self.data, windows, nWorkers, DeltaTMin=DeltaTMin)
+
+        peakIdx = peakDetection.mergeWindows([x[0] for x in results], windows, unique=False)
+        valleyIdx = peakDetection.mergeWindows([x[1] for x in results], windows, unique=False)
 
         # print(peakIdx)
         peakVal = self.data[peakIdx]
@@ -143,56 +267,32 @@ class signal():
 
         return [peakIdx, peakVal, valleyIdx, valleyVal]
 
-    def findPeaks(self, method='ampd', findPeaks=True, findValleys=False, register=False):
+    # nWorkers: number of worker processes of the 'ampd' method. If None, the number of processors is used. See peakDetection.runWindows
+    # decimationFactor: if > 1, the peaks are detected in the signal decimated by this factor and refined to the local maximum (minimum) of
+    #                   the full rate signal, within +- decimationFactor samples. See _findPeaksDecimated
+    def findPeaks(self, method='ampd', findPeaks=True, findValleys=False, register=False, nWorkers=1, decimationFactor=1):
 
         peakIdx = None
         peakVal = None
         valleyIdx = None
         valleyVal = None
 
-        if method.lower() == 'ampd':
+        if decimationFactor > 1:
+            [peakIdx, valleyIdx] = self._findPeaksDecimated(method, findPeaks, findValleys, nWorkers, decimationFactor)
+
+        elif method.lower() == 'ampd':
             if findPeaks:
-                peakIdx = ampdLib.ampdFast(self.data, 10, LSMlimit=0.2)
+                peakIdx = peakDetection.ampdParallel(self.data, 10, LSMlimit=0.2, nWorkers=nWorkers)
 
                 fmax_bpm = 250
                 DeltaTMin = int(60.0 / float(fmax_bpm) * self.samplingRate_Hz)  # number of samples that represents a frequency of 250bpm
-                temp = []
-                for i in range(len(peakIdx) - 1):
-                    if peakIdx[i + 1] - peakIdx[i] > DeltaTMin:  # 5 samples appart
-                        temp.append(peakIdx[i])
-                    else:
-                        temp.append(max(peakIdx[i], peakIdx[i + 1]))
-                peakIdx = temp
+                peakIdx = peakDetection.mergeClosePeaks(peakIdx, DeltaTMin)
 
             if findValleys:
-                valleyIdx = ampdLib.ampdFast(-self.data, 10, LSMlimit=0.1)
+                valleyIdx = peakDetection.ampdParallel(-self.data, 10, LSMlimit=0.1, nWorkers=nWorkers)
 
-        if method.lower() == 'md':
-            fmax_bpm = 250
-            sMax = np.percentile(self.data, 90.0)
-            smph = np.percentile(self.data, 60.0)
-            sMin = np.percentile(self.data, 10.0)
-            prominence = (sMax - sMin) * 0.2
-
-            DeltaTMin = int(60.0 / float(fmax_bpm) * self.samplingRate_Hz)  # number of samples that represents a frequency of 250bpm
-
-            peakIdx = tools.detect_peaks(self.data, mph=smph, mpd=DeltaTMin, threshold=0, edge='rising', kpsh=False, MinPeakProminence=prominence,
-                                         MinPeakProminenceSide='left', valley=False)
-
-            if findValleys:
-                valleyIdx = []
-                for i in peakIdx:
-                    cumulativeProminence = 0
-                    idx = i
-                    dx = self.data[idx] - self.data[idx - 1]
-                    while idx >= 0 and (dx > 0 or cumulativeProminence < (sMax - sMin) * 0.5):
-                        cumulativeProminence += dx
-                        idx -= 1
-                        dx = self.data[idx] - self.data[idx - 1]
-
-                    valleyIdx.append(idx)
-
-                valleyIdx = np.array(valleyIdx)
+        elif method.lower() == 'md':
+            [peakIdx, valleyIdx] = self._findPeaksMD(self.data, self._mdParameters(), findValleys)
 
             if not findPeaks:
                 peakIdx = None
@@ -214,10 +314,92 @@ class signal():
             tools.ETaddElement(parent=xmlElement, tag='findPeaks', text=str(findPeaks))
             tools.ETaddElement(parent=xmlElement, tag='findValleys', text=str(findValleys))
             tools.ETaddElement(parent=xmlElement, tag='method', text=method)
+            if decimationFactor > 1:
+                tools.ETaddElement(parent=xmlElement, tag='decimationFactor', text=str(decimationFactor))
             self.registerOperation(xmlElement)
 
         return [peakIdx, peakVal, valleyIdx, valleyVal]
 
+    # parameters of the 'md' method, computed from the whole signal: [minimum peak height, minimum peak prominence, minimum valley prominence,
+    # minimum distance between peaks]
+    def _mdParameters(self):
+        fmax_bpm = 250
+        sMax = np.percentile(self.data, 90.0)
+        smph = np.percentile(self.data, 60.0)
+        sMin = np.percentile(self.data, 10.0)
+        DeltaTMin = int(60.0 / float(fmax_bpm) * self.samplingRate_Hz)  # number of samples that represents a frequency of 250bpm
+        return [smph, (sMax - sMin) * 0.2, (sMax - sMin) * 0.5, DeltaTMin]
+
+    # 'md' method in data, with the parameters of _mdParameters. Returns [peakIdx, valleyIdx]. valleyIdx is None if findValleys is False
+    @staticmethod
+    def _findPeaksMD(data, parameters, findValleys):
+        [smph, prominence, valleyProminence, DeltaTMin] = parameters
+        peakIdx = tools.detect_peaks(data, mph=smph, mpd=DeltaTMin, threshold=0, edge='rising', kpsh=False, MinPeakProminence=prominence,
+                                     MinPeakProminenceSide='left', valley=False, fast=True)
+        valleyIdx = None
+        if findValleys:
+            valleyIdx = peakDetection.backtrackValleys(data, peakIdx, valleyProminence)
+        return [peakIdx, valleyIdx]
+
+    # detects the peaks (isPeak=True) or valleys again only around the samples [start,end), e.g. after these samples were edited. The
+    # parameters of the detection are those findPeaks uses in the whole signal: the AMPD windows of the whole signal and the md thresholds of
+    # the whole signal. margin: number of samples processed on each side, in methods md and decimationFactor > 1.
+    # Returns [marks, regionStart, regionEnd]: marks in the region [regionStart, regionEnd), that contains [start,end).
+    # * 'ampd' without decimation: the marks are the same of findPeaks in the region (see peakDetection.ampdRegion)
+    # * other methods: the marks are the same of findPeaks in the region, unless the marks depend on samples farther than margin
+    def findPeaksRegion(self, method, isPeak, start, end, margin, decimationFactor=1):
+        if method.lower() == 'ampd' and decimationFactor <= 1:
+            if isPeak:
+                DeltaTMin = int(60.0 / 250.0 * self.samplingRate_Hz)
+                return peakDetection.ampdRegion(self.data, 10, start, end, LSMlimit=0.2, minDistance=DeltaTMin)
+            return peakDetection.ampdRegion(-self.data, 10, start, end, LSMlimit=0.1)
+
+        windowStart = max(0, start - 2 * margin)
+        windowEnd = min(self.nPoints, end + 2 * margin)
+        # marks close to the borders of the window are not reliable, except at the borders of the signal
+        regionStart = 0 if windowStart == 0 else windowStart + margin
+        regionEnd = self.nPoints if windowEnd == self.nPoints else windowEnd - margin
+
+        if method.lower() == 'md' and decimationFactor <= 1:
+            [peakIdx, valleyIdx] = self._findPeaksMD(self.data[windowStart:windowEnd], self._mdParameters(), not isPeak)
+        else:
+            window = signal(self.channel, self.label, self.unit, self.data[windowStart:windowEnd], self.samplingRate_Hz, None)
+            [peakIdx, _, valleyIdx, _] = window.findPeaks(method, findPeaks=isPeak, findValleys=not isPeak, decimationFactor=decimationFactor)
+
+        marks = np.unique(np.asarray(peakIdx if isPeak else valleyIdx, dtype=int)) + windowStart
+        return [marks[(marks >= regionStart) & (marks < regionEnd)], regionStart, regionEnd]
+
+    # coarse to fine peak detection: the signal is decimated with an anti-aliasing filter, the peaks are detected at the low rate and each
+    # mark is moved to the local maximum (minimum) of the full rate signal in a window of +- decimationFactor samples
+    def _findPeaksDecimated(self, method, findPeaks, findValleys, nWorkers, decimationFactor):
+        windowLength = 2 * decimationFactor + 1
+        if self.nPoints < windowLength:
+            # too short to refine the marks: full rate detection
+            [peakIdx, _, valleyIdx, _] = self.findPeaks(method, findPeaks, findValleys, register=False, nWorkers=nWorkers)
+            return [peakIdx, valleyIdx]
+
+        decimated = scipySignal.decimate(self.data, decimationFactor, ftype='fir', zero_phase=True)
+        coarseSignal = signal(self.channel, self.label, self.unit, decimated, self.samplingRate_Hz / decimationFactor, None)
+        [peakIdx, _, valleyIdx, _] = coarseSignal.findPeaks(method, findPeaks, findValleys, register=False, nWorkers=nWorkers)
+
+        windows = np.lib.stride_tricks.sliding_window_view(self.data, windowLength)
+
+        def refine(coarseIdx, isPeak):
+            coarseIdx = np.asarray(coarseIdx, dtype=int)
+            start = np.clip(coarseIdx * decimationFactor - decimationFactor, 0, self.nPoints - windowLength)
+            if isPeak:
+                fineIdx = start + np.argmax(windows[start], axis=1)
+            else:
+                fineIdx = start + np.argmin(windows[start], axis=1)
+            fineIdx[coarseIdx < 0] = -1  # valleys not found (method md)
+            return fineIdx
+
+        if findPeaks:
+            peakIdx = refine(peakIdx, True)
+        if findValleys:
+            valleyIdx = refine(valleyIdx, False)
+        return [peakIdx, valleyIdx]
+
     # if segmentIndexes=None (default) considers all data, otherwise it is expected a list with start and end indexes
     def yLimits(self, method='percentile', detrend=False, segmentIndexes=None):
         min = 0
@@ -266,6 +448,7 @@ class signal():
             self.registerOperation(xmlElement)
 
     # remove elemetns betwen start/end, including these limits.
+    # returns the interval [start,end] that was removed or None if the interval is not valid
     def cropInterval(self, start, end, register=True, RemoveSegment=False, segmentIndexes=None):
         # register operation
         if register:
@@ -281,13 +464,21 @@ class signal():
                 end = segmentIndexes[np.searchsorted(segmentIndexes, end)]
                 start = segmentIndexes[np.searchsorted(segmentIndexes, start) - 1]
 
-        if (end + 1) > len(self.data) or start < 0 or (end + 1) < start:
+        if (end + 1) > self.nPoints or start < 0 or (end + 1) < start:
             print('Invalid interval')
-            return
+            return None
+
+        if not self.isLoaded():
+            self._pendingOps.append(['cropInterval', (start, end, False)])
+            self.nPoints -= end + 1 - start
+            return [start, end]
 
         self.data = np.delete(self.data, range(start, end + 1))
         self.nPoints = self.data.shape[0]
 
+        # interval actually removed. It is different of [start,end] if RemoveSegment=True
+        return [start, end]
+
     # remove the specified number of elements from right. Ex: if nelem=1, removes only one element from right
     def cropFromRight(self, nElem, register=True):
         if nElem > self.nPoints:
@@ -308,18 +499,39 @@ class signal():
             return
         self.cropInterval(0, nElem - 1, register)
 
+    # advance the signal by a fraction of sample: data[n] <- data(n + fraction), by cubic spline interpolation. The last sample is repeated
+    # at the end. This operation is not registered, it is part of patientData.synchronizeSignals
+    def shiftFraction(self, fraction):
+        if fraction == 0:
+            return
+        self.data = ndimage.shift(self.data, -fraction, order=3, mode='nearest')
+
+    # resample the signal on the time base of a reference, given the delay track with respect to the reference (see delayEstimation.delayTrack)
+    # center, delay: center of the windows of the track and their delays, in samples. The delay between the centers is interpolated linearly
+    # and kept constant before the first and after the last center. data[n] <- data(n - delay(n)), by cubic spline interpolation
+    # This operation is not registered, it is part of patientData.trackDelays
+    def warp(self, center, delay):
+        n = np.arange(self.nPoints)
+        position = n - np.interp(n, center, delay)
+        self.data = ndimage.map_coordinates(self.data, [position], order=3, mode='nearest')
+
     # valid methods:            'linear', 'nearest',
     # spline methods:           'zero', 'slinear', 'quadratic', 'cubic',
     # previoues or next values: 'previous', 'next'
-    def resample(self, newSampleRate, method='linear', register=True):
-        xData = np.arange(self.nPoints) / self.samplingRate_Hz
-        f = scipyInterpolate.interp1d(xData, self.data, kind=method, fill_value=(self.data[0], self.data[-1]), assume_sorted=True)
-
-        xNew = np.arange(xData[0], xData[-1], 1.0 / newSampleRate)
-        self.data = f(xNew)
+    # polyphase filtering:      'polyphase' (see resampleArray)
+    # newData: resampled data, if already computed (see patientData.resampleSignals). If None, it is computed from data
+    def resample(self, newSampleRate, method='linear', register=True, newData=None):
+        if not self.isLoaded() and newData is None:
+            # resampled when loaded, from the current sampling rate
+            self._pendingOps.append(['_resampleFrom', (self.samplingRate_Hz, newSampleRate, method)])
+            self.nPoints = resampledLength(self.nPoints, self.samplingRate_Hz, newSampleRate, method)
+        else:
+            if newData is None:
+                newData = resampleArray(self.data, self.samplingRate_Hz, newSampleRate, method)
+            self.data = newData
+            self.nPoints = self.data.shape[0]
 
         self.samplingRate_Hz = float(newSampleRate)
-        self.nPoints = self.data.shape[0]
 
         # register operation
         if register:
@@ -328,22 +540,29 @@ class signal():
             tools.ETaddElement(parent=xmlElement, tag='method', text=str(method))
             self.registerOperation(xmlElement)
 
-    # interpolate data in the interval [start,end], including the limits
+    # resample operation replayed by _loadData
+    def _resampleFrom(self, samplingRate_Hz, newSampleRate, method):
+        self.samplingRate_Hz = samplingRate_Hz
+        self.resample(newSampleRate, method, register=False)
+
+    # interpolate data in the interval [start,end], including the limits. Returns [start,end] or None if the data was not changed
     def interpolate(self, start, end, method='linear', register=True):
         if (end + 1) > len(self.data) or start < 0 or (end + 1) < start:
             print('Invalid interval')
-            return
+            return None
 
         nIntervals = end - start
 
         if nIntervals < 1:
-            return
+            return None
 
         if method == 'linear':
             deltaY = (self.data[end] - self.data[start]) / nIntervals
 
-            for i in range(nIntervals):
-                self.data[start + i] = self.data[start] + deltaY * i
+            # a new array is assigned, the previous one may be referenced by the undo history
+            data = self.data.copy()
+            data[start:end] = self.data[start] + deltaY * np.arange(nIntervals)
+            self.data = data
 
         # register operation
         if register:
@@ -353,6 +572,8 @@ class signal():
             tools.ETaddElement(parent=xmlElement, tag='method', text=str(method))
             self.registerOperation(xmlElement)
 
+        return [start, end]
+
     # nTaps: must be odd number. Used for movingAverage and median
     # order: used for butterworth only
     # nTaps not used in butterworth
@@ -389,8 +610,35 @@ class signal():
     # valid methods:            'linear', 'nearest',
     # spline methods:           'zero', 'slinear', 'quadratic', 'cubic',
     # previoues or next values: 'previous', 'next'
-    def beat2beat(self, beat_idx, resampleRate_Hz=100.0, resampleMethod='linear'):
-        self.beat2beatData = signals_b2b.beat2beat(self.data, beat_idx, self.samplingRate_Hz, resampleRate_Hz, resampleMethod)
+    # stats: [max, min, avg] of each beat, if already computed (see signals_b2b.beatStatistics)
+    # features: features of each beat, if already computed (see signals_b2b.beatFeatures)
+    def beat2beat(self, beat_idx, resampleRate_Hz=100.0, resampleMethod='linear', stats=None, features=None):
+        if not self.isLoaded():
+            self.removeBeat2beat()
+            self._pendingOps.append(['beat2beat', (beat_idx, resampleRate_Hz, resampleMethod)])
+            return
+
+        self.beat2beatData = signals_b2b.beat2beat(self.data, beat_idx, self.samplingRate_Hz, resampleRate_Hz, resampleMethod, stats, features)
+
+    # update the beat to beat data after the beats changed. Returns False if it cannot be updated locally (see signals_b2b.beat2beat.updateBeats)
+    def updateBeat2beat(self, beat_idx):
+        if not self.isLoaded():
+            # computed from the new beats when loaded
+            self._pendingOps = [['beat2beat', (beat_idx,) + op[1][1:]] if op[0] == 'beat2beat' else op for op in self._pendingOps]
+            return True
+
+        return self.beat2beatData.updateBeats(self.data, beat_idx)
+
+    def LPfilterBeat2beat(self, method='movingAverage', nTaps=5):
+        if not self.isLoaded():
+            self._pendingOps.append(['LPfilterBeat2beat', (method, nTaps)])
+            return
+
+        self.beat2beatData.LPfilter(method, nTaps)
+
+    def removeBeat2beat(self):
+        self._pendingOps = [op for op in self._pendingOps if op[0] not in ['beat2beat', 'LPfilterBeat2beat']]
+        self._beat2beatData = None
 
 
 if __name__ == '__main__':
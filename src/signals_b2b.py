@@ -5,6 +5,179 @@ import numpy as np
 from scipy import interpolate as scipyInterpolate
 from scipy import signal as scipySignal
 
+# features of each beat, in the order of the rows of beat2beat.features (see beatFeatures)
+BEAT_FEATURES = ['RR_s', 'PP', 'PI', 'RI', 'timeToPeak_s', 'area']
+
+# resampling methods where each new point depends only on the beats before and after it. beat2beat objects resampled with these methods can
+# be updated locally when the beats change (see beat2beat.updateBeats)
+LOCAL_METHODS = ['linear', 'nearest', 'previous', 'next']
+
+
+def beatStatistics(data, beat_idx):
+    """
+    Maximum, minimum and average of the signal in each beat.
+
+    The beats are data[..., beat_idx[i]:beat_idx[i + 1]]. The statistics of all beats are computed at once with ufunc.reduceat, along the last
+    axis, so all channels of a recording can be processed in a single call.
+
+    Parameters
+    ----------
+    data: numpy array
+        signal (1D) or signals (2D, one channel per row)
+    beat_idx: 1D array
+        sorted indexes of the start of the beats. The last index is the end of the last beat.
+
+    Returns
+    -------
+    [max, min, avg]: list of numpy arrays
+        statistics of each beat, with shape (..., len(beat_idx) - 1)
+    """
+    beat_idx = np.asarray(beat_idx, dtype=int)
+    segment = np.asarray(data, dtype=float)[..., beat_idx[0]:beat_idx[-1]]
+    starts = beat_idx[:-1] - beat_idx[0]
+
+    maxVal = np.maximum.reduceat(segment, starts, axis=-1)
+    minVal = np.minimum.reduceat(segment, starts, axis=-1)
+    avgVal = np.add.reduceat(segment, starts, axis=-1) / np.diff(beat_idx)
+    return [maxVal, minVal, avgVal]
+
+
+def beatFeatures(data, beat_idx, samplingRate_Hz, stats=None):
+    """
+    Features of each beat, computed for all beats at once along the last axis.
+
+    * RR_s: duration of the beat, in seconds
+    * PP: pulse amplitude, max - min (pulse pressure for ABP)
+    * PI: pulsatility index, (max - min) / avg
+    * RI: resistance index, (max - min) / max
+    * timeToPeak_s: time from the start of the beat to its maximum, in seconds. In a plateau, the first sample is used
+    * area: area under the beat (rectangle rule), in units*s
+
+    Parameters
+    ----------
+    data: numpy array
+        signal (1D) or signals (2D, one channel per row)
+    beat_idx: 1D array
+        sorted indexes of the start of the beats. The last index is the end of the last beat.
+    samplingRate_Hz: float
+        sampling rate of data
+    stats: list of numpy arrays, optional
+        [max, min, avg] of each beat, if already computed. See :func:`beatStatistics`
+
+    Returns
+    -------
+    features: numpy array
+        features of each beat, with shape (..., len(BEAT_FEATURES), len(beat_idx) - 1). The rows are in the order of BEAT_FEATURES.
+    """
+    beat_idx = np.asarray(beat_idx, dtype=int)
+    if stats is None:
+        stats = beatStatistics(data, beat_idx)
+    [maxVal, minVal, avgVal] = stats
+
+    segment = np.asarray(data, dtype=float)[..., beat_idx[0]:beat_idx[-1]]
+    starts = beat_idx[:-1] - beat_idx[0]
+    lengths = np.diff(beat_idx)
+
+    # first sample of each beat equal to its maximum
+    position = np.arange(segment.shape[-1])
+    isPeak = segment == np.repeat(maxVal, lengths, axis=-1)
+    peakPosition = np.minimum.reduceat(np.where(isPeak, position, segment.shape[-1]), starts, axis=-1)
+
+    amplitude = maxVal - minVal
+    RR_s = np.broadcast_to(lengths / samplingRate_Hz, amplitude.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        PI = amplitude / avgVal
+        RI = amplitude / maxVal
+
+    return np.stack([RR_s, amplitude, PI, RI, (peakPosition - starts) / samplingRate_Hz, avgVal * RR_s], axis=-2)
+
+
+def resampleSeries(xData, series, xNew, method='linear'):
+    """
+    Resample several series sampled at the same points.
+
+    For method 'linear', the position of the new points between the knots is computed once and used for all series. The result is the same
+    of scipy.interpolate.interp1d, up to rounding errors. Other methods use a single interp1d of the 2D array.
+
+    Parameters
+    ----------
+    xData: 1D numpy array
+        sorted sample points of the series
+    series: 2D numpy array
+        one series per row, with len(xData) columns
+    xNew: 1D numpy array
+        new sample points, within [xData[0], xData[-1]]
+    method: string
+        kind of interpolation, see scipy.interpolate.interp1d
+
+    Returns
+    -------
+    newSeries: 2D numpy array
+        one series per row, with len(xNew) columns
+    """
+    if method != 'linear':
+        f = scipyInterpolate.interp1d(xData, series, kind=method, axis=-1, fill_value=(series[:, 0], series[:, -1]), assume_sorted=True)
+        return f(xNew)
+
+    # knots before and after each new point
+    hi = np.clip(np.searchsorted(xData, xNew), 1, len(xData) - 1)
+    lo = hi - 1
+    distance = xNew - xData[lo]
+    width = xData[hi] - xData[lo]
+
+    slope = (series[:, hi] - series[:, lo]) / width
+    return slope * distance + series[:, lo]
+
+
+def resampleBeat2beat(b2bList, resampleRate_Hz, method='linear'):
+    """
+    Resample the max, min and avg series of several :class:`beat2beat` objects.
+
+    The series of the objects with the same sample points (e.g. the channels of a recording) are stacked and resampled together with
+    :func:`resampleSeries`. Objects whose max, min and avg are the same array (every sample is a beat, see :class:`beat2beat`) contribute a
+    single series, and the three attributes keep sharing the resampled array.
+
+    Parameters
+    ----------
+    b2bList: list of :class:`beat2beat`
+        objects to resample
+    resampleRate_Hz: float
+        sampling rate after resampling
+    method: string
+        kind of interpolation, see scipy.interpolate.interp1d
+    """
+    # objects with the same sample points
+    groups = []
+    for b2b in b2bList:
+        for group in groups:
+            if np.array_equal(group[0].xData, b2b.xData):
+                group.append(b2b)
+                break
+        else:
+            groups.append([b2b])
+
+    for group in groups:
+        xData = group[0].xData
+        xNew = np.arange(xData[0], xData[-1], 1.0 / resampleRate_Hz)
+
+        # first row of the series of each object
+        rows = np.cumsum([0] + [1 if b2b.isSingleSeries() else 3 for b2b in group])
+        newSeries = resampleSeries(xData, np.vstack([b2b.max if b2b.isSingleSeries() else np.vstack([b2b.max, b2b.min, b2b.avg])
+                                                     for b2b in group]), xNew, method)
+
+        for i, b2b in enumerate(group):
+            if b2b.isSingleSeries():
+                b2b.max = b2b.min = b2b.avg = newSeries[rows[i]]
+            else:
+                [b2b.max, b2b.min, b2b.avg] = newSeries[rows[i]:rows[i + 1]]
+            b2b.xData = xNew
+            b2b.nPoints = xNew.shape[0]
+            b2b.samplingRate_Hz = float(resampleRate_Hz)
+
+            # only the first resampling is computed from the beats
+            b2b.isEditable = b2b.resampleMethod is None and b2b.beatValues is not None and method in LOCAL_METHODS
+            b2b.resampleMethod = method
+
 
 class beat2beat():
 
@@ -14,43 +187,120 @@ class beat2beat():
     # valid methods:            'linear', 'nearest',
     # spline methods:           'zero', 'slinear', 'quadratic', 'cubic',
     # previoues or next values: 'previous', 'next'
-    def __init__(self, data, beat_idx, data_samplingRate_Hz, resampleRate_Hz=5.0, resampleMethod='linear'):
-        self.max = []
-        self.min = []
-        self.avg = []
+    # stats: [max, min, avg] of each beat, if already computed (see beatStatistics). If None, they are computed from data
+    # features: features of each beat, if already computed (see beatFeatures). If None, they are computed from data
+    # if resampleRate_Hz is None, the series are not resampled (see resampleBeat2beat)
+    def __init__(self, data, beat_idx, data_samplingRate_Hz, resampleRate_Hz=5.0, resampleMethod='linear', stats=None, features=None):
         self.xData = beat_idx[0:-1] / data_samplingRate_Hz
         self.nPoints = self.xData.shape[0]
 
-        for i in range(len(beat_idx) - 1):
-            self.max.append(max(data[beat_idx[i]:beat_idx[i + 1]]))
-            self.min.append(min(data[beat_idx[i]:beat_idx[i + 1]]))
-            self.avg.append(np.mean(data[beat_idx[i]:beat_idx[i + 1]]))
-        self.max = np.array(self.max)
-        self.min = np.array(self.min)
-        self.avg = np.array(self.avg)
+        # beat features are not resampled: one column per beat, starting at beatTime_s
+        self.beatTime_s = self.xData
+        self.features = None
+
+        # beats, kept to update the series when the beats change (see updateBeats)
+        self.beatIdx = np.asarray(beat_idx, dtype=int)
+        self.dataSamplingRate_Hz = data_samplingRate_Hz
+        self.beatValues = None  # [max, min, avg] of each beat, one row each
+        self.resampleMethod = None
+        self.isEditable = False
+
+        if np.all(np.diff(beat_idx) == 1):
+            # every sample is a beat (e.g. PAR files): max, min and avg are the samples themselves, a single array. No beat features
+            self.max = np.array(data[beat_idx[0]:beat_idx[-1]], dtype=float)
+            self.min = self.avg = self.max
+        else:
+            if stats is None:
+                stats = beatStatistics(data, beat_idx)
+            [self.max, self.min, self.avg] = stats
+            self.features = features if features is not None else beatFeatures(data, beat_idx, data_samplingRate_Hz, stats)
+            self.beatValues = np.vstack(stats)
+
+        if resampleRate_Hz is not None:
+            self.resample(resampleRate_Hz, resampleMethod)
+
+    # True if max, min and avg are the same array (every sample is a beat). Operations assign new arrays: they must keep sharing a single array
+    # or assign three different ones
+    def isSingleSeries(self):
+        return self.min is self.max and self.avg is self.max
+
+    # returns the feature of each beat. name: one of BEAT_FEATURES
+    def getFeature(self, name):
+        if self.features is None:
+            return None
+        return self.features[BEAT_FEATURES.index(name)]
 
-        self.resample(resampleRate_Hz, resampleMethod)
+    def updateBeats(self, data, beat_idx):
+        """
+        Update the series after the beats changed (e.g. RR marks inserted or removed).
+
+        Only the beats between the first and the last changed index are computed again, and only the resampled points between the beats
+        around them are updated. New arrays are assigned, the arrays are not modified in place.
+
+        Parameters
+        ----------
+        data: 1D numpy array
+            signal
+        beat_idx: 1D array
+            new sorted indexes of the beats
+
+        Returns
+        -------
+        updated: bool
+            True if the series were updated. False if they cannot be updated locally and must be computed again: the series were filtered,
+            resampled with a method not in LOCAL_METHODS, or the first, the second to last or the last index changed.
+        """
+        if not self.isEditable:
+            return False
+
+        beat_idx = np.asarray(beat_idx, dtype=int)
+        old = self.beatIdx
+
+        # common prefix and suffix of the old and new indexes
+        nCommon = min(len(old), len(beat_idx))
+        mismatch = np.flatnonzero(old[:nCommon] != beat_idx[:nCommon])
+        if len(mismatch) == 0 and len(old) == len(beat_idx):
+            return True
+        prefix = nCommon if len(mismatch) == 0 else mismatch[0]
+        nCommon -= prefix
+        mismatch = np.flatnonzero(old[len(old) - nCommon:][::-1] != beat_idx[len(beat_idx) - nCommon:][::-1])
+        suffix = nCommon if len(mismatch) == 0 else mismatch[0]
+
+        # the limits of the resampled series must not change
+        if prefix < 1 or suffix < 2:
+            return False
+
+        # beats [first, last) of the new indexes are computed again. They replace beats [first, len(old) - suffix) of the old indexes
+        first = prefix - 1
+        last = len(beat_idx) - suffix
+        stats = beatStatistics(data, beat_idx[first:last + 1])
+        features = beatFeatures(data, beat_idx[first:last + 1], self.dataSamplingRate_Hz, stats)
+
+        oldLast = len(old) - suffix
+        self.beatValues = np.concatenate((self.beatValues[:, :first], np.vstack(stats), self.beatValues[:, oldLast:]), axis=1)
+        self.features = np.concatenate((self.features[:, :first], features, self.features[:, oldLast:]), axis=1)
+        self.beatIdx = beat_idx
+        self.beatTime_s = beat_idx[0:-1] / self.dataSamplingRate_Hz
+
+        # resampled points between the unchanged beats around the changed ones
+        start = max(first - 1, 0)
+        mask = (self.xData >= self.beatTime_s[start]) & (self.xData <= self.beatTime_s[last])
+        newSeries = resampleSeries(self.beatTime_s[start:last + 1], self.beatValues[:, start:last + 1], self.xData[mask], self.resampleMethod)
+
+        [self.max, self.min, self.avg] = [series.copy() for series in [self.max, self.min, self.avg]]
+        self.max[mask] = newSeries[0]
+        self.min[mask] = newSeries[1]
+        self.avg[mask] = newSeries[2]
+        return True
 
     def LPfilter(self, method='movingAverage', nTaps=5):
-        if method == 'movingAverage':
+        self.isEditable = False
+        if method == 'movingAverage' and self.isSingleSeries():
+            self.max = self.min = self.avg = scipySignal.filtfilt([1.0 / nTaps, ] * nTaps, [1.0], self.max)
+        elif method == 'movingAverage':
             self.max = scipySignal.filtfilt([1.0 / nTaps, ] * nTaps, [1.0], self.max)
             self.min = scipySignal.filtfilt([1.0 / nTaps, ] * nTaps, [1.0], self.min)
             self.avg = scipySignal.filtfilt([1.0 / nTaps, ] * nTaps, [1.0], self.avg)
 
     def resample(self, resampleRate_Hz, method='linear'):
-        xNew = np.arange(self.xData[0], self.xData[-1], 1.0 / resampleRate_Hz)
-
-        # max
-        f = scipyInterpolate.interp1d(self.xData, self.max, kind=method, fill_value=(self.max[0], self.max[-1]), assume_sorted=True)
-        self.max = f(xNew)
-        # min
-        f = scipyInterpolate.interp1d(self.xData, self.min, kind=method, fill_value=(self.min[0], self.min[-1]), assume_sorted=True)
-        self.min = f(xNew)
-        # avg
-        f = scipyInterpolate.interp1d(self.xData, self.avg, kind=method, fill_value=(self.avg[0], self.avg[-1]), assume_sorted=True)
-        self.avg = f(xNew)
-
-        self.xData = xNew
-        self.nPoints = self.xData.shape[0]
-
-        self.samplingRate_Hz = float(resampleRate_Hz)
+        resampleBeat2beat([self], resampleRate_Hz, method)
@@ -0,0 +1,203 @@
+#!/bin/python
+
+# -*- coding: utf-8 -*-
+"""
+Content-addressed cache of intermediate preprocessing states.
+
+Each state is identified by a chain hash: the hash of the raw data file followed by the operations applied to it, one at a time. Two jobs that
+share the raw data file and the first operations share the keys of these operations, so a job can resume from the longest cached prefix.
+See :meth:`patientData.patientData.runOperationsPlan`.
+"""
+import collections
+import copy
+import hashlib
+import os
+import pickle
+
+import numpy as np
+
+# attributes of patientData that define the preprocessing state
+STATE_ATTRIBUTES = ['signals', 'peakIdx', 'valleyIdx', 'hasRRmarks', 'RRmarksSettings', 'hasB2Bdata', 'delayTracks']
+
+
+def _findArrays(value, arrays, visited):
+    # numpy arrays referenced by value, in dictionaries, lists, tuples and attributes of objects: {id: array}
+    if isinstance(value, np.ndarray):
+        arrays[id(value)] = value
+        return
+    if id(value) in visited:
+        return
+    visited.add(id(value))
+    if isinstance(value, dict):
+        for item in value.values():
+            _findArrays(item, arrays, visited)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _findArrays(item, arrays, visited)
+    elif hasattr(value, '__dict__'):
+        _findArrays(vars(value), arrays, visited)
+
+
+def shareArrays(state):
+    """
+    Copy of the state that shares its numpy arrays with the original.
+
+    The arrays are made read-only, so that an operation that modified an array in place would raise an error instead of changing the cached
+    states. The flag is set on the arrays of `state` itself: the arrays of the caller (e.g. the signals of the patient whose state is stored)
+    become read-only too. The operations always assign new arrays (see :mod:`undoHistory`). Everything else (signals, beat to beat data, lists)
+    is copied. See the notes of :meth:`patientData.patientData.runOperationsPlan`.
+
+    Returns
+    -------
+    [state, nBytes]
+        copy of the state and size of its arrays, in bytes
+    """
+    arrays = {}
+    _findArrays(state, arrays, set())
+    for array in arrays.values():
+        array.flags.writeable = False
+    return [copy.deepcopy(state, dict(arrays)), sum([array.nbytes for array in arrays.values()])]
+
+
+class stateCache():
+    """
+    Cache of preprocessing states, kept in memory and optionally on disk.
+
+    Parameters
+    ----------
+    cacheDir : str or None, optional
+        Directory of the on-disk cache. Each state is saved in a pickle file **<key>.state**. If None (default), states are kept only in memory.
+
+    maxMemoryStates : int, optional
+        Maximum number of states kept in memory. The least recently used states are removed first. Default: 8
+
+    maxMemoryBytes : int, optional
+        Memory budget of the states kept in memory, in bytes. The least recently used states are removed first when the budget is exceeded. The
+        most recent state is always kept. Arrays shared by several states are counted in each of them. Default: 256MB
+
+    checkpointTags : list of str, optional
+        Operations after which the state is stored. If None, :attr:`DEFAULT_CHECKPOINT_TAGS` is used. The state after the last operation that
+        can be resumed is always stored.
+
+    **Example**
+
+    >>> import stateCache
+    >>> from patientData import patientData as pD
+    >>> cache = stateCache.stateCache(cacheDir='/tmp/CAAosCache')
+    >>> myCase=pD('data.job', activeModule='ARanalysis', stateCache=cache)   # first run: states are stored
+    >>> myCase=pD('data.job', activeModule='ARanalysis', stateCache=cache)   # resumes from the longest cached prefix
+    """
+
+    DEFAULT_CHECKPOINT_TAGS = ['resample', 'synchronize', 'findRRmarks', 'B2Bcalc', 'B2B_LPfilter']
+
+    def __init__(self, cacheDir=None, maxMemoryStates=8, checkpointTags=None, maxMemoryBytes=268435456):
+        self.cacheDir = cacheDir
+        self.maxMemoryStates = maxMemoryStates
+        self.maxMemoryBytes = maxMemoryBytes
+        if checkpointTags is None:
+            self.checkpointTags = list(self.DEFAULT_CHECKPOINT_TAGS)
+        else:
+            self.checkpointTags = list(checkpointTags)
+        self.memory = collections.OrderedDict()  # key -> [state, nBytes]
+
+        if self.cacheDir is not None:
+            os.makedirs(self.cacheDir, exist_ok=True)
+
+    @staticmethod
+    def rootKey(fileHash, version):
+        """
+        Key of the raw data, before any operation. `version` is the version of :mod:`patientData`, so that states of other versions are not used.
+        """
+        return hashlib.sha1(('%s|%s' % (version, fileHash)).encode()).hexdigest()
+
+    @staticmethod
+    def chainKeys(key, plan):
+        """
+        Chain keys of an execution plan.
+
+        Parameters
+        ----------
+        key : str
+            key of the state before the first operation
+        plan : list of :class:`operationsCompiler.operation`
+
+        Returns
+        -------
+        keys : list of str
+            keys[i] identifies the state after the operation plan[i].
+        """
+        keys = []
+        for op in plan:
+            serialized = '%s|%s|%s|%s' % (key, op.section, op.tag, repr(sorted(op.params.items())))
+            key = hashlib.sha1(serialized.encode()).hexdigest()
+            keys.append(key)
+        return keys
+
+    def _fileName(self, key):
+        return os.path.join(self.cacheDir, key + '.state')
+
+    def has(self, key):
+        if key in self.memory:
+            return True
+        return self.cacheDir is not None and os.path.isfile(self._fileName(key))
+
+    def load(self, key):
+        """
+        Return a copy of the state with the given key or None if the key is not in the cache. The arrays are shared with the cache and are
+        read-only, see :func:`shareArrays`.
+        """
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return shareArrays(self.memory[key][0])[0]
+
+        if self.cacheDir is None:
+            return None
+
+        try:
+            with open(self._fileName(key), 'rb') as fileIn:
+                state = pickle.load(fileIn)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+
+        [state, nBytes] = shareArrays(state)
+        self._storeMemory(key, state, nBytes)
+        return shareArrays(state)[0]
+
+    def store(self, key, state):
+        """
+        Store a copy of the state. The state is a dictionary {attribute: value}, see :data:`STATE_ATTRIBUTES`. Its arrays are not copied: they
+        are shared with the cache and become read-only, see :func:`shareArrays`.
+        """
+        [state, nBytes] = shareArrays(state)
+        self._storeMemory(key, state, nBytes)
+
+        if self.cacheDir is None:
+            return
+
+        # write to a temporary file first, so that interrupted writes never leave a partial state
+        fileName = self._fileName(key)
+        try:
+            with open(fileName + '.tmp', 'wb') as fileOut:
+                pickle.dump(state, fileOut, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(fileName + '.tmp', fileName)
+        except OSError:
+            print('Warning: could not write state cache file %s' % fileName)
+
+    def _storeMemory(self, key, state, nBytes):
+        self.memory[key] = [state, nBytes]
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxMemoryStates:
+            self.memory.popitem(last=False)
+        while len(self.memory) > 1 and sum([item[1] for item in self.memory.values()]) > self.maxMemoryBytes:
+            self.memory.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove all states from memory and disk.
+        """
+        self.memory.clear()
+        if self.cacheDir is None:
+            return
+        for fileName in os.listdir(self.cacheDir):
+            if fileName.endswith('.state'):
+                os.remove(os.path.join(self.cacheDir, fileName))
@@ -0,0 +1,142 @@
+#!/bin/python
+
+# -*- coding: utf-8 -*-
+"""
+Online beat detection, for signals received in blocks (e.g. bedside monitoring).
+
+The detectors of :mod:`signals` need the complete signal. :class:`streamingBeatDetector` processes the samples as they arrive, keeps only a
+few seconds of signal and reports each beat a fixed number of samples after its peak.
+"""
+import numpy as np
+from scipy import ndimage
+
+
+class streamingBeatDetector():
+    """
+    Online peak/valley detector of pulsatile signals (ABP, CBFV).
+
+    A sample is a peak if:
+
+    * it is the maximum of the samples within +- `minDistance` samples, where `minDistance` is the shortest beat (`maxHeartRate_bpm`). In a
+      plateau, the first sample is used.
+    * it is above the 60th percentile of the recent history.
+    * it rises at least `prominenceFactor` * (90th percentile - 10th percentile) of the recent history above the lowest sample since the
+      previous peak.
+
+    The valley of each peak is the lowest sample between the previous peak and the peak. The criteria are the ones of
+    :meth:`signals.signal.findPeaks` with method='md', with the percentiles computed on the recent history instead of the whole signal.
+
+    A peak can only be confirmed when the `minDistance` samples after it are available, so peaks are reported with a latency of
+    :attr:`latency` samples (plus the length of the block).
+
+    Parameters
+    ----------
+    samplingRate_Hz : float
+        sampling rate of the signal
+
+    history_s : float, optional
+        length of the history used to compute the percentiles, in seconds. It is also the longest beat that can be detected. Default: 10.0
+
+    maxHeartRate_bpm : float, optional
+        highest expected heart rate. Default: 250.0
+
+    prominenceFactor : float, optional
+        minimum rise of the peaks, as a fraction of the range of the signal. Default: 0.2
+
+    **Example**
+
+    >>> import streamingDetector
+    >>> detector = streamingDetector.streamingBeatDetector(samplingRate_Hz=100.0)
+    >>> for block in acquisition():     # any iterable of 1D arrays
+    >>>     [peakIdx, valleyIdx] = detector.update(block)
+    >>>     print(peakIdx)  # indexes since the start of the stream
+    >>> [peakIdx, valleyIdx] = detector.flush()  # end of the stream
+    """
+
+    def __init__(self, samplingRate_Hz, history_s=10.0, maxHeartRate_bpm=250.0, prominenceFactor=0.2):
+        self.samplingRate_Hz = float(samplingRate_Hz)
+        self.minDistance = int(60.0 / float(maxHeartRate_bpm) * self.samplingRate_Hz)
+        self.historyLength = int(history_s * self.samplingRate_Hz)
+        self.prominenceFactor = prominenceFactor
+        self.latency = self.minDistance
+        self.reset()
+
+    def reset(self):
+        """
+        Discard all samples and start a new stream.
+        """
+        self.buffer = np.array([], dtype=float)
+        self.bufferStart = 0  # index of buffer[0] since the start of the stream
+        self.nSamples = 0  # number of samples received
+        self.nDecided = 0  # samples before this index were already tested
+        self.lastPeak = None  # index of the last peak
+
+    def update(self, block):
+        """
+        Process a new block of samples.
+
+        Parameters
+        ----------
+        block : 1D array
+            new samples
+
+        Returns
+        -------
+        [peakIdx, valleyIdx] : list of 1D numpy arrays
+            peaks confirmed by this block and their valleys. The indexes are counted since the start of the stream.
+        """
+        block = np.asarray(block, dtype=float)
+        self.buffer = np.concatenate((self.buffer, block))
+        self.nSamples += block.shape[0]
+        return self._detect(self.nSamples - self.minDistance)
+
+    def flush(self):
+        """
+        End of the stream: test the last samples, using only the samples available after them.
+        """
+        return self._detect(self.nSamples)
+
+    def _detect(self, decideUntil):
+        x = self.buffer
+        offset = self.bufferStart
+        peakIdx = []
+        valleyIdx = []
+
+        start = max(self.nDecided, offset + 1)
+        if decideUntil > start:
+            history = x[max(0, x.shape[0] - self.historyLength):]
+            [p10, p60, p90] = np.percentile(history, [10.0, 60.0, 90.0])
+            minProminence = self.prominenceFactor * (p90 - p10)
+
+            # maximum of the minDistance samples before and after each sample. Samples out of the buffer are -inf
+            size = self.minDistance
+            padded = np.concatenate(([-np.inf] * size, x, [-np.inf] * (size + 1)))
+            forwardMax = ndimage.maximum_filter1d(padded, size, origin=-(size // 2))  # forwardMax[j] = max(padded[j:j + size])
+            leftMax = forwardMax[:x.shape[0]]
+            rightMax = forwardMax[size + 1:size + 1 + x.shape[0]]
+
+            candidates = np.arange(start, decideUntil) - offset
+            candidates = candidates[(x[candidates] > leftMax[candidates]) & (x[candidates] >= rightMax[candidates]) & (x[candidates] >= p60)]
+
+            for i in candidates + offset:
+                previous = offset if self.lastPeak is None else max(self.lastPeak + 1, offset)
+                if i - previous < 1:
+                    continue
+                valley = previous + np.argmin(x[previous - offset:i - offset])
+                if x[i - offset] - x[valley - offset] < minProminence:
+                    continue
+                peakIdx.append(i)
+                valleyIdx.append(valley)
+                self.lastPeak = i
+
+            self.nDecided = decideUntil
+
+        # bounded state: keep the history and the samples not tested yet (and the minDistance samples before them)
+        keepFrom = min(self.nSamples - self.historyLength, self.nDecided - self.minDistance)
+        if self.lastPeak is not None:
+            keepFrom = min(keepFrom, max(self.lastPeak, self.nSamples - 2 * self.historyLength))
+        if keepFrom > self.bufferStart:
+            self.buffer = self.buffer[keepFrom - self.bufferStart:]
+            self.bufferStart = keepFrom
+
+        return [np.array(peakIdx, dtype=int), np.array(valleyIdx, dtype=int)]
@@ -9,7 +9,7 @@ from signalPlotWidget import plotArray
 
 # dict format:  '#code' : (paramValue,'string name')
 filterMethodDict = {0: ('movingAverage', 'Moving average'), 1: ('median', 'Median'), 2: ('butterworth', 'Butterworth')}
-syncMethodDict = {0: ('correlation', 'Correlation'), 1: ('fixedAPB', 'Fixed ABP delay')}
+syncMethodDict = {0: ('correlation', 'Correlation'), 1: ('fixedAPB', 'Fixed ABP delay'), 2: ('lagCorrelation', 'Correlation (max. lag)')}
 
 
 class signalSyncFilterWidget(QtWidgets.QWidget):
@@ -60,6 +60,20 @@ class signalSyncFilterWidget(QtWidgets.QWidget):
 
         formLayout.addRow('ABP delay (s)', self.ABPdelayWidget)
 
+        # max lag option
+        default = 0.5
+        self.maxLagWidget = QtWidgets.QDoubleSpinBox()
+        self.maxLagWidget.setRange(0.1, 3)
+        self.maxLagWidget.setFixedWidth(100)
+        self.maxLagWidget.setDecimals(1)
+        self.maxLagWidget.setSingleStep(0.1)
+        self.maxLagWidget.setValue(default)
+        self.maxLag = default
+        self.maxLagWidget.setEnabled(False)
+        self.maxLagWidget.valueChanged.connect(lambda: self.registerOptions('maxLag'))
+
+        formLayout.addRow('Max. lag (s)', self.maxLagWidget)
+
         # filter method
         default = 0  # moving average
         self.filterMethod = filterMethodDict[default][0]
@@ -125,11 +139,14 @@ class signalSyncFilterWidget(QtWidgets.QWidget):
                 self.ABPdelayWidget.setEnabled(True)
             else:
                 self.ABPdelayWidget.setEnabled(False)
+            self.maxLagWidget.setEnabled(self.syncMethod == 'lagCorrelation')
 
         if typeOpt == 'filterMethod':
             self.filterMethod = filterMethodDict[self.sender().currentIndex()][0]
         if typeOpt == 'ABPdelay':
             self.ABPdelay = self.sender().value()
+        if typeOpt == 'maxLag':
+            self.maxLag = self.sender().value()
 
     # synchronize signals
     def applySync(self):
@@ -143,7 +160,7 @@ class signalSyncFilterWidget(QtWidgets.QWidget):
             if channel.sync:
                 listSyncSignals.append(ch)
 
-        self.data.synchronizeSignals(listSyncSignals, method=self.syncMethod, ABPdelay_s=self.ABPdelay)
+        self.data.synchronizeSignals(listSyncSignals, method=self.syncMethod, ABPdelay_s=self.ABPdelay, maxLag_s=self.maxLag)
 
         self.applySyncButton.clearFocus()
         self.plotArea.replotAllsignals()
@@ -1,5 +1,6 @@
 from __future__ import division, print_function
 
+import bisect
 import ntpath
 import os
 import posixpath
@@ -83,7 +84,7 @@ def upperFileExtension(file):
 
 
 def detect_peaks(x, mph=None, mpd=1, threshold=0, edge='rising', kpsh=False, MinPeakProminence=0, MinPeakProminenceSide='both', valley=False,
-                 show=False, ax=None):
+                 show=False, ax=None, fast=False):
     """Detect peaks in data based on their amplitude and other features.
 
     Parameters
@@ -106,6 +107,11 @@ def detect_peaks(x, mph=None, mpd=1, threshold=0, edge='rising', kpsh=False, Min
         keep peaks with same height even if they are closer than `mpd`.
     valley : bool, optional (default = False)
         if True (1), detect valleys (local minima) instead of peaks.
+    fast : bool, optional (default = False)
+        if True, the peaks closer than `mpd` are removed with a sweep of the
+        peaks sorted by height and the prominences are computed for all peaks
+        at once from the runs of rising/falling samples. The result is the
+        same.
 
     Returns
     -------
@@ -187,7 +193,7 @@ def detect_peaks(x, mph=None, mpd=1, threshold=0, edge='rising', kpsh=False, Min
     # handle NaN's
     if ind.size and indnan.size:
         # NaN's and values close to NaN's cannot be peaks
-        ind = ind[np.in1d(ind, np.unique(np.hstack((indnan, indnan - 1, indnan + 1))), invert=True)]
+        ind = ind[np.isin(ind, np.unique(np.hstack((indnan, indnan - 1, indnan + 1))), invert=True)]
 
     # first and last values of x cannot be peaks
     if ind.size and ind[0] == 0:
@@ -205,7 +211,9 @@ def detect_peaks(x, mph=None, mpd=1, threshold=0, edge='rising', kpsh=False, Min
         ind = np.delete(ind, np.where(dx1 < threshold)[0])
 
     # detect small peaks closer than minimum peak distance
-    if ind.size and mpd > 1:
+    if ind.size and mpd > 1 and fast:
+        ind = _removeCloserPeaks(x, ind, mpd, kpsh)
+    elif ind.size and mpd > 1:
         ind = ind[np.argsort(x[ind])][::-1]  # sort ind by peak height
         idel = np.zeros(ind.size, dtype=bool)
         for i in range(ind.size):
@@ -217,7 +225,9 @@ def detect_peaks(x, mph=None, mpd=1, threshold=0, edge='rising', kpsh=False, Min
         ind = np.sort(ind[~idel])
 
     # remove peaks with small Prominence
-    if ind.size and MinPeakProminence > 0:
+    if ind.size and MinPeakProminence > 0 and fast:
+        ind = ind[~_smallProminence(dx, ind, MinPeakProminence, MinPeakProminenceSide)]
+    elif ind.size and MinPeakProminence > 0:
         idel = np.zeros(ind.size, dtype=bool)
         for i in range(ind.size):
             if MinPeakProminenceSide.lower() in ['left', 'both']:
@@ -254,6 +264,78 @@ def detect_peaks(x, mph=None, mpd=1, threshold=0, edge='rising', kpsh=False, Min
     return ind
 
 
+def _removeCloserPeaks(x, ind, mpd, kpsh):
+    """Remove peaks closer than `mpd` to a higher peak, see detect_peaks.
+
+    The peaks are visited from the highest to the lowest, in the same order of
+    the loop of detect_peaks. A peak is kept if no kept peak is within `mpd`
+    samples (with `kpsh`, no kept peak higher than it). The kept peaks are a
+    sorted list searched with bisect.
+    """
+    kept = []
+    for i in ind[np.argsort(x[ind])][::-1]:
+        start = bisect.bisect_left(kept, i - mpd)
+        end = bisect.bisect_right(kept, i + mpd)
+        if kpsh:
+            isDeleted = any([x[k] > x[i] for k in kept[start:end]])
+        else:
+            isDeleted = end > start
+        if not isDeleted:
+            bisect.insort(kept, i)
+    return np.array(kept, dtype=int)
+
+
+def _runSums(values, start, end):
+    """Sum of values[start[i]:end[i]] for each i. Empty intervals sum 0."""
+    padded = np.append(values, 0)  # reduceat indexes must be smaller than the length
+    sums = np.add.reduceat(padded, np.vstack((start, end)).T.ravel())[::2]
+    sums[start >= end] = 0
+    return sums
+
+
+def _smallProminence(dx, ind, MinPeakProminence, MinPeakProminenceSide):
+    """Mask of the peaks with small prominence, see detect_peaks.
+
+    The left (right) prominence is the sum of dx over the run of rising
+    (falling) samples that ends (starts) at the peak. If the side is 'both',
+    the right prominence is used, like in the loop of detect_peaks. The loop
+    accumulates the differences one by one, so the peaks with prominence within
+    rounding error of `MinPeakProminence` are computed again with a loop.
+    """
+    positions = np.arange(dx.size)
+    side = MinPeakProminenceSide.lower()
+    if side in ['right', 'both']:
+        # end of the run of falling samples that starts at each sample
+        runEnd = np.minimum.accumulate(np.where(dx < 0, dx.size, positions)[::-1])[::-1]
+        prominence = _runSums(np.abs(dx), ind, runEnd[ind])
+    elif side == 'left':
+        # start of the run of rising samples that ends at each sample
+        runStart = np.maximum.accumulate(np.where(dx > 0, -1, positions)) + 1
+        prominence = _runSums(dx, runStart[ind - 1], ind)
+    else:
+        return np.zeros(ind.size, dtype=bool)
+
+    idel = prominence < MinPeakProminence
+    with np.errstate(invalid='ignore'):
+        nearTie = ~(np.abs(prominence - MinPeakProminence) > 1e-9 * (np.abs(prominence) + MinPeakProminence))
+    for i in np.flatnonzero(nearTie):
+        cumsum = 0
+        if side == 'left':
+            for j in reversed(range(ind[i])):
+                if dx[j] > 0:
+                    cumsum += dx[j]
+                else:
+                    break
+        else:
+            for j in range(ind[i], dx.size):
+                if dx[j] < 0:
+                    cumsum += abs(dx[j])
+                else:
+                    break
+        idel[i] = cumsum < MinPeakProminence
+    return idel
+
+
 def _plot(x, mph, mpd, threshold, edge, valley, ax, ind):
     """Plot results of the detect_peaks function, see its help."""
     try:
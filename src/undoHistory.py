@@ -0,0 +1,232 @@
+#!/bin/python
+
+# -*- coding: utf-8 -*-
+"""
+Undo history of the preprocessing state, based on reverse deltas.
+
+The history keeps the last stored state (the tip) by reference and, for each older state, only what is needed to rebuild it from the next one.
+Arrays are compared with the next state and only the range between their common prefix and common suffix is saved. Cropping or interpolating
+a segment costs the size of the segment, not the size of the signal.
+
+This works because the operations never modify arrays in place: they always assign new arrays (see :meth:`signals.signal.interpolate`).
+"""
+import copy
+
+import numpy as np
+
+# attributes of signals.signal saved in the history
+SIGNAL_ATTRIBUTES = ['label', 'unit', 'sigType', 'samplingRate_Hz', 'nPoints', '_data', '_dataLoader', '_pendingOps', '_beat2beatData']
+
+# attributes of patientData saved in the history
+PATIENT_ATTRIBUTES = ['peakIdx', 'valleyIdx', 'hasRRmarks', 'RRmarksSettings', 'hasB2Bdata', 'delayTracks']
+
+# value of attributes that do not exist
+_MISSING = object()
+
+
+def _arrayDelta(new, old):
+    """
+    Return the delta to rebuild `old` from `new`: [prefixLength, suffixLength, middle], where middle is the part of `old` between the common prefix
+    and the common suffix of both arrays.
+    """
+    nCommon = min(len(new), len(old))
+    if nCommon == 0 or new.dtype != old.dtype:
+        return [0, 0, old.copy()]
+
+    mismatch = np.flatnonzero(new[:nCommon] != old[:nCommon])
+    prefixLength = nCommon if len(mismatch) == 0 else mismatch[0]
+
+    nCommon -= prefixLength
+    mismatch = np.flatnonzero(new[len(new) - nCommon:][::-1] != old[len(old) - nCommon:][::-1])
+    suffixLength = nCommon if len(mismatch) == 0 else mismatch[0]
+
+    return [prefixLength, suffixLength, old[prefixLength:len(old) - suffixLength].copy()]
+
+
+def _applyArrayDelta(new, delta):
+    [prefixLength, suffixLength, middle] = delta
+    return np.concatenate([new[:prefixLength], middle, new[len(new) - suffixLength:]])
+
+
+def _isArray(value):
+    return isinstance(value, np.ndarray) and value.ndim == 1
+
+
+def _nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, list):
+        return sum([_nbytes(x) for x in value])
+    return 0
+
+
+class undoHistory():
+    """
+    Memory bounded undo history of :class:`patientData.patientData`.
+
+    Parameters
+    ----------
+    maxLevels : int, optional
+        Maximum number of undo levels. Default: 20
+
+    maxBytes : int, optional
+        Memory budget of the history, in bytes. The oldest levels are removed first when the budget is exceeded. The tip is not counted, since its
+        arrays are shared with the current state. Default: 256MB
+    """
+
+    def __init__(self, maxLevels=20, maxBytes=268435456):
+        self.maxLevels = maxLevels
+        self.maxBytes = maxBytes
+        self.tip = None
+        self.deltas = []  # deltas[i] rebuilds the state i from the state i+1. Each element is [delta, size in bytes]
+
+    def nLevels(self):
+        """
+        Number of states that can be restored by :meth:`undo`.
+        """
+        return len(self.deltas)
+
+    def nBytes(self):
+        return sum([size for [_, size] in self.deltas])
+
+    @staticmethod
+    def _capture(patient):
+        state = {'signals': [], 'operationsNode': patient.PPoperationsNode, 'nOperations': len(patient.PPoperationsNode)}
+        for s in patient.signals:
+            signalState = {}
+            for attribute in SIGNAL_ATTRIBUTES:
+                signalState[attribute] = s.__dict__.get(attribute, _MISSING)
+            # beat2beat objects and list of pending operations are modified in place. Their arrays are not
+            signalState['_pendingOps'] = list(signalState['_pendingOps'])
+            if signalState['_beat2beatData'] is not _MISSING:
+                signalState['_beat2beatData'] = copy.copy(signalState['_beat2beatData'])
+            state['signals'].append(signalState)
+
+        for attribute in PATIENT_ATTRIBUTES:
+            state[attribute] = patient.__dict__.get(attribute, _MISSING)
+        return state
+
+    @staticmethod
+    def _diff(new, old):
+        """
+        Delta that rebuilds the state `old` from the state `new`. Only changed values are saved. 1D arrays are saved as array deltas.
+        """
+        delta = {}
+        size = 0
+        for key in old:
+            if key == 'signals':
+                continue
+            if new[key] is old[key]:
+                continue
+            if _isArray(new[key]) and _isArray(old[key]):
+                delta[key] = ['arrayDelta', _arrayDelta(new[key], old[key])]
+            else:
+                delta[key] = ['value', old[key]]
+            size += _nbytes(delta[key][1])
+
+        if len(new['signals']) != len(old['signals']):
+            delta['signals'] = ['value', old['signals']]
+            return [delta, size + _nbytes([s['_data'] for s in old['signals'] if _isArray(s['_data'])])]
+
+        delta['signals'] = ['signalDeltas', []]
+        for newSignal, oldSignal in zip(new['signals'], old['signals']):
+            signalDelta = {}
+            for key in SIGNAL_ATTRIBUTES:
+                if newSignal[key] is oldSignal[key]:
+                    continue
+                if _isArray(newSignal[key]) and _isArray(oldSignal[key]):
+                    signalDelta[key] = ['arrayDelta', _arrayDelta(newSignal[key], oldSignal[key])]
+                elif key in ['label', 'unit', 'sigType', 'samplingRate_Hz', 'nPoints'] and newSignal[key] == oldSignal[key]:
+                    continue
+                else:
+                    signalDelta[key] = ['value', oldSignal[key]]
+                size += _nbytes(signalDelta[key][1])
+            delta['signals'][1].append(signalDelta)
+
+        return [delta, size]
+
+    @staticmethod
+    def _apply(new, delta):
+        """
+        Rebuild the previous state from the state `new` and the delta returned by :meth:`_diff`.
+        """
+        def rebuild(newValue, change):
+            if change[0] == 'arrayDelta':
+                return _applyArrayDelta(newValue, change[1])
+            return change[1]
+
+        old = {}
+        for key in new:
+            if key == 'signals':
+                continue
+            old[key] = rebuild(new[key], delta[key]) if key in delta else new[key]
+
+        if delta['signals'][0] == 'value':
+            old['signals'] = delta['signals'][1]
+            return old
+
+        old['signals'] = []
+        for newSignal, signalDelta in zip(new['signals'], delta['signals'][1]):
+            oldSignal = dict(newSignal)
+            for key in signalDelta:
+                oldSignal[key] = rebuild(newSignal[key], signalDelta[key])
+            old['signals'].append(oldSignal)
+        return old
+
+    @staticmethod
+    def _restore(patient, state):
+        for s, signalState in zip(patient.signals, state['signals']):
+            for attribute in SIGNAL_ATTRIBUTES:
+                value = signalState[attribute]
+                if attribute == '_pendingOps':
+                    value = list(value)
+                if attribute == '_beat2beatData' and value is not _MISSING:
+                    value = copy.copy(value)
+
+                if value is _MISSING:
+                    s.__dict__.pop(attribute, None)
+                else:
+                    s.__dict__[attribute] = value
+
+        for attribute in PATIENT_ATTRIBUTES:
+            if state[attribute] is _MISSING:
+                patient.__dict__.pop(attribute, None)
+            else:
+                patient.__dict__[attribute] = state[attribute]
+
+        # remove operations registered after the state was stored
+        node = state['operationsNode']
+        for elem in list(node)[state['nOperations']:]:
+            node.remove(elem)
+        patient.PPoperationsNode = node
+        for s in patient.signals:
+            s.operationsXML = node
+
+    def store(self, patient):
+        """
+        Store the current state of `patient`.
+        """
+        state = self._capture(patient)
+        if self.tip is not None:
+            self.deltas.append(self._diff(state, self.tip))
+        self.tip = state
+
+        while len(self.deltas) > self.maxLevels or (len(self.deltas) > 0 and self.nBytes() > self.maxBytes):
+            del self.deltas[0]
+
+    def undo(self, patient):
+        """
+        Restore the state stored before the last one and remove the last one from the history. Returns False if there is nothing to undo.
+        """
+        if len(self.deltas) == 0:
+            print('Nothing to undo.')
+            return False
+
+        [delta, _] = self.deltas.pop()
+        self.tip = self._apply(self.tip, delta)
+        self._restore(patient, self.tip)
+        return True
+
+    def clear(self):
+        self.tip = None
+        self.deltas = []
@@ -0,0 +1,95 @@
+import sys
+import pytest
+
+sys.path.append('../src/')
+from patientData import patientData as pD
+
+RESULTS = ['PSD', 'TFA', 'ARI']
+
+
+def ARcase(segmentLength_s=100):
+    case = pD('../example/healthy.DAT', activeModule='ARanalysis')
+    for channel, sigType in [[2, 'ABP'], [0, 'CBFV_L'], [1, 'CBFV_R']]:
+        case.signals[channel].setType(sigType, register=False)
+    case.findRRmarks(2, register=False)
+    case.getBeat2beat(register=False)
+
+    case.computePSDwelch(windowType='hann', segmentLength_s=segmentLength_s, register=False)
+    case.computeTFA(register=False)
+    case.computeARI(register=False)
+    return case
+
+
+def results(case):
+    return {name: [getattr(case, name), fingerprint] for name, fingerprint in case.ARfingerprints.items()}
+
+
+@pytest.fixture(scope='module')
+def reference():
+    case = ARcase()
+    return [case, results(case)]
+
+
+def test_sameParameters(reference):
+    case = ARcase()
+    before = results(case)
+    assert sorted(before) == sorted([r + '_' + side for r in RESULTS for side in ['L', 'R']])
+
+    # nothing is recomputed
+    case.computePSDwelch(windowType='hann', register=False)
+    case.computeTFA(register=False)
+    case.computeARI(register=False)
+    after = results(case)
+    for name in before:
+        assert after[name][0] is before[name][0]
+        assert after[name][1] == before[name][1]
+
+    # fingerprints do not depend on the instance
+    assert {name: x[1] for name, x in before.items()} == {name: x[1] for name, x in reference[1].items()}
+
+
+def test_changedPSDparameters():
+    case = ARcase()
+    before = results(case)
+
+    # TFA and ARI are stale and recomputed with their stored parameters
+    case.computePSDwelch(windowType='hann', segmentLength_s=50, register=False)
+    after = results(case)
+    assert sorted(after) == sorted(before)
+    for name in before:
+        assert after[name][0] is not before[name][0]
+        assert after[name][1] != before[name][1]
+    assert case.ARparameters['PSD']['segmentLength_s'] == 50
+    assert case.ARparameters['TFA'] == {'estimatorType': 'H1'}
+
+    # same results of a fresh computation
+    assert {name: x[1] for name, x in after.items()} == {name: x[1] for name, x in results(ARcase(segmentLength_s=50)).items()}
+
+
+def test_changedInputOneSide():
+    case = ARcase()
+    before = results(case)
+
+    # only the right CBFV changes. The beat-to-beat data of the other channels is recomputed, but is identical
+    case.signals[1].interpolate(1000, 1500, register=False)
+    case.getBeat2beat(register=False)
+    case.computePSDwelch(windowType='hann', register=False)
+    after = results(case)
+    for result in RESULTS:
+        assert after[result + '_L'][0] is before[result + '_L'][0]
+        assert after[result + '_L'][1] == before[result + '_L'][1]
+        assert after[result + '_R'][0] is not before[result + '_R'][0]
+        assert after[result + '_R'][1] != before[result + '_R'][1]
+
+
+def test_removedSide():
+    case = ARcase()
+    before = results(case)
+
+    # dependents of a removed side are removed
+    case.signals[1].setType('other', register=False)
+    case.computePSDwelch(windowType='hann', register=False)
+    assert sorted(case.ARfingerprints) == ['ARI_L', 'PSD_L', 'TFA_L']
+    assert not case.hasPSDdata_R and not case.hasTFdata_R
+    for result in RESULTS:
+        assert getattr(case, result + '_L') is before[result + '_L'][0]
@@ -0,0 +1,177 @@
+import sys
+import numpy as np
+import pytest
+
+sys.path.append('../src/')
+import operationsCompiler
+from patientData import patientData as pD
+
+
+def loadCase(fileName):
+    case = pD(fileName, activeModule='preprocessing', useCache=False)
+    ABPchannel = [i for i, s in enumerate(case.signals) if s.label == 'ABP'][0]
+    return [case, ABPchannel]
+
+
+def editedCase(fileName, isCrop, start, end):
+    # full detection after editing all channels
+    [case, ABPchannel] = loadCase(fileName)
+    for s in case.signals:
+        if isCrop:
+            s.cropInterval(start, end, register=False)
+        else:
+            s.interpolate(start, end, register=False)
+    return [case, ABPchannel]
+
+
+def remappedCase(fileName, method, isCrop, start, end):
+    # marks detected before the edit and remapped
+    [case, ABPchannel] = loadCase(fileName)
+    case.findRRmarks(ABPchannel, method=method, findPeaks=True, findValleys=True, register=False)
+    if isCrop:
+        case.cropInterval(start, end, register=False)
+    else:
+        case.interpolate(start, end, register=False)
+    return [case, ABPchannel]
+
+
+@pytest.mark.parametrize('fileName', ['../example/healthy.DAT', '../example/postStroke.DAT'])
+@pytest.mark.parametrize('position', [0.01, 0.1, 0.5, 0.995])
+def test_remapInterpolateAMPD(fileName, position):
+    # ampd: the windows of the full detection do not change, so the result is the same of detecting the marks again
+    [case, ABPchannel] = loadCase(fileName)
+    start = int(case.signals[ABPchannel].nPoints * position)
+    end = min(start + 300, case.signals[ABPchannel].nPoints - 2)
+
+    [remapped, _] = remappedCase(fileName, 'ampd', False, start, end)
+    [full, _] = editedCase(fileName, False, start, end)
+    full.findRRmarks(ABPchannel, method='ampd', findPeaks=True, findValleys=True, register=False)
+
+    assert np.array_equal(remapped.peakIdx, full.peakIdx)
+    assert np.array_equal(remapped.valleyIdx, full.valleyIdx)
+
+
+@pytest.mark.parametrize('fileName', ['../example/healthy.DAT', '../example/postStroke.DAT'])
+@pytest.mark.parametrize('method, isCrop', [['ampd', True], ['md', True], ['md', False]])
+@pytest.mark.parametrize('position', [0.1, 0.5, 0.995])
+def test_remapApproximate(fileName, method, isCrop, position):
+    # the parameters of the full detection depend on the whole channel: marks far from the edit may change. Around the edit the marks are the same
+    [case, ABPchannel] = loadCase(fileName)
+    start = int(case.signals[ABPchannel].nPoints * position)
+    end = min(start + 300, case.signals[ABPchannel].nPoints - 2)
+
+    [remapped, _] = remappedCase(fileName, method, isCrop, start, end)
+    [full, _] = editedCase(fileName, isCrop, start, end)
+    full.findRRmarks(ABPchannel, method=method, findPeaks=True, findValleys=True, register=False)
+
+    margin = int(remapped.REDETECT_MARGIN_s * remapped.signals[ABPchannel].samplingRate_Hz)
+    for [marks, fullMarks] in [[remapped.peakIdx, full.peakIdx], [remapped.valleyIdx, full.valleyIdx]]:
+        near = lambda x: x[np.abs(x - start) < margin]
+        assert np.array_equal(near(marks), near(fullMarks))
+        assert len(np.setxor1d(marks, fullMarks)) <= 0.05 * len(fullMarks)
+
+
+def test_remapReplay():
+    [case, ABPchannel] = loadCase('../example/healthy.DAT')
+    case.findRRmarks(ABPchannel, method='ampd', findPeaks=True, findValleys=True, register=True)
+    case.interpolate(10000, 10300)
+    case.cropInterval(20000, 20500)
+
+    # the update of the RR marks is registered, so the job gives the same marks
+    tags = [elem.tag for elem in case.PPoperationsNode]
+    assert tags.count('remapRRmarks') == 2
+    plan = operationsCompiler.compileOperations(case.PPoperationsNode, 'preprocessing')
+    [replay, _] = loadCase('../example/healthy.DAT')
+    replay.runOperationsPlan(plan)
+    assert np.array_equal(replay.peakIdx, case.peakIdx)
+    assert np.array_equal(replay.valleyIdx, case.valleyIdx)
+    assert all([np.array_equal(s.data, r.data) for s, r in zip(case.signals, replay.signals)])
+
+    # edits of jobs without remapRRmarks operations do not change the marks
+    [old, _] = loadCase('../example/healthy.DAT')
+    old.runOperationsPlan([op for op in plan if op.tag != 'remapRRmarks'])
+    [marks, _] = loadCase('../example/healthy.DAT')
+    marks.findRRmarks(ABPchannel, method='ampd', findPeaks=True, findValleys=True, register=False)
+    assert np.array_equal(old.peakIdx, marks.peakIdx)
+    assert np.array_equal(old.valleyIdx, marks.valleyIdx)
+
+
+def test_remapWithoutSettings():
+    # marks not detected by findRRmarks (e.g. PAR files) are not changed
+    [case, ABPchannel] = loadCase('../example/healthy.DAT')
+    case.peakIdx = np.arange(0, 1000, 10)
+    case.hasRRmarks = True
+    case.cropInterval(100, 200, register=False)
+    assert np.array_equal(case.peakIdx, np.arange(0, 1000, 10))
+    assert 'remapRRmarks' not in [elem.tag for elem in case.PPoperationsNode]
+
+
+def sequentialCase(case, indexes, isPeak, insert):
+    # marks after calling insertPeak/removePeak for each index
+    for idx in indexes:
+        if insert:
+            case.insertPeak(idx, isPeak, register=False)
+        else:
+            case.removePeak(idx, isPeak, register=False)
+    return case
+
+
+def bulkIndexes(marks, nPoints):
+    rng = np.random.default_rng(0)
+    return {'empty': [],
+            'random': rng.integers(0, nPoints, 50),
+            'duplicates': np.repeat(rng.choice(marks, 10), 3),
+            'sameClosestMark': [marks[5] - 2, marks[5] + 2, marks[5], marks[5] + 1],
+            'ties': (marks[10:20] + marks[11:21]) // 2,
+            'outOfRange': [-1000, -1, nPoints, nPoints + 1000],
+            'ends': [marks[0], marks[0] - 5, marks[-1], marks[-1] + 5, marks[1], marks[-2]],
+            'allMarks': rng.permutation(np.concatenate([marks, marks[:20]])),
+            }
+
+
+@pytest.mark.parametrize('isPeak', [True, False])
+@pytest.mark.parametrize('insert', [True, False])
+@pytest.mark.parametrize('name', ['empty', 'random', 'duplicates', 'sameClosestMark', 'ties', 'outOfRange', 'ends', 'allMarks'])
+def test_bulkPeaks(isPeak, insert, name):
+    [case, ABPchannel] = loadCase('../example/healthy.DAT')
+    [sequential, _] = loadCase('../example/healthy.DAT')
+    for c in [case, sequential]:
+        c.findRRmarks(ABPchannel, method='ampd', findPeaks=True, findValleys=True, register=False)
+        c.getBeat2beat(resampleRate_Hz=5.0, register=False)
+
+    marks = case.peakIdx if isPeak else case.valleyIdx
+    indexes = bulkIndexes(marks, case.signals[ABPchannel].nPoints)[name]
+    if insert:
+        case.insertPeaks(indexes, isPeak, register=False)
+    else:
+        case.removePeaks(indexes, isPeak, register=False)
+    sequentialCase(sequential, indexes, isPeak, insert)
+
+    assert np.array_equal(case.peakIdx, sequential.peakIdx)
+    assert np.array_equal(case.valleyIdx, sequential.valleyIdx)
+    # beat to beat data is updated, or removed if it cannot be updated locally
+    assert case.hasB2Bdata == sequential.hasB2Bdata
+    if case.hasB2Bdata:
+        for s, r in zip(case.signals, sequential.signals):
+            assert np.allclose(s.beat2beatData.avg, r.beat2beatData.avg)
+
+
+def test_bulkPeaksReplay():
+    [case, ABPchannel] = loadCase('../example/healthy.DAT')
+    case.findRRmarks(ABPchannel, method='ampd', findPeaks=True, findValleys=True, register=True)
+    # more than 1000 indexes: str() of numpy arrays summarizes them
+    insertIndexes = np.arange(5, case.signals[ABPchannel].nPoints, 17)
+    removeIndexes = case.valleyIdx[::2] + 3
+    case.insertPeaks(insertIndexes, isPeak=True)
+    case.removePeaks(removeIndexes, isPeak=False)
+
+    plan = operationsCompiler.compileOperations(case.PPoperationsNode, 'preprocessing')
+    params = [op.params for op in plan if op.tag in ['insertPeaks', 'removePeaks']]
+    assert len(insertIndexes) > 1000
+    assert np.array_equal(params[0]['indexes'], insertIndexes)
+    assert np.array_equal(params[1]['indexes'], removeIndexes)
+
+    [replay, _] = loadCase('../example/healthy.DAT')
+    replay.runOperationsPlan(plan)
+    assert np.array_equal(replay.peakIdx, case.peakIdx)
+    assert np.array_equal(replay.valleyIdx, case.valleyIdx)
@@ -0,0 +1,90 @@
+import os
+import shutil
+import sys
+import numpy as np
+import pytest
+
+sys.path.append('../src/')
+import batchProcessing
+from patientData import patientData as pD
+
+OPERATIONS = '''<operations>
+  <preprocessing>
+    <setType><type>ABP</type><channel>2</channel></setType>
+    <findRRmarks><refChannel>2</refChannel><method>ampd</method><findPeaks>True</findPeaks><findValleys>False</findValleys></findRRmarks>
+    <B2Bcalc><resampleMethod>linear</resampleMethod><resampleRate_Hz>5.0</resampleRate_Hz></B2Bcalc>
+    <B2Bsave><channels>[0 1 2]</channels><format>csv</format><fileName>b2b.csv</fileName></B2Bsave>
+  </preprocessing>
+</operations>
+'''
+
+
+@pytest.fixture
+def batchDir(tmp_path):
+    # two recordings, one file with an irregular table and the operations file
+    for fileName in ['healthy.DAT', 'postStroke.DAT']:
+        shutil.copy(os.path.join('../example', fileName), str(tmp_path))
+    with open('../example/healthy.DAT', 'r') as file:
+        lines = file.readlines()
+    lines[200] = '00:00:01:00\t100\t10.0\n'
+    with open(os.path.join(str(tmp_path), 'broken.DAT'), 'w') as file:
+        file.writelines(lines)
+    with open(os.path.join(str(tmp_path), 'basic.ppo'), 'w') as file:
+        file.write(OPERATIONS)
+    return str(tmp_path)
+
+
+def readManifest(fileName):
+    with open(fileName, 'r') as file:
+        lines = file.read().splitlines()
+    assert lines[0] == 'FILE;STATUS;TIME_S;MESSAGE'
+    return [line.split(';') for line in lines[1:]]
+
+
+@pytest.mark.parametrize('nWorkers', [1, 2])
+def test_runBatch(batchDir, nWorkers):
+    operationsFiles = [os.path.join(batchDir, 'basic.ppo')]
+    fileList = batchProcessing.listInputFiles([batchDir], operationsFiles)
+    assert [os.path.basename(f) for f in fileList] == ['broken.DAT', 'healthy.DAT', 'postStroke.DAT']
+
+    # the error of one file does not abort the batch
+    results = batchProcessing.runBatch(fileList, operationsFiles, activeModule='preprocessing', quiet=True, nWorkers=nWorkers)
+    assert [r[0] for r in results] == fileList
+    assert [r[1] for r in results] == ['error', 'ok', 'ok']
+    assert results[0][3].startswith('ValueError')
+
+    manifestFile = os.path.join(batchDir, 'manifest.csv')
+    batchProcessing.saveManifest(manifestFile, results)
+    manifest = readManifest(manifestFile)
+    assert [row[0:2] for row in manifest] == [r[0:2] for r in results]
+    assert all([float(row[2]) >= 0 for row in manifest])
+    assert ';' not in manifest[0][3] and len(manifest[0][3]) <= 200
+
+    # output files are prefixed with the name of the recording and are the same of an interactive run
+    for prefix in ['healthy', 'postStroke']:
+        case = pD(os.path.join(batchDir, prefix + '.DAT'), activeModule='preprocessing')
+        case.signals[2].setType('ABP')
+        case.findRRmarks(2, method='ampd', findPeaks=True, findValleys=False)
+        case.getBeat2beat(resampleRate_Hz=5.0, resampleMethod='linear')
+        case.saveB2B(os.path.join(batchDir, prefix + '_reference.csv'), [0, 1, 2], format='csv')
+        with open(os.path.join(batchDir, prefix + '_b2b.csv')) as f1, open(os.path.join(batchDir, prefix + '_reference.csv')) as f2:
+            assert f1.read() == f2.read()
+    assert not os.path.exists(os.path.join(batchDir, 'broken_b2b.csv'))
+
+
+def test_main(batchDir):
+    manifestFile = os.path.join(batchDir, 'manifest.csv')
+    argv = [os.path.join(batchDir, '*.DAT'), '--operations', os.path.join(batchDir, 'basic.ppo'), '--module', 'preprocessing', '--workers', '1',
+            '--manifest', manifestFile, '--quiet', '--saveJob']
+    assert batchProcessing.main(argv) == 2  # one file with errors
+    assert [row[1] for row in readManifest(manifestFile)] == ['error', 'ok', 'ok']
+    assert os.path.isfile(os.path.join(batchDir, 'healthy.job'))
+
+    # the saved jobs are processed again
+    os.remove(os.path.join(batchDir, 'healthy_b2b.csv'))
+    assert batchProcessing.main([os.path.join(batchDir, '*.job'), '--module', 'preprocessing', '--workers', '1', '--manifest', manifestFile,
+                                 '--quiet']) == 0
+    assert [os.path.basename(row[0]) for row in readManifest(manifestFile)] == ['healthy.job', 'postStroke.job']
+    assert os.path.isfile(os.path.join(batchDir, 'healthy_b2b.csv'))
+
+    assert batchProcessing.main([os.path.join(batchDir, '*.xyz'), '--manifest', manifestFile]) == 1
@@ -0,0 +1,288 @@
+import sys
+import numpy as np
+import pytest
+from scipy import interpolate as scipyInterpolate
+
+sys.path.append('../src/')
+import signals_b2b
+from patientData import patientData as pD
+
+
+def syntheticSignal(nPoints=3000, samplingRate_Hz=100.0, seed=0):
+    # pulses of random duration and amplitude, and the index of the start of each pulse
+    rng = np.random.default_rng(seed)
+    beatIdx = np.cumsum(rng.integers(60, 120, nPoints // 60))
+    beatIdx = beatIdx[beatIdx < nPoints]
+    data = 80.0 + rng.standard_normal(nPoints)
+    for start, end in zip(beatIdx[:-1], beatIdx[1:]):
+        data[start:end] += rng.uniform(20, 40) * np.sin(np.pi * np.arange(end - start) / (end - start)) ** 2
+    return [data, beatIdx, samplingRate_Hz]
+
+
+def test_singleSeries():
+    # every sample is a beat (PAR files): max, min and avg are a single array, also after resampling and filtering
+    [data, beatIdx, Fs] = syntheticSignal()
+    single = [signals_b2b.beat2beat(x, np.arange(len(data)), Fs, resampleRate_Hz=None) for x in [data, 2 * data]]
+    assert all([b2b.isSingleSeries() and b2b.features is None for b2b in single])
+
+    regular = signals_b2b.beat2beat(data, beatIdx, Fs, resampleRate_Hz=None)
+    reference = signals_b2b.beat2beat(data, beatIdx, Fs, resampleRate_Hz=None)
+    assert not regular.isSingleSeries()
+
+    signals_b2b.resampleBeat2beat(single + [regular], 7.0, 'linear')
+    signals_b2b.resampleBeat2beat([reference], 7.0, 'linear')
+    for b2b, x in zip(single, [data, 2 * data]):
+        assert b2b.isSingleSeries()
+        assert np.allclose(b2b.max, np.interp(b2b.xData, np.arange(len(x) - 1) / Fs, x[:-1]))
+    for name in ['max', 'min', 'avg']:
+        assert np.array_equal(getattr(regular, name), getattr(reference, name))
+
+    single[0].LPfilter(nTaps=5)
+    assert single[0].isSingleSeries()
+    regular.LPfilter(nTaps=5)
+    assert not regular.isSingleSeries()
+
+
+def baselineStatistics(data, beatIdx):
+    # per beat loop of the original beat2beat class
+    maxVal = np.array([max(data[beatIdx[i]:beatIdx[i + 1]]) for i in range(len(beatIdx) - 1)])
+    minVal = np.array([min(data[beatIdx[i]:beatIdx[i + 1]]) for i in range(len(beatIdx) - 1)])
+    avgVal = np.array([np.mean(data[beatIdx[i]:beatIdx[i + 1]]) for i in range(len(beatIdx) - 1)])
+    return [maxVal, minVal, avgVal]
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_beatStatistics(seed):
+    [data, beatIdx, _] = syntheticSignal(seed=seed)
+
+    # 1D
+    for x, y in zip(signals_b2b.beatStatistics(data, beatIdx), baselineStatistics(data, beatIdx)):
+        assert x.shape == (len(beatIdx) - 1,)
+        assert np.allclose(x, y, rtol=0, atol=1e-12)
+
+    # 2D, one channel per row. Integer input is converted to float
+    channels = np.vstack([data, -data, np.round(10 * data).astype(int)])
+    stats = signals_b2b.beatStatistics(channels, beatIdx)
+    assert all([x.shape == (3, len(beatIdx) - 1) for x in stats])
+    for i, channel in enumerate(channels):
+        for x, y in zip(stats, baselineStatistics(channel, beatIdx)):
+            assert np.allclose(x[i], y, rtol=0, atol=1e-12)
+
+    # beats of one sample
+    beatIdx = np.arange(10, 20)
+    for x, y in zip(signals_b2b.beatStatistics(channels, beatIdx), [channels[:, 10:19]] * 3):
+        assert np.allclose(x, y, rtol=0, atol=1e-12)
+
+
+def baselineResample(xData, series, xNew, method):
+    # per series interp1d of the original beat2beat.resample
+    return np.vstack([scipyInterpolate.interp1d(xData, y, kind=method, fill_value=(y[0], y[-1]), assume_sorted=True)(xNew) for y in series])
+
+
+@pytest.mark.parametrize('method', ['linear', 'nearest', 'zero', 'slinear', 'quadratic', 'cubic', 'previous', 'next'])
+def test_resampleSeries(method):
+    rng = np.random.default_rng(3)
+    xData = np.cumsum(rng.uniform(0.5, 1.2, 200))
+    series = rng.standard_normal((4, len(xData)))
+    xNew = np.arange(xData[0], xData[-1], 0.2)
+
+    newSeries = signals_b2b.resampleSeries(xData, series, xNew, method)
+    assert newSeries.shape == (4, len(xNew))
+    assert np.allclose(newSeries, baselineResample(xData, series, xNew, method), rtol=0, atol=1e-10)
+
+    # new points on the knots
+    assert np.allclose(signals_b2b.resampleSeries(xData, series, xData, 'linear'), series, rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('method', ['linear', 'cubic'])
+def test_resampleBeat2beat(method):
+    # two recordings with different beats, plus a single series object, mixed in the list
+    [dataA, beatIdxA, Fs] = syntheticSignal(seed=4)
+    [dataB, beatIdxB, _] = syntheticSignal(seed=5)
+    b2bList = [signals_b2b.beat2beat(dataA, beatIdxA, Fs, resampleRate_Hz=None),
+               signals_b2b.beat2beat(dataB, beatIdxB, Fs, resampleRate_Hz=None),
+               signals_b2b.beat2beat(2 * dataA, beatIdxA, Fs, resampleRate_Hz=None),
+               signals_b2b.beat2beat(dataA, np.arange(len(dataA)), Fs, resampleRate_Hz=None),
+               signals_b2b.beat2beat(-dataB, beatIdxB, Fs, resampleRate_Hz=None)]
+    expected = []
+    for b2b in b2bList:
+        xNew = np.arange(b2b.xData[0], b2b.xData[-1], 1.0 / 5.0)
+        expected.append([xNew, baselineResample(b2b.xData, [b2b.max, b2b.min, b2b.avg], xNew, method)])
+
+    signals_b2b.resampleBeat2beat(b2bList, 5.0, method)
+    for b2b, [xNew, series] in zip(b2bList, expected):
+        assert np.array_equal(b2b.xData, xNew)
+        assert b2b.nPoints == len(xNew) and b2b.samplingRate_Hz == 5.0
+        for name, y in zip(['max', 'min', 'avg'], series):
+            assert np.allclose(getattr(b2b, name), y, rtol=0, atol=1e-10)
+    assert b2bList[3].isSingleSeries()
+
+
+def test_beatFeatures():
+    # beats of 4, 6 and 3 samples at 2Hz. The second beat has a plateau at its maximum
+    data = np.array([1, 3, 2, 0, 5, 5, 1, 2, 2, 0, 4, 4, 8], dtype=float)
+    beatIdx = [0, 4, 10, 13]
+    expected = np.array([[2.0, 3.0, 1.5],            # RR_s
+                         [3.0, 5.0, 4.0],            # PP
+                         [2.0, 2.0, 0.75],           # PI
+                         [1.0, 1.0, 0.5],            # RI
+                         [0.5, 0.0, 1.0],            # timeToPeak_s
+                         [3.0, 7.5, 8.0]])           # area
+    assert signals_b2b.BEAT_FEATURES == ['RR_s', 'PP', 'PI', 'RI', 'timeToPeak_s', 'area']
+    assert np.allclose(signals_b2b.beatFeatures(data, beatIdx, 2.0), expected, rtol=0, atol=1e-12)
+
+    # 2D, one channel per row. Same result with precomputed statistics
+    channels = np.vstack([data, 2 * data, data[::-1]])
+    features = signals_b2b.beatFeatures(channels, beatIdx, 2.0)
+    assert features.shape == (3, len(signals_b2b.BEAT_FEATURES), 3)
+    assert np.allclose(features[0], expected, rtol=0, atol=1e-12)
+    assert np.allclose(features[1], expected * [[1], [2], [1], [1], [1], [2]], rtol=0, atol=1e-12)
+    for i in range(3):
+        assert np.allclose(features[i], signals_b2b.beatFeatures(channels[i], beatIdx, 2.0), rtol=0, atol=1e-12)
+    assert np.array_equal(features, signals_b2b.beatFeatures(channels, beatIdx, 2.0, signals_b2b.beatStatistics(channels, beatIdx)))
+
+    # area of the rectangle rule is the sum of the samples divided by the sampling rate
+    [data, beatIdx, Fs] = syntheticSignal()
+    features = signals_b2b.beatFeatures(data, beatIdx, Fs)
+    area = np.array([np.sum(data[start:end]) for start, end in zip(beatIdx[:-1], beatIdx[1:])]) / Fs
+    assert np.allclose(features[signals_b2b.BEAT_FEATURES.index('area')], area, rtol=1e-12, atol=0)
+
+
+def readSimpleText(fileName):
+    # list of channels, each a dict of the arrays of the file
+    channels = []
+    with open(fileName) as fIn:
+        for block in fIn.read().split('=' * 80 + '\n')[:-1]:
+            fields = dict([line.split('=', 1) for line in block.splitlines()])
+            channels.append({key: np.array(value.strip('[]').split(), dtype=float) for key, value in fields.items() if value.startswith('[')})
+    return channels
+
+
+def readFeatures(case, tmp_path, format, channelList):
+    # features and beat times saved by saveB2B, as [beatTime, features of each channel]
+    case.saveB2B(str(tmp_path / 'out'), channelList=channelList, format=format, register=False, features=True)
+
+    if format == 'csv':
+        table = np.genfromtxt(tmp_path / 'out_features.csv', delimiter=';', skip_header=1).T
+        nFeatures = len(signals_b2b.BEAT_FEATURES)
+        return [table[0], [table[1 + i * nFeatures:1 + (i + 1) * nFeatures] for i in range(len(channelList))]]
+
+    if format == 'numpy':
+        x = np.load(tmp_path / 'out.npy')
+        assert list(x['channel']) == channelList
+        return [x['beatTime_(s)'][0], [np.vstack([row[name] for name in signals_b2b.BEAT_FEATURES]) for row in x]]
+
+    channels = readSimpleText(tmp_path / 'out.b2b')
+    assert len(channels) == len(channelList)
+    if 'BEAT_TIME_(S)' not in channels[0]:
+        return [None, [None for _ in channels]]
+    return [channels[0]['BEAT_TIME_(S)'], [np.vstack([x[name.upper()] for name in signals_b2b.BEAT_FEATURES]) for x in channels]]
+
+
+@pytest.mark.parametrize('format', ['csv', 'numpy', 'simple_text'])
+def test_saveB2Bfeatures(format, tmp_path):
+    case = pD('../example/healthy.DAT', activeModule='preprocessing')
+    case.findRRmarks(2, register=False)
+    case.getBeat2beat(register=False)
+
+    channelList = [0, 2]
+    [beatTime, features] = readFeatures(case, tmp_path, format, channelList)
+    b2b = case.signals[0].beat2beatData
+    assert np.allclose(beatTime, b2b.beatTime_s, rtol=1e-8, atol=1e-8)
+    for ch, x in zip(channelList, features):
+        assert x.shape == (len(signals_b2b.BEAT_FEATURES), len(case.peakIdx) - 1)
+        assert np.allclose(x, case.signals[ch].beat2beatData.features, rtol=1e-7, atol=1e-7)
+
+
+@pytest.mark.parametrize('format', ['csv', 'numpy', 'simple_text'])
+def test_saveB2BfeaturesPAR(format, tmp_path):
+    # every sample is a beat: the features are not available. csv and numpy files have NaN rows, simple_text files have no feature lines
+    [data, _, Fs] = syntheticSignal(nPoints=500)
+    fileName = tmp_path / 'synthetic.PAR'
+    np.savetxt(fileName, np.vstack([np.arange(len(data)) / Fs, data, data + 10, 2 * data]).T, fmt='%.6f')
+    case = pD(str(fileName), activeModule='preprocessing')
+    assert case.hasB2Bdata and case.signals[0].beat2beatData.features is None
+
+    [beatTime, features] = readFeatures(case, tmp_path, format, [0, 1, 2])
+    if format == 'simple_text':
+        assert beatTime is None
+        return
+    assert np.allclose(beatTime, case.signals[0].beat2beatData.beatTime_s, rtol=1e-8, atol=1e-8)
+    for x in features:
+        assert x.shape == (len(signals_b2b.BEAT_FEATURES), len(data) - 1)
+        assert np.all(np.isnan(x))
+
+
+def assertSameBeat2beat(b2b, reference):
+    for name in ['xData', 'beatTime_s', 'max', 'min', 'avg', 'features']:
+        assert getattr(b2b, name).shape == getattr(reference, name).shape
+        assert np.allclose(getattr(b2b, name), getattr(reference, name), rtol=0, atol=1e-10)
+
+
+def editedBeats(beatIdx):
+    # marks inserted and removed in the middle, at the second index and at the third to last index
+    middle = len(beatIdx) // 2
+    return [np.insert(beatIdx, middle, (beatIdx[middle - 1] + beatIdx[middle]) // 2),
+            np.delete(beatIdx, middle),
+            np.delete(np.insert(beatIdx, middle + 3, beatIdx[middle + 3] - 7), [middle - 4, middle - 3]),
+            np.insert(beatIdx, 1, beatIdx[0] + 11),
+            np.delete(beatIdx, 1),
+            np.delete(beatIdx, -3),
+            np.insert(beatIdx, -2, beatIdx[-3] + 5)]
+
+
+@pytest.mark.parametrize('method', signals_b2b.LOCAL_METHODS)
+def test_updateBeats(method):
+    [data, beatIdx, Fs] = syntheticSignal(seed=6)
+    for newIdx in editedBeats(beatIdx):
+        b2b = signals_b2b.beat2beat(data, beatIdx, Fs, resampleRate_Hz=5.0, resampleMethod=method)
+        oldArrays = [b2b.max, b2b.min, b2b.avg]
+        assert b2b.updateBeats(data, newIdx)
+        assertSameBeat2beat(b2b, signals_b2b.beat2beat(data, newIdx, Fs, resampleRate_Hz=5.0, resampleMethod=method))
+
+        # new arrays are assigned
+        assert all([x is not y for x, y in zip(oldArrays, [b2b.max, b2b.min, b2b.avg])])
+
+        # successive edits
+        assert b2b.updateBeats(data, beatIdx)
+        assertSameBeat2beat(b2b, signals_b2b.beat2beat(data, beatIdx, Fs, resampleRate_Hz=5.0, resampleMethod=method))
+
+
+@pytest.mark.parametrize('method', signals_b2b.LOCAL_METHODS)
+def test_updateBeatsLimits(method):
+    # edits of the first or the last two indexes change the limits of the resampled series
+    [data, beatIdx, Fs] = syntheticSignal(seed=7)
+    for newIdx in [beatIdx[1:], np.insert(beatIdx, 0, beatIdx[0] - 20), np.concatenate([[beatIdx[0] + 3], beatIdx[1:]]), beatIdx[:-1],
+                   np.delete(beatIdx, -2), np.insert(beatIdx, len(beatIdx) - 1, beatIdx[-1] - 9)]:
+        b2b = signals_b2b.beat2beat(data, beatIdx, Fs, resampleRate_Hz=5.0, resampleMethod=method)
+        assert not b2b.updateBeats(data, newIdx)
+
+    # not editable: filtered or not resampled with a local method
+    b2b = signals_b2b.beat2beat(data, beatIdx, Fs, resampleRate_Hz=5.0, resampleMethod=method)
+    b2b.LPfilter()
+    assert not b2b.updateBeats(data, editedBeats(beatIdx)[0])
+    b2b = signals_b2b.beat2beat(data, beatIdx, Fs, resampleRate_Hz=5.0, resampleMethod='cubic')
+    assert not b2b.updateBeats(data, editedBeats(beatIdx)[0])
+
+
+def test_updateBeat2beatPatient():
+    case = pD('../example/healthy.DAT', activeModule='preprocessing')
+    case.findRRmarks(2, register=False)
+    case.getBeat2beat(resampleRate_Hz=5.0, register=False)
+    peakIdx = case.peakIdx
+
+    # the beat to beat data of all channels is updated
+    case.insertPeak((peakIdx[100] + peakIdx[101]) // 2, register=False)
+    case.removePeak(peakIdx[200], register=False)
+    assert case.hasB2Bdata
+    for s in case.signals:
+        assertSameBeat2beat(s.beat2beatData, signals_b2b.beat2beat(s.data, case.peakIdx, s.samplingRate_Hz, resampleRate_Hz=5.0))
+
+    # edits of the first or the last two marks remove the beat to beat data
+    for edit in [lambda: case.removePeak(case.peakIdx[0], register=False),
+                 lambda: case.insertPeak(case.peakIdx[-1] - 10, register=False),
+                 lambda: case.removePeak(case.peakIdx[-2], register=False)]:
+        case.getBeat2beat(resampleRate_Hz=5.0, register=False)
+        edit()
+        assert not case.hasB2Bdata
+        assert all([s._beat2beatData is None for s in case.signals])
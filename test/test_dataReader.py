@@ -0,0 +1,137 @@
+import glob
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.append('../src/')
+import dataReader
+from patientData import patientData as pD
+
+
+def channelData(case):
+    return [s.data for s in case.signals]
+
+
+@pytest.mark.parametrize('fileName', ['../example/healthy.DAT', '../example/postStroke.CSV'])
+def test_sidecarCache(fileName, tmp_path):
+    reference = pD(fileName, activeModule='preprocessing')
+    assert len(glob.glob(fileName + '.cache.*')) == 0
+
+    # first load writes the cache, the second one maps it
+    for i in range(2):
+        case = pD(fileName, activeModule='preprocessing', useCache=True, cacheDir=str(tmp_path))
+        assert all([np.array_equal(x, y) for x, y in zip(channelData(case), channelData(reference))])
+        assert [s.label for s in case.signals] == [s.label for s in reference.signals]
+    assert len(os.listdir(str(tmp_path))) == 2
+    assert dataReader.loadSidecar(fileName, str(tmp_path)) is not None
+    assert len(glob.glob(fileName + '.cache.*')) == 0
+
+
+@pytest.mark.parametrize('metadata', ['', '<cache>', '<cache></cache>', '<cache><source size="1" mtime="1" hash="x"/></cache>',
+                                      '<cache><source size="1"/><samplingRate_Hz>100</samplingRate_Hz></cache>',
+                                      '<cache><source size="a" mtime="1" hash="x"/><samplingRate_Hz>100</samplingRate_Hz></cache>',
+                                      '<cache><source size="1" mtime="1" hash="x"/><samplingRate_Hz/></cache>'])
+def test_sidecarInvalidMetadata(metadata, tmp_path):
+    # incomplete or corrupted metadata files are not valid caches
+    fileName = '../example/healthy.DAT'
+    case = pD(fileName, activeModule='preprocessing', useCache=True, cacheDir=str(tmp_path))
+    [_, metaFile] = dataReader.sidecarFiles(fileName, str(tmp_path))
+    with open(metaFile, 'w') as file:
+        file.write(metadata)
+    assert dataReader.loadSidecar(fileName, str(tmp_path)) is None
+
+    # the raw data file is parsed again
+    newCase = pD(fileName, activeModule='preprocessing', useCache=True, cacheDir=str(tmp_path))
+    assert all([np.array_equal(x, y) for x, y in zip(channelData(newCase), channelData(case))])
+    assert dataReader.loadSidecar(fileName, str(tmp_path)) is not None
+
+
+def test_sidecarFiles():
+    # same file name in different directories
+    assert dataReader.sidecarFiles('/a/data.DAT') == ['/a/data.DAT.cache.npy', '/a/data.DAT.cache.xml']
+    assert dataReader.sidecarFiles('/a/data.DAT', '/cache') != dataReader.sidecarFiles('/b/data.DAT', '/cache')
+    assert os.path.dirname(dataReader.sidecarFiles('/a/data.DAT', '/cache')[0]) == '/cache'
+
+
+@pytest.mark.parametrize('fileName', sorted(glob.glob('../example/*.DAT') + glob.glob('../example/*.CSV')))
+def test_fastReader(fileName):
+    fast = pD(fileName, activeModule='preprocessing', reader='fast')
+    reference = pD(fileName, activeModule='preprocessing', reader='genfromtxt')
+    assert [s.label for s in fast.signals] == [s.label for s in reference.signals]
+    assert [s.unit for s in fast.signals] == [s.unit for s in reference.signals]
+    assert [s.samplingRate_Hz for s in fast.signals] == [s.samplingRate_Hz for s in reference.signals]
+    for x, y in zip(channelData(fast), channelData(reference)):
+        assert x.dtype == y.dtype
+        assert np.array_equal(x, y)
+
+
+def malformedFile(tmp_path, line):
+    # copy of an example file with one irregular line in the table of data
+    with open('../example/healthy.DAT', 'r') as file:
+        lines = file.readlines()
+    header = dataReader.readHeader('../example/healthy.DAT', 'EXP_DAT')
+    lines[header['sizeHeader'] + 100] = line
+    fileName = os.path.join(str(tmp_path), 'malformed.DAT')
+    with open(fileName, 'w') as file:
+        file.writelines(lines)
+    return [fileName, header]
+
+
+@pytest.mark.parametrize('line', ['00:00:01:00\t100\t10.0\t20.0\t80.0\n', '00:00:01:00\t100\t10.0\t20.0\t80.0\t35.0\t1.0\n',
+                                  '00:00:01:00\t100\t10.0\tabc\t80.0\t35.0\n'])
+@pytest.mark.parametrize('chunkSize', [4194304, 1000])
+def test_readDataBlockIrregular(line, chunkSize, tmp_path):
+    # missing values, extra columns and text: the fast reader returns None
+    [fileName, header] = malformedFile(tmp_path, line)
+    assert dataReader.readDataBlock(fileName, header['sizeHeader'], header['nColumns'], header['usecols'], chunkSize=chunkSize) is None
+
+
+def test_fastReaderFallback(tmp_path):
+    # patientData falls back to genfromtxt: the text becomes NaN
+    [fileName, _] = malformedFile(tmp_path, '00:00:01:00\t100\t10.0\tabc\t80.0\t35.0\n')
+    fast = pD(fileName, activeModule='preprocessing', reader='fast')
+    reference = pD(fileName, activeModule='preprocessing', reader='genfromtxt')
+    assert np.isnan(fast.signals[1].data[100])
+    assert all([np.array_equal(x, y, equal_nan=True) for x, y in zip(channelData(fast), channelData(reference))])
+
+
+@pytest.mark.parametrize('line', ['00:00:01:00\t100\t10.0\t20.0\t80.0\n', '00:00:01:00\t100\t10.0\t20.0\t80.0\t35.0\t1.0\n'])
+def test_fastReaderFallbackError(line, tmp_path):
+    # rows with missing or extra columns are rejected by genfromtxt too
+    [fileName, _] = malformedFile(tmp_path, line)
+    for reader in ['fast', 'genfromtxt']:
+        with pytest.raises(ValueError):
+            pD(fileName, activeModule='preprocessing', reader=reader)
+
+
+@pytest.mark.parametrize('fileName', ['../example/healthy.DAT', '../example/postStroke.CSV'])
+@pytest.mark.parametrize('chunkLength_s, overlap', [[60.0, 0.0], [37.3, 0.0], [60.0, 0.5], [25.0, 0.3], [1000.0, 0.0], [0.01, 0.0]])
+@pytest.mark.parametrize('chunkSize', [4194304, 5000])
+def test_iterChunks(fileName, chunkLength_s, overlap, chunkSize):
+    case = pD(fileName, activeModule='preprocessing')
+    data = np.vstack(channelData(case))
+    Fs = case.signals[0].samplingRate_Hz
+    nSamples = int(round(chunkLength_s * Fs))
+    hop = max(1, nSamples - int(round(overlap * nSamples)))
+
+    # the chunks are kept: later chunks must not overwrite them
+    chunks = list(dataReader.iterChunks(fileName, chunkLength_s, overlap, chunkSize))
+    for i, [tStart_s, chunk] in enumerate(chunks):
+        start = i * hop
+        assert tStart_s == start / Fs
+        assert chunk.shape[1] == min(nSamples, data.shape[1] - start)
+        assert np.array_equal(chunk, data[:, start:start + nSamples])
+
+    # all samples are covered, and the last chunk is not contained in the previous one
+    assert int(round(chunks[-1][0] * Fs)) + chunks[-1][1].shape[1] == data.shape[1]
+    if len(chunks) > 1:
+        assert chunks[-1][1].shape[1] > nSamples - hop
+    if overlap == 0.0:
+        assert np.array_equal(np.concatenate([chunk for [_, chunk] in chunks], axis=1), data)
+
+
+@pytest.mark.parametrize('chunkLength_s, overlap', [[0.0, 0.0], [10.0, 1.0], [10.0, -0.1]])
+def test_iterChunksInvalid(chunkLength_s, overlap):
+    with pytest.raises(ValueError):
+        list(dataReader.iterChunks('../example/healthy.DAT', chunkLength_s, overlap))
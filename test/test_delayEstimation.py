@@ -0,0 +1,58 @@
+import sys
+import numpy as np
+import pytest
+from scipy import ndimage
+from scipy import signal as scipySignal
+
+sys.path.append('../src/')
+import delayEstimation
+from signals import signal
+
+
+def randomWalk(nPoints, seed):
+    # signal with strong low frequencies: the unnormalized correlation is biased towards zero lag
+    return np.cumsum(np.random.default_rng(seed).standard_normal(nPoints))
+
+
+@pytest.mark.parametrize('nReference, nData', [[3000, 3000], [3000, 2500], [2000, 3100], [50, 40]])
+@pytest.mark.parametrize('minLag, maxLag', [[-20, 20], [5, 30], [-35, -10], [-60, 60]])
+def test_laggedCorrelation(nReference, nData, minLag, maxLag):
+    reference = randomWalk(nReference, 0)
+    data = randomWalk(nData, 1)
+    full = scipySignal.correlate(reference, data)
+    lags = np.arange(minLag, maxLag + 1)
+    inside = (lags + nData - 1 >= 0) & (lags + nData - 1 < len(full))
+    expected = np.zeros(len(lags))
+    expected[inside] = full[lags[inside] + nData - 1]
+    assert np.allclose(delayEstimation.laggedCorrelation(reference, data, minLag, maxLag), expected)
+
+
+@pytest.mark.parametrize('nReference, nData', [[3000, 3000], [3000, 2500], [2000, 3100]])
+def test_normalizedCorrelation(nReference, nData):
+    reference = randomWalk(nReference, 2)
+    data = randomWalk(nData, 3)
+    corr = delayEstimation.normalizedCorrelation(reference, data, -40, 40)
+    for i, k in enumerate(range(-40, 41)):
+        n = np.arange(max(0, -k), min(nData, nReference - k))
+        assert np.isclose(corr[i], np.corrcoef(reference[n + k], data[n])[0, 1])
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('decimationFactor', [1, 4])
+@pytest.mark.parametrize('shift, delay, tolerance', [[7, -7, 0.01], [-12, 12, 0.01], [3.4, -3.4, 0.1], [-5.25, 5.25, 0.1]])
+def test_estimateDelay(seed, decimationFactor, shift, delay, tolerance):
+    # data[n] = reference[n - shift]: the delay has the sign of the lag of scipy.signal.correlate(reference, data), -shift
+    reference = randomWalk(5000, seed)
+    data = ndimage.shift(reference, shift, order=3, mode='nearest')
+    assert abs(delayEstimation.estimateDelay(reference, data, 50, decimationFactor) - delay) < tolerance
+
+
+@pytest.mark.parametrize('shift', [0.3, 3.4, -2.75])
+def test_shiftFraction(shift):
+    # shiftFraction(-delay) aligns the signal with the reference
+    reference = np.sin(np.arange(2000) * 2 * np.pi / 97.0) + 0.3 * np.sin(np.arange(2000) * 2 * np.pi / 23.0)
+    s = signal(0, 'CBFV_L', 'cm/s', ndimage.shift(reference, shift, order=3, mode='nearest'), 100.0, None)
+    delay = delayEstimation.estimateDelay(reference, s.data, 20)
+    assert abs(delay + shift) < 0.1
+    s.shiftFraction(-delay)
+    assert np.max(np.abs(s.data - reference)[20:-20]) < 0.05
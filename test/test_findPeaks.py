@@ -0,0 +1,164 @@
+import sys
+import numpy as np
+import pytest
+
+sys.path.append('../src/')
+import ampdLib
+import peakDetection
+import tools
+from patientData import patientData as pD
+from signals import signal
+
+'''Sample by sample versions of the peak post-processing, used as reference'''
+
+
+def mergeClosePeaksLoop(peakIdx, minDistance):
+    temp = []
+    for i in range(len(peakIdx) - 1):
+        if peakIdx[i + 1] - peakIdx[i] > minDistance:
+            temp.append(peakIdx[i])
+        else:
+            temp.append(max(peakIdx[i], peakIdx[i + 1]))
+    return temp
+
+
+def backtrackValleysLoop(data, peakIdx, minProminence):
+    valleyIdx = []
+    for i in peakIdx:
+        cumulativeProminence = 0
+        idx = i
+        dx = data[idx] - data[idx - 1]
+        while idx >= 0 and (dx > 0 or cumulativeProminence < minProminence):
+            cumulativeProminence += dx
+            idx -= 1
+            dx = data[idx] - data[idx - 1]
+        valleyIdx.append(idx)
+    return valleyIdx
+
+
+def ampdMatrix(sigInput, LSMlimit=1):
+    # AMPD with the local scale-maxima matrix
+    sigTime = np.arange(0, len(sigInput))
+    dtrSignal = (sigInput - np.polyval(np.polyfit(sigTime, sigInput, 1), sigTime)).astype(float)
+
+    N = len(dtrSignal)
+    L = int(np.ceil(N * LSMlimit / 2.0)) - 1
+    LSM = np.ones([L, N], dtype='uint8')
+    for k in np.arange(1, L):
+        LSM[k - 1, np.where((dtrSignal[k:N - k - 1] > dtrSignal[0: N - 2 * k - 1]) & (dtrSignal[k:N - k - 1] > dtrSignal[2 * k: N - 1]))[0] + k] = 0
+
+    G = np.sum(LSM, 1)
+    l = np.where(G == G.min())[0][0]
+    return np.where(np.sum(LSM[0:l, :], 0) == 0)[0]
+
+
+@pytest.fixture(scope='module', params=['../example/healthy.DAT', '../example/postStroke.DAT'])
+def signals(request):
+    return pD(request.param, activeModule='preprocessing', useCache=False).signals
+
+
+def test_mergeClosePeaks(signals):
+    for s in signals:
+        peakIdx = peakDetection.ampdParallel(s.data, 10, LSMlimit=0.2, nWorkers=1)
+        for minDistance in [0, 5, int(60.0 / 250 * s.samplingRate_Hz), 100]:
+            assert np.array_equal(peakDetection.mergeClosePeaks(peakIdx, minDistance), mergeClosePeaksLoop(peakIdx, minDistance))
+
+
+def test_backtrackValleys(signals):
+    for s in signals:
+        [peakIdx, _, _, _] = s.findPeaks(method='md', findPeaks=True, findValleys=False)
+        peakIdx = np.concatenate((peakIdx, peakDetection.ampdParallel(s.data, 10, LSMlimit=0.2, nWorkers=1)))
+        span = np.percentile(s.data, 90.0) - np.percentile(s.data, 10.0)
+        for minProminence in [0.0, span * 0.1, span * 0.5]:
+            valleyIdx = peakDetection.backtrackValleys(s.data, peakIdx, minProminence)
+            assert np.array_equal(valleyIdx, backtrackValleysLoop(s.data, peakIdx, minProminence))
+
+
+def test_backtrackValleysTies():
+    # quantized signal: many drops are exactly equal to the minimum prominence
+    data = np.round(5 * np.sin(np.arange(2000) / 7.0) + np.random.RandomState(0).normal(size=2000)) * 0.1
+    peakIdx = np.arange(0, 2000, 3)
+    for minProminence in [0.1, 0.3, 0.7, 1.1]:
+        assert np.array_equal(peakDetection.backtrackValleys(data, peakIdx, minProminence), backtrackValleysLoop(data, peakIdx, minProminence))
+
+
+def test_findPeaks(signals):
+    s = [x for x in signals if x.label == 'ABP'][0]
+    [peakIdx, _, valleyIdx, _] = s.findPeaks(method='md', findPeaks=True, findValleys=True)
+    span = np.percentile(s.data, 90.0) - np.percentile(s.data, 10.0)
+    assert np.array_equal(valleyIdx, np.unique(backtrackValleysLoop(s.data, peakIdx, span * 0.5)))
+    assert np.all(np.diff(peakIdx) > 0)
+
+
+@pytest.mark.parametrize('LSMlimit', [1, 0.5, 0.2])
+def test_ampd(LSMlimit):
+    random = np.random.RandomState(0)
+    for i in range(100):
+        N = random.randint(20, 600)
+        t = np.arange(N)
+        kind = i % 3
+        if kind == 0:
+            sigInput = random.normal(size=N)
+        elif kind == 1:
+            sigInput = np.sin(2 * np.pi * t / random.uniform(5, 60)) + 0.3 * random.normal(size=N) + random.uniform(-0.01, 0.01) * t
+        else:
+            sigInput = np.round(3 * np.sin(2 * np.pi * t / random.uniform(5, 60)) + random.normal(size=N))  # quantized: plateaus and ties
+        assert np.array_equal(ampdLib.ampd(sigInput, LSMlimit), ampdMatrix(sigInput, LSMlimit))
+
+
+def test_ampdSignals(signals):
+    for s in signals:
+        assert np.array_equal(ampdLib.ampd(s.data[:3000], 0.2), ampdMatrix(s.data[:3000], 0.2))
+
+
+def detectPeaksSignals():
+    # noise, quantized signals (plateaus and peaks with the same height) and signals with NaN
+    random = np.random.RandomState(1)
+    signals = []
+    for i in range(12):
+        x = np.cumsum(random.normal(size=random.randint(50, 400)))
+        if i % 3 == 1:
+            x = np.round(x)
+        if i % 3 == 2:
+            x[random.randint(0, len(x), size=len(x) // 20)] = np.nan
+        signals.append(x)
+    return signals
+
+
+@pytest.mark.parametrize('edge', ['rising', 'falling', 'both', None])
+@pytest.mark.parametrize('valley', [False, True])
+@pytest.mark.parametrize('kpsh', [False, True])
+@pytest.mark.parametrize('mpd', [1, 4, 15])
+@pytest.mark.parametrize('threshold, mph', [(0, None), (0.5, None), (0, 0.0)])
+@pytest.mark.parametrize('MinPeakProminence, MinPeakProminenceSide', [(0, 'both'), (2.0, 'both'), (2.0, 'left'), (2.0, 'right')])
+def test_detectPeaksFast(edge, valley, kpsh, mpd, threshold, mph, MinPeakProminence, MinPeakProminenceSide):
+    for x in detectPeaksSignals():
+        kwargs = dict(mph=mph, mpd=mpd, threshold=threshold, edge=edge, kpsh=kpsh, MinPeakProminence=MinPeakProminence,
+                      MinPeakProminenceSide=MinPeakProminenceSide, valley=valley)
+        assert np.array_equal(tools.detect_peaks(x, fast=True, **kwargs), tools.detect_peaks(x, fast=False, **kwargs))
+
+
+@pytest.mark.parametrize('method', ['ampd', 'md'])
+@pytest.mark.parametrize('decimationFactor', [2, 4])
+def test_findPeaksDecimated(signals, method, decimationFactor):
+    s = [x for x in signals if x.label == 'ABP'][0]
+    [peakIdx, _, _, _] = s.findPeaks(method=method, findPeaks=True, findValleys=False)
+    [refinedIdx, _, _, _] = s.findPeaks(method=method, findPeaks=True, findValleys=False, decimationFactor=decimationFactor)
+
+    # peaks of the same beat are at most decimationFactor samples apart, or have the same height (flat peaks). A few beats may be detected
+    # only at one of the rates
+    nearest = peakIdx[np.argmin(np.abs(refinedIdx[:, np.newaxis] - peakIdx[np.newaxis, :]), axis=1)]
+    distance = np.abs(refinedIdx - nearest)
+    sameBeat = distance < int(60.0 / 250 * s.samplingRate_Hz) // 2
+    assert np.all((distance[sameBeat] <= decimationFactor) | (s.data[refinedIdx[sameBeat]] == s.data[nearest[sameBeat]]))
+    assert np.count_nonzero(~sameBeat) <= 0.02 * len(peakIdx)
+    assert abs(len(refinedIdx) - len(peakIdx)) <= 0.02 * len(peakIdx)
+
+
+def test_findPeaksDecimatedShortSignal():
+    # signals shorter than the refinement window are processed at the full rate
+    s = signal(0, 'ABP', 'mmHg', np.array([0, 3, 1, 0, 4, 1, 0, 5.0]), 100.0, None)
+    [peakIdx, _, valleyIdx, _] = s.findPeaks(method='md', findPeaks=True, findValleys=True)
+    [refinedIdx, _, refinedValleyIdx, _] = s.findPeaks(method='md', findPeaks=True, findValleys=True, decimationFactor=4)
+    assert np.array_equal(refinedIdx, peakIdx)
+    assert np.array_equal(refinedValleyIdx, valleyIdx)
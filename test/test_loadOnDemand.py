@@ -0,0 +1,82 @@
+import sys
+import numpy as np
+import pytest
+
+sys.path.append('../src/')
+from patientData import patientData as pD
+
+
+def runOperations(case, ABPchannel):
+    case.signals[ABPchannel].setType('ABP', register=False)
+    case.resampleSignals(50.0, 'linear', register=False)
+    case.cropInterval(1000, 2000, register=False)
+    case.synchronizeSignals([0, 1, ABPchannel], method='lagCorrelation', maxLag_s=0.3, register=False)
+    case.findRRmarks(ABPchannel, method='ampd', findPeaks=True, findValleys=True, register=False)
+    case.getBeat2beat(resampleRate_Hz=5.0, register=False)
+    case.insertPeak(int(case.peakIdx[10] + 20), isPeak=True, register=False)
+    case.LPfilterBeat2beat('movingAverage', 3, register=False)
+
+
+def assertSameSignals(case, reference):
+    assert np.array_equal(case.peakIdx, reference.peakIdx)
+    assert np.array_equal(case.valleyIdx, reference.valleyIdx)
+    for s, r in zip(case.signals, reference.signals):
+        assert s.nPoints == r.nPoints
+        assert np.array_equal(s.data, r.data)
+        for name in ['xData', 'max', 'min', 'avg', 'features']:
+            assert np.array_equal(getattr(s.beat2beatData, name), getattr(r.beat2beatData, name))
+
+
+@pytest.mark.parametrize('fileName', ['../example/healthy.DAT', '../example/postStroke.CSV'])
+@pytest.mark.parametrize('channels', [[0], ['ABP'], [0, 3]])
+def test_loadOnDemand(fileName, channels):
+    # channels not selected are loaded on first access, after replaying the operations applied to them
+    reference = pD(fileName, activeModule='preprocessing')
+    ABPchannel = [s.label for s in reference.signals].index('ABP')
+    runOperations(reference, ABPchannel)
+
+    case = pD(fileName, activeModule='preprocessing', channels=channels)
+    assert not all([s.isLoaded() for s in case.signals])
+    runOperations(case, ABPchannel)
+    assertSameSignals(case, reference)
+
+
+def test_pendingBeat2beat():
+    # beat to beat data of a channel not loaded yet is computed on first access
+    case = pD('../example/healthy.DAT', activeModule='preprocessing', channels=['ABP'])
+    ABPchannel = [s.label for s in case.signals].index('ABP')
+    case.cropInterval(1000, 2000, register=False)
+    case.findRRmarks(ABPchannel, method='ampd', findPeaks=True, findValleys=False, register=False)
+    case.getBeat2beat(resampleRate_Hz=5.0, register=False)
+    assert not case.signals[0].isLoaded()
+    assert case.signals[0].beat2beatData.nPoints > 0
+    assert case.signals[0].isLoaded()
+
+    # missing beat to beat data and other missing attributes raise AttributeError
+    case.removeBeat2beat()
+    assert not hasattr(case.signals[1], 'beat2beatData')
+    assert not hasattr(case.signals[1], 'notAnAttribute')
+
+
+def test_loadError():
+    case = pD('../example/healthy.DAT', activeModule='preprocessing', channels=[0])
+    case.signals[1]._dataLoader = lambda: None
+    with pytest.raises(IOError):
+        case.signals[1].data
+
+
+@pytest.mark.parametrize('method', ['linear', 'polyphase'])
+def test_pendingResample(method):
+    # channels not loaded yet are resampled when loaded. The number of samples is known before
+    reference = pD('../example/healthy.DAT', activeModule='preprocessing')
+    case = pD('../example/healthy.DAT', activeModule='preprocessing', channels=[0])
+    for x in [reference, case]:
+        x.resampleSignals(40.0, method, register=False)
+        x.cropInterval(x.signals[0].nPoints - 100, x.signals[0].nPoints - 1, register=False)
+        x.resampleSignals(25.0, method, channelList=[1, 2], register=False)
+
+    assert [s.isLoaded() for s in case.signals] == [True, False, False, False]
+    for s, r in zip(case.signals, reference.signals):
+        assert [s.nPoints, s.samplingRate_Hz] == [r.nPoints, r.samplingRate_Hz]
+        assert np.array_equal(s.data, r.data)
+        assert s.nPoints == len(s.data)
@@ -0,0 +1,159 @@
+import sys
+import numpy as np
+import pytest
+from lxml import etree as ETree
+
+sys.path.append('../src/')
+import operationsCompiler
+import tools
+from patientData import patientData as pD
+
+
+def compile(text, section='preprocessing'):
+    return operationsCompiler.compileOperation(ETree.fromstring(text), section)
+
+
+def test_typeConversion():
+    op = compile('<resample><sampleRate>50</sampleRate><method>linear</method><channel>1</channel></resample>')
+    assert [op.section, op.tag] == ['preprocessing', 'resample']
+    assert op.params == {'sampleRate': 50.0, 'method': 'linear', 'channel': 1}
+    assert [type(op.params[x]) for x in ['sampleRate', 'method', 'channel']] == [float, str, int]
+
+    op = compile('<cropInterval><frameStart>10</frameStart><frameEnd>20</frameEnd><RemoveSegment>False</RemoveSegment>'
+                 '<segmentIndexes>[1 2 30]</segmentIndexes><channel>0</channel></cropInterval>')
+    assert op.params == {'frameStart': 10, 'frameEnd': 20, 'RemoveSegment': False, 'segmentIndexes': [1, 2, 30], 'channel': 0}
+
+    # optional fields are None. Only the first occurrence of each field is used, like tools.getElemValueXpath
+    op = compile('<findRRmarks><refChannel>2</refChannel><refChannel>3</refChannel><method>ampd</method><findPeaks>True</findPeaks>'
+                 '<findValleys>false</findValleys></findRRmarks>')
+    assert op.params == {'refChannel': 2, 'method': 'ampd', 'findPeaks': True, 'findValleys': False, 'decimationFactor': None}
+
+    op = compile('<PSDwelch><useB2B>True</useB2B><overlap>0.5</overlap><segmentLength_s>102.4</segmentLength_s><windowType>hanning</windowType>'
+                 '<detrend>False</detrend><filterType>None</filterType></PSDwelch>', 'ARanalysis')
+    assert op.params['filterType'] is None and op.params['nTapsFilter'] is None
+    assert compile('<ARI/>', 'ARanalysis').params == {}
+
+
+@pytest.mark.parametrize('text', ['<notAnOperation><channel>1</channel></notAnOperation>',
+                                  '<resample><sampleRate>50</sampleRate><method>linear</method></resample>',
+                                  '<resample><sampleRate>fast</sampleRate><method>linear</method><channel>1</channel></resample>',
+                                  '<setType><type>ABP</type><channel>1.5</channel></setType>'])
+def test_invalidOperation(text):
+    # like tools.getElemValueXpath, the program exits
+    with pytest.raises(SystemExit):
+        compile(text)
+
+
+@pytest.mark.parametrize('text, isValid', [
+    ['<synchronize><method>correlation</method><channels>[0 1 2]</channels></synchronize>', True],
+    ['<synchronize><method>correlation</method></synchronize>', False],
+    ['<synchronize><method>lagCorrelation</method><channels>[0 1 2]</channels><maxLag_s>0.5</maxLag_s></synchronize>', True],
+    ['<synchronize><method>lagCorrelation</method><channels>[0 1 2]</channels></synchronize>', False],
+    ['<synchronize><method>fixedAPB</method><ABPdelay_s>0.2</ABPdelay_s></synchronize>', True],
+    ['<synchronize><method>fixedAPB</method><channels>[0 1 2]</channels></synchronize>', False],
+    ['<LPfilter><method>movingAverage</method><channel>0</channel><Ntaps>5</Ntaps></LPfilter>', True],
+    ['<LPfilter><method>median</method><channel>0</channel><order>5</order></LPfilter>', False],
+    ['<LPfilter><method>butterworth</method><channel>0</channel><order>4</order></LPfilter>', True],
+    ['<LPfilter><method>butterworth</method><channel>0</channel><Ntaps>4</Ntaps></LPfilter>', False]])
+def test_conditionalFields(text, isValid):
+    # fields required only for some values of another field
+    if isValid:
+        compile(text)
+    else:
+        with pytest.raises(SystemExit):
+            compile(text)
+
+
+@pytest.mark.parametrize('filterType, isValid', [['rect', False], ['triangular', False], ['None', True]])
+def test_conditionalFieldsAR(filterType, isValid):
+    text = ('<PSDwelch><useB2B>True</useB2B><overlap>0.5</overlap><segmentLength_s>102.4</segmentLength_s><windowType>hanning</windowType>'
+            '<detrend>False</detrend><filterType>%s</filterType></PSDwelch>' % filterType)
+    if isValid:
+        compile(text, 'ARanalysis')
+    else:
+        with pytest.raises(SystemExit):
+            compile(text, 'ARanalysis')
+
+
+def legacyReplay(case, operationsElem):
+    # operations executed as they were before the operations compiler: each field read with tools.getElemValueXpath
+    value = lambda elem, field, valType: tools.getElemValueXpath(elem, xpath=field, valType=valType)
+    for elem in operationsElem:
+        if elem.tag == 'setType':
+            case.signals[value(elem, 'channel', 'int')].setType(value(elem, 'type', 'str'), register=False)
+        if elem.tag == 'setLabel':
+            case.signals[value(elem, 'channel', 'int')].setLabel(value(elem, 'label', 'str'), register=False)
+        if elem.tag == 'resample':
+            case.signals[value(elem, 'channel', 'int')].resample(value(elem, 'sampleRate', 'float'), value(elem, 'method', 'str'), register=False)
+        if elem.tag == 'calibrate':
+            case.signals[value(elem, 'channel', 'int')].calibrate(value(elem, 'valMax', 'float'), value(elem, 'valMin', 'float'),
+                                                                  value(elem, 'method', 'str'), value(elem, 'segmentIndexes', 'list_int'),
+                                                                  register=False)
+        if elem.tag == 'synchronize':
+            case.synchronizeSignals(value(elem, 'channels', 'list_int'), value(elem, 'method', 'str'), ABPdelay_s=None, register=False)
+        if elem.tag == 'LPfilter':
+            case.signals[value(elem, 'channel', 'int')].LPfilter(value(elem, 'method', 'str'), nTaps=value(elem, 'Ntaps', 'int'), order=None,
+                                                                 register=False)
+        if elem.tag == 'interpolate':
+            case.signals[value(elem, 'channel', 'int')].interpolate(value(elem, 'frameStart', 'int'), value(elem, 'frameEnd', 'int'),
+                                                                    value(elem, 'method', 'str'), register=False)
+        if elem.tag == 'cropInterval':
+            case.signals[value(elem, 'channel', 'int')].cropInterval(value(elem, 'frameStart', 'int'), value(elem, 'frameEnd', 'int'), False,
+                                                                     value(elem, 'RemoveSegment', 'bool'), value(elem, 'segmentIndexes', 'list_int'))
+        if elem.tag == 'findRRmarks':
+            case.findRRmarks(value(elem, 'refChannel', 'int'), value(elem, 'method', 'str'), value(elem, 'findPeaks', 'bool'),
+                             value(elem, 'findValleys', 'bool'), register=False)
+        if elem.tag == 'insertPeak':
+            case.insertPeak(value(elem, 'newIdx', 'int'), value(elem, 'isPeak', 'bool'), register=False)
+        if elem.tag == 'B2Bcalc':
+            case.getBeat2beat(value(elem, 'resampleRate_Hz', 'float'), value(elem, 'resampleMethod', 'str'), register=False)
+        if elem.tag == 'B2B_LPfilter':
+            case.LPfilterBeat2beat(value(elem, 'method', 'str'), value(elem, 'Ntaps', 'int'), register=False)
+
+
+@pytest.mark.parametrize('fileName', ['../example/healthy.DAT', '../example/postStroke.DAT'])
+def test_compiledReplay(fileName):
+    # operations registered interactively, then replayed from the compiled plan and as before the compiler
+    case = pD(fileName, activeModule='preprocessing')
+    ABPchannel = [s.label for s in case.signals].index('ABP')
+    case.signals[ABPchannel].setType('ABP')
+    case.signals[0].setLabel('left')
+    for s in case.signals:
+        s.resample(50.0, 'linear')
+    case.synchronizeSignals([0, 1, ABPchannel], method='correlation')
+    case.signals[ABPchannel].calibrate(120.0, 80.0, 'percentile', [0, 5000])
+    case.signals[1].LPfilter('movingAverage', nTaps=5)
+    for s in case.signals:
+        s.interpolate(1000, 1100, 'linear')
+        s.cropInterval(3000, 4000, True)
+    case.findRRmarks(ABPchannel, method='ampd', findPeaks=True, findValleys=False)
+    case.insertPeak(int(case.peakIdx[20] + 15), isPeak=True)
+    case.getBeat2beat(resampleRate_Hz=5.0, resampleMethod='linear')
+    case.LPfilterBeat2beat('movingAverage', 3)
+
+    plan = operationsCompiler.compileOperations(case.PPoperationsNode, 'preprocessing')
+    assert len(plan) == len(case.PPoperationsNode)
+    compiled = pD(fileName, activeModule='preprocessing')
+    compiled.runOperationsPlan(plan)
+    legacy = pD(fileName, activeModule='preprocessing')
+    legacyReplay(legacy, case.PPoperationsNode)
+
+    for replay in [compiled, legacy]:
+        assert np.array_equal(replay.peakIdx, case.peakIdx)
+        for s, r in zip(case.signals, replay.signals):
+            assert [s.label, s.sigType, s.samplingRate_Hz, s.nPoints] == [r.label, r.sigType, r.samplingRate_Hz, r.nPoints]
+            assert np.array_equal(s.data, r.data)
+            for name in ['xData', 'max', 'min', 'avg']:
+                assert np.array_equal(getattr(s.beat2beatData, name), getattr(r.beat2beatData, name))
+
+
+def test_compileOperationsFile(tmp_path):
+    fileName = str(tmp_path / 'ops.job')
+    with open(fileName, 'w') as file:
+        file.write('<job><operations><preprocessing><setType><type>ABP</type><channel>2</channel></setType></preprocessing>'
+                   '<ARanalysis><ARI/></ARanalysis></operations>'
+                   '<operations><preprocessing><!-- comment --><setUnit><unit>mmHg</unit><channel>2</channel></setUnit></preprocessing></operations>'
+                   '</job>')
+    plan = operationsCompiler.compileOperationsFile(fileName)
+    assert [[op.section, op.tag] for op in plan] == [['preprocessing', 'setType'], ['preprocessing', 'setUnit'], ['ARanalysis', 'ARI']]
+    assert plan[0].copy(channel=3).params == {'type': 'ABP', 'channel': 3} and plan[0].params['channel'] == 2
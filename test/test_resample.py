@@ -0,0 +1,97 @@
+import sys
+import numpy as np
+import pytest
+from lxml import etree as ETree
+
+sys.path.append('../src/')
+import operationsCompiler
+import signals
+from patientData import patientData as pD
+
+
+@pytest.mark.parametrize('samplingRate_Hz, newSampleRate', [[100.0, 50.0], [100.0, 40.0], [100.0, 250.0], [100.0, 7.0], [250.0, 100.0],
+                                                            [100.0, 100.0 * np.pi / 3]])
+@pytest.mark.parametrize('nPoints', [1000, 1001, 30334])
+def test_resampledLength(samplingRate_Hz, newSampleRate, nPoints):
+    # all methods have the samples at the times 0, 1/newSampleRate... before the last sample
+    data = np.random.default_rng(0).standard_normal((2, nPoints))
+    expected = len(np.arange(0.0, (nPoints - 1) / samplingRate_Hz, 1.0 / newSampleRate))
+    for method in ['polyphase', 'linear', 'cubic']:
+        newData = signals.resampleArray(data, samplingRate_Hz, newSampleRate, method)
+        assert newData.shape == (2, expected)
+        assert signals.resampledLength(nPoints, samplingRate_Hz, newSampleRate, method) == expected
+
+    # 1D and 2D inputs give the same result
+    for method in ['polyphase', 'linear']:
+        assert np.allclose(signals.resampleArray(data[1], samplingRate_Hz, newSampleRate, method),
+                           signals.resampleArray(data, samplingRate_Hz, newSampleRate, method)[1], rtol=0, atol=1e-12)
+
+
+def test_polyphaseFactors():
+    assert signals.polyphaseFactors(100.0, 50.0) == [1, 2]
+    assert signals.polyphaseFactors(100.0, 250.0) == [5, 2]
+    assert signals.polyphaseFactors(100.0, 33.0) == [33, 100]
+    assert signals.polyphaseFactors(125.0, 100.0) == [4, 5]
+
+    # ratios that are not simple fractions fall back to cubic interpolation
+    for newSampleRate in [100.0 * np.pi / 3, 99.9871]:
+        assert signals.polyphaseFactors(100.0, newSampleRate) is None
+        data = np.sin(np.arange(1000) / 10.0)
+        assert np.array_equal(signals.resampleArray(data, 100.0, newSampleRate, 'polyphase'), signals.resampleArray(data, 100.0, newSampleRate, 'cubic'))
+
+
+def test_antiAliasing():
+    # 40Hz is above the Nyquist frequency of 50Hz: interpolation folds it to 10Hz, the polyphase filter removes it
+    t = np.arange(6000) / 100.0
+    slow = np.sin(2 * np.pi * 2.0 * t)
+    data = slow + np.sin(2 * np.pi * 40.0 * t)
+
+    margin = 100
+    error = {}
+    for method in ['polyphase', 'linear']:
+        newData = signals.resampleArray(data, 100.0, 50.0, method)
+        expected = np.sin(2 * np.pi * 2.0 * np.arange(len(newData)) / 50.0)
+        error[method] = np.sqrt(np.mean((newData - expected)[margin:-margin] ** 2))
+    assert error['polyphase'] < 0.01
+    assert error['linear'] > 0.5
+
+
+def resamplePlan(operations):
+    root = ETree.fromstring('<preprocessing>' + ''.join(['<resample><sampleRate>%g</sampleRate><method>%s</method><channel>%d</channel></resample>'
+                                                         % tuple(op) for op in operations]) + '<findRRmarks><refChannel>2</refChannel><method>ampd</method>'
+                            '<findPeaks>True</findPeaks><findValleys>False</findValleys></findRRmarks></preprocessing>')
+    return operationsCompiler.compileOperations(root, 'preprocessing')
+
+
+def test_resampleSteps():
+    case = pD('../example/healthy.DAT', activeModule='preprocessing')
+    plan = resamplePlan([[50, 'linear', 0], [50, 'linear', 1], [50, 'linear', 2], [50, 'polyphase', 3], [25, 'polyphase', 3], [50, 'linear', 1],
+                         [50, 'linear', 1]])
+    assert case._planSteps(plan) == [[0, 2], [3, 3], [4, 4], [5, 5], [6, 6], [7, 7]]
+    assert case._planSteps(plan, 1) == [[1, 2], [3, 3], [4, 4], [5, 5], [6, 6], [7, 7]]
+
+
+@pytest.mark.parametrize('method', ['linear', 'polyphase'])
+@pytest.mark.parametrize('channels', [None, [0]])
+def test_runResamplePlan(method, channels):
+    # consecutive resample operations are executed together by resampleSignals, with the same result of resampling each channel
+    plan = resamplePlan([[40, method, ch] for ch in range(4)] + [[20, method, 3]])
+
+    reference = pD('../example/healthy.DAT', activeModule='preprocessing')
+    for op in plan[:-1]:
+        reference.signals[op.params['channel']].resample(op.params['sampleRate'], op.params['method'], register=False)
+    reference.findRRmarks(2, register=False)
+
+    case = pD('../example/healthy.DAT', activeModule='preprocessing', channels=channels)
+    calls = []
+    resampleSignals = case.resampleSignals
+    case.resampleSignals = lambda *args, **kwargs: calls.append(args[2]) or resampleSignals(*args, **kwargs)
+    case.runOperationsPlan(plan)
+    assert calls == [[0, 1, 2, 3], [3]]
+
+    if channels is not None:
+        assert not case.signals[1].isLoaded()
+    for s, r in zip(case.signals, reference.signals):
+        assert [s.nPoints, s.samplingRate_Hz] == [r.nPoints, r.samplingRate_Hz]
+        assert np.allclose(s.data, r.data, rtol=0, atol=1e-10)
+    assert np.array_equal(case.peakIdx, reference.peakIdx)
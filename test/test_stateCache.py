@@ -0,0 +1,137 @@
+import sys
+import numpy as np
+import pytest
+
+sys.path.append('../src/')
+import operationsCompiler
+import stateCache
+from patientData import patientData as pD
+
+OPERATIONS = '''<preprocessing>
+  <setType><type>ABP</type><channel>2</channel></setType>
+  <resample><sampleRate>50.0</sampleRate><method>linear</method><channel>0</channel></resample>
+  <resample><sampleRate>50.0</sampleRate><method>linear</method><channel>1</channel></resample>
+  <resample><sampleRate>50.0</sampleRate><method>linear</method><channel>2</channel></resample>
+  <resample><sampleRate>50.0</sampleRate><method>linear</method><channel>3</channel></resample>
+  <findRRmarks><refChannel>2</refChannel><method>ampd</method><findPeaks>True</findPeaks><findValleys>True</findValleys></findRRmarks>
+  <B2Bcalc><resampleMethod>linear</resampleMethod><resampleRate_Hz>5.0</resampleRate_Hz></B2Bcalc>
+</preprocessing>
+'''
+FILTER = '<preprocessing><B2B_LPfilter><method>movingAverage</method><Ntaps>3</Ntaps></B2B_LPfilter></preprocessing>'
+
+
+def compilePlan(text):
+    from lxml import etree as ETree
+    return operationsCompiler.compileOperations(ETree.fromstring(text), 'preprocessing')
+
+
+def runPlan(plan, cache, calls):
+    # counts the calls of each operation
+    case = pD('../example/healthy.DAT', activeModule='preprocessing', stateCache=cache)
+    handlers = case._operationHandlers()
+    for tag in ['findRRmarks', 'B2Bcalc', 'B2B_LPfilter']:
+        handler = handlers[tag]
+        def counted(handler=handler, tag=tag, **params):
+            calls.append(tag)
+            handler(**params)
+        handlers[tag] = counted
+    case._operationHandlers = lambda: handlers
+    case.runOperationsPlan(plan, case.getStateKey())
+    return case
+
+
+def assertSameState(case, reference):
+    assert np.array_equal(case.peakIdx, reference.peakIdx)
+    assert np.array_equal(case.valleyIdx, reference.valleyIdx)
+    for s, r in zip(case.signals, reference.signals):
+        assert [s.sigType, s.samplingRate_Hz] == [r.sigType, r.samplingRate_Hz]
+        assert np.array_equal(s.data, r.data)
+        assert np.array_equal(s.beat2beatData.avg, r.beat2beatData.avg)
+
+
+@pytest.mark.parametrize('onDisk', [False, True])
+def test_resume(onDisk, tmp_path):
+    plan = compilePlan(OPERATIONS)
+    reference = runPlan(plan, None, [])
+
+    # first run stores the states, the second one is a cache hit: no operation is run again
+    cacheDir = str(tmp_path) if onDisk else None
+    cache = stateCache.stateCache(cacheDir=cacheDir)
+    calls = []
+    assertSameState(runPlan(plan, cache, calls), reference)
+    assert calls == ['findRRmarks', 'B2Bcalc']
+    if onDisk:
+        cache = stateCache.stateCache(cacheDir=cacheDir)  # new process: states loaded from disk
+    calls = []
+    case = runPlan(plan, cache, calls)
+    assert calls == []
+    assertSameState(case, reference)
+
+    # longer plan: resumes from the longest cached prefix
+    calls = []
+    longer = runPlan(plan + compilePlan(FILTER), cache, calls)
+    assert calls == ['B2B_LPfilter']
+    reference.LPfilterBeat2beat('movingAverage', 3, register=False)
+    assertSameState(longer, reference)
+
+    # states of the shorter plan are not changed by the operations of the longer one
+    assertSameState(runPlan(plan, cache, []), runPlan(plan, None, []))
+
+
+def test_readOnlyArrays():
+    # arrays shared with the cache are read-only. The operations assign new arrays
+    cache = stateCache.stateCache()
+    case = runPlan(compilePlan(OPERATIONS), cache, [])
+    for array in [case.signals[0].data, case.peakIdx, case.signals[2].beat2beatData.avg]:
+        assert not array.flags.writeable
+    with pytest.raises(ValueError):
+        case.signals[0].data[10] = 0.0
+
+    [stored] = [state for [state, _] in cache.memory.values()][-1:]
+    original = stored['signals'][2].data.copy()
+    case.insertPeak(int(case.peakIdx[5] + 10), isPeak=True, register=False)
+    case.signals[2].interpolate(100, 200, register=False)
+    case.signals[2].LPfilter('movingAverage', nTaps=5, register=False)
+    case.LPfilterBeat2beat('movingAverage', 3, register=False)
+    assert np.array_equal(stored['signals'][2].data, original)
+
+
+def test_evictionCount():
+    cache = stateCache.stateCache(maxMemoryStates=2)
+    for key in ['a', 'b', 'c']:
+        cache.store(key, {'peakIdx': np.arange(10)})
+    assert list(cache.memory) == ['b', 'c']
+    assert cache.load('a') is None
+
+    # loading a state makes it the most recently used
+    assert np.array_equal(cache.load('b')['peakIdx'], np.arange(10))
+    cache.store('d', {'peakIdx': np.arange(10)})
+    assert list(cache.memory) == ['b', 'd']
+
+
+def test_evictionBytes():
+    cache = stateCache.stateCache(maxMemoryBytes=2500)
+    for key in ['a', 'b', 'c']:
+        cache.store(key, {'peakIdx': np.arange(100, dtype=np.float64)})  # 800 bytes each
+    assert list(cache.memory) == ['a', 'b', 'c']
+    cache.store('d', {'peakIdx': np.arange(100, dtype=np.float64)})
+    assert list(cache.memory) == ['b', 'c', 'd']
+
+    # the most recent state is always kept
+    cache.store('e', {'peakIdx': np.arange(1000, dtype=np.float64)})
+    assert list(cache.memory) == ['e']
+    assert cache.memory['e'][1] == 8000
+
+
+def test_evictionDisk(tmp_path):
+    # states removed from memory are loaded from disk
+    cache = stateCache.stateCache(cacheDir=str(tmp_path), maxMemoryStates=1)
+    cache.store('a', {'peakIdx': np.arange(10)})
+    cache.store('b', {'peakIdx': np.arange(5)})
+    assert list(cache.memory) == ['b']
+    assert cache.has('a')
+    assert np.array_equal(cache.load('a')['peakIdx'], np.arange(10))
+    assert list(cache.memory) == ['a']
+
+    cache.clear()
+    assert not cache.has('a') and not cache.has('b')
@@ -0,0 +1,57 @@
+import sys
+import numpy as np
+import pytest
+
+sys.path.append('../src/')
+import streamingDetector
+from patientData import patientData as pD
+
+
+@pytest.fixture(scope='module')
+def ABPsignal():
+    signals = pD('../example/healthy.DAT', activeModule='preprocessing', useCache=False).signals
+    return [x for x in signals if x.label == 'ABP'][0]
+
+
+def replay(signal, blockLengths):
+    # send the signal to the detector in blocks, as if received from a monitor
+    detector = streamingDetector.streamingBeatDetector(signal.samplingRate_Hz)
+    peakIdx = []
+    valleyIdx = []
+    maxBuffer = 0
+    start = 0
+    for length in blockLengths:
+        if start >= signal.nPoints:
+            break
+        [peaks, valleys] = detector.update(signal.data[start:start + length])
+        peakIdx += list(peaks)
+        valleyIdx += list(valleys)
+        maxBuffer = max(maxBuffer, len(detector.buffer))
+        start += length
+
+    [peaks, valleys] = detector.flush()
+    return [np.array(peakIdx + list(peaks)), np.array(valleyIdx + list(valleys)), maxBuffer, detector]
+
+
+@pytest.mark.parametrize('blockLengths', [[100] * 400, [7] * 5000, np.random.RandomState(0).randint(1, 300, size=400)])
+def test_streamingMatchesOffline(ABPsignal, blockLengths):
+    [peakIdx, _, valleyIdx, _] = ABPsignal.findPeaks(method='md', findPeaks=True, findValleys=True)
+    [streamPeaks, streamValleys, maxBuffer, detector] = replay(ABPsignal, blockLengths)
+
+    assert np.array_equal(streamPeaks, peakIdx)
+
+    # valleys: lowest sample between beats, instead of the backtracking of the offline method
+    assert len(streamValleys) == len(valleyIdx)
+    assert np.max(np.abs(streamValleys - valleyIdx)) <= 3
+    assert np.all(streamValleys < streamPeaks)
+
+    # bounded state
+    assert maxBuffer <= 2 * detector.historyLength + max(blockLengths)
+
+
+def test_streamingLatency(ABPsignal):
+    # sample by sample: each peak is reported as soon as the samples after it are available
+    detector = streamingDetector.streamingBeatDetector(ABPsignal.samplingRate_Hz)
+    for i in range(3000):
+        [peaks, _] = detector.update(ABPsignal.data[i:i + 1])
+        assert np.all(i - peaks == detector.latency)
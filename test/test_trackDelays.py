@@ -0,0 +1,65 @@
+import sys
+import numpy as np
+import pytest
+from scipy import ndimage
+
+sys.path.append('../src/')
+import delayEstimation
+from patientData import patientData as pD
+
+
+def driftingCase(firstDelay_s, lastDelay_s, trend=0.0):
+    # channel 0 is the ABP channel ahead by a delay that changes linearly along the recording: data[n] = ABP[n + delay(n)]. A linear trend of
+    # amplitude `trend` is added to the ABP channel
+    case = pD('../example/healthy.DAT', activeModule='preprocessing', useCache=False)
+    ABP = [s for s in case.signals if s.label == 'ABP'][0]
+    ABP.setType('ABP')
+    ABP.data = ABP.data + np.linspace(0.0, trend, ABP.nPoints)
+    Fs = ABP.samplingRate_Hz
+    n = np.arange(ABP.nPoints)
+    delay = np.linspace(firstDelay_s, lastDelay_s, ABP.nPoints) * Fs
+    case.signals[0].data = ndimage.map_coordinates(ABP.data, [n + delay], order=3, mode='nearest')
+    return [case, ABP, lambda time_s: np.interp(time_s * Fs, n, delay) / Fs]
+
+
+@pytest.mark.parametrize('firstDelay_s, lastDelay_s', [[0.05, 0.2], [-0.1, 0.1], [0.0, -0.25]])
+def test_trackDelays(firstDelay_s, lastDelay_s):
+    [case, ABP, trueDelay_s] = driftingCase(firstDelay_s, lastDelay_s)
+    case.trackDelays([0, 3], windowLength_s=30.0, step_s=5.0, maxLag_s=0.5, warp=False, register=False)
+
+    # a positive delay means the channel is ahead of the ABP channel
+    [time_s, delay_s] = case.delayTracks[0]
+    assert np.max(np.abs(delay_s - trueDelay_s(time_s))) < 0.25 / ABP.samplingRate_Hz
+    assert np.array_equal(np.sign(np.round(delay_s, 2)), np.sign(np.round(trueDelay_s(time_s), 2)))
+    assert case.delayTracks[3].shape == case.delayTracks[0].shape
+
+
+@pytest.mark.parametrize('trend', [200.0, -500.0])
+def test_trackDelaysTrend(trend):
+    # the coefficient of each window is normalized by the mean and energy of the overlap: a trend does not bias the delays
+    [case, ABP, _] = driftingCase(-0.12, -0.12, trend)
+    [_, delay] = delayEstimation.delayTrack(ABP.data, case.signals[0].data, 3000, 500, 50)
+    assert np.isclose(delayEstimation.estimateDelay(ABP.data, case.signals[0].data, 50), -12.0, rtol=0, atol=1e-3)
+    assert np.max(np.abs(delay + 12.0)) < 0.01
+
+    # drifting delay
+    [case, ABP, trueDelay_s] = driftingCase(0.05, 0.2, trend)
+    case.trackDelays([0], windowLength_s=30.0, step_s=5.0, maxLag_s=0.5, warp=False, register=False)
+    [time_s, delay_s] = case.delayTracks[0]
+    assert np.max(np.abs(delay_s - trueDelay_s(time_s))) < 0.25 / ABP.samplingRate_Hz
+
+
+@pytest.mark.parametrize('firstDelay_s, lastDelay_s', [[0.05, 0.2], [0.0, -0.25]])
+def test_trackDelaysWarp(firstDelay_s, lastDelay_s):
+    # after the warp, the channel is aligned with the ABP channel
+    [case, ABP, _] = driftingCase(firstDelay_s, lastDelay_s)
+    original = case.signals[0].data
+    case.trackDelays([0], windowLength_s=30.0, step_s=5.0, maxLag_s=0.5, warp=True, register=False)
+
+    margin = int(0.5 * ABP.samplingRate_Hz)
+    error = np.abs(case.signals[0].data - ABP.data)[margin:-margin]
+    assert np.percentile(error, 99) < 0.05 * np.ptp(ABP.data)
+    assert np.mean(error) < 0.05 * np.mean(np.abs(original - ABP.data)[margin:-margin])
+
+    case.trackDelays([0], windowLength_s=30.0, step_s=5.0, maxLag_s=0.5, warp=False, register=False)
+    assert np.max(np.abs(case.delayTracks[0][1])) < 1.0 / ABP.samplingRate_Hz
@@ -0,0 +1,119 @@
+import sys
+import numpy as np
+import pytest
+
+sys.path.append('../src/')
+from patientData import patientData as pD
+from undoHistory import undoHistory
+
+
+def snapshot(case):
+    state = {'data': [s.data.copy() for s in case.signals], 'types': [s.sigType for s in case.signals],
+             'samplingRate_Hz': [s.samplingRate_Hz for s in case.signals], 'nOperations': len(case.PPoperationsNode)}
+    if case.hasRRmarks:
+        state['peakIdx'] = np.array(case.peakIdx)
+    if case.hasB2Bdata:
+        state['b2b'] = [s.beat2beatData.avg.copy() for s in case.signals]
+    return state
+
+
+def assertSameState(case, state):
+    after = snapshot(case)
+    assert sorted(after) == sorted(state)
+    assert after['types'] == state['types']
+    assert after['samplingRate_Hz'] == state['samplingRate_Hz']
+    assert after['nOperations'] == state['nOperations']
+    for key in ['data', 'b2b']:
+        for x, y in zip(after.get(key, []), state.get(key, [])):
+            np.testing.assert_array_equal(x, y)
+    if 'peakIdx' in state:
+        np.testing.assert_array_equal(after['peakIdx'], state['peakIdx'])
+
+
+OPERATIONS = [lambda case: case.signals[2].setType('ABP'),
+              lambda case: case.interpolate(1000, 1200),
+              lambda case: case.cropInterval(500, 29000),
+              lambda case: case.findRRmarks(2),
+              lambda case: case.getBeat2beat(),
+              lambda case: case.resampleSignals(50.0),
+              lambda case: case.cropInterval(200, 10000)]
+
+
+def test_roundTrip():
+    case = pD('../example/healthy.DAT', activeModule='preprocessing')
+    case.storeState()
+    states = [snapshot(case)]
+    for operation in OPERATIONS:
+        operation(case)
+        case.storeState()
+        states.append(snapshot(case))
+    assert case.history.nLevels() == len(OPERATIONS)
+
+    # undo all operations
+    for state in states[-2::-1]:
+        assert case.history.undo(case)
+        assertSameState(case, state)
+    assert not case.history.undo(case)
+
+    # redo the operations after undoing them
+    for i in [0, 3, 5]:
+        for operation in OPERATIONS[i:]:
+            case.history.undo(case)
+        assertSameState(case, states[i])
+        for operation in OPERATIONS[i:]:
+            operation(case)
+            case.storeState()
+        assertSameState(case, states[-1])
+        assert case.history.nLevels() == len(OPERATIONS)
+
+
+def test_maxLevels():
+    case = pD('../example/healthy.DAT', activeModule='preprocessing')
+    assert case.history.maxLevels == 20
+
+    case.storeState()
+    states = [snapshot(case)]
+    for i in range(25):
+        case.interpolate(100 * i, 100 * i + 50)
+        case.storeState()
+        states.append(snapshot(case))
+
+    # only the last 20 levels are kept
+    assert case.history.nLevels() == 20
+    for state in states[-2:-22:-1]:
+        assert case.history.undo(case)
+        assertSameState(case, state)
+    assert not case.history.undo(case)
+    assertSameState(case, states[5])
+
+
+def test_maxBytes():
+    case = pD('../example/healthy.DAT', activeModule='preprocessing')
+    nPoints = case.signals[0].nPoints
+
+    # each level saves the interpolated segment of the 4 channels
+    segmentBytes = 4 * 1001 * case.signals[0].data.itemsize
+    case.history = undoHistory(maxBytes=3 * segmentBytes)
+
+    case.storeState()
+    states = [snapshot(case)]
+    for i in range(6):
+        case.interpolate(1000 * (i + 1), 1000 * (i + 2))
+        case.storeState()
+        states.append(snapshot(case))
+        assert case.history.nBytes() <= case.history.maxBytes
+
+    assert case.history.nLevels() == 3
+    for state in states[-2:-5:-1]:
+        assert case.history.undo(case)
+        assertSameState(case, state)
+    assert not case.history.undo(case)
+    assert case.signals[0].nPoints == nPoints
+
+    # a level larger than the budget is removed immediately
+    case.history = undoHistory(maxBytes=segmentBytes // 2)
+    case.storeState()
+    case.interpolate(10000, 11000)
+    case.storeState()
+    assert case.history.nLevels() == 0
+    assert not case.history.undo(case)